@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NL2SQL_EMBEDDINGS / NL2SQL_METRICS write paths against Oracle.
+
+Inserts synthetic rows shaped like the real ones into scratch copies of the two
+tables (created and dropped by the script, without foreign keys):
+  embeddings  (training_id, question CLOB, embedding BLOB of --dim float32)
+              row-by-row execute + one commit (the old insert_embeddings)
+              vs executemany_batches at each --batch-sizes
+  metrics     (run_id, prompt_id, is_hit)
+              execute + commit per row (the old insert_evaluation_metric)
+              vs insert_evaluation_metrics-style array DML
+Reports rows/second per variant as JSON.
+
+Usage:
+  cd api/Training
+  DB_USER=... DB_PASSWORD=... DB_HOST=... DB_SERVICE=... \
+  python benchmark_inserts.py --rows 20000 --batch-sizes 100 1000 5000 --out insert_bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import oracledb
+
+from utils.oracle_utils import executemany_batches
+
+EMB_TABLE = "NL2SQL_EMBEDDINGS_BENCH"
+METRICS_TABLE = "NL2SQL_METRICS_BENCH"
+
+
+def create_tables(conn):
+    cur = conn.cursor()
+    drop_tables(conn)
+    cur.execute(f"CREATE TABLE {EMB_TABLE} (id NUMBER GENERATED ALWAYS AS IDENTITY, "
+                f"training_id NUMBER, question CLOB, embedding BLOB)")
+    cur.execute(f"CREATE TABLE {METRICS_TABLE} (run_id NUMBER, prompt_id NUMBER, is_hit NUMBER(1))")
+
+
+def drop_tables(conn):
+    cur = conn.cursor()
+    for table in (EMB_TABLE, METRICS_TABLE):
+        try:
+            cur.execute(f"DROP TABLE {table} PURGE")
+        except oracledb.DatabaseError:
+            pass
+
+
+def truncate(conn, table):
+    conn.cursor().execute(f"TRUNCATE TABLE {table}")
+
+
+def embedding_rows(n, dim, seed=3):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return [(i // 20 + 1, f"show total sales for region {i % 50} in quarter {i % 4 + 1}", vectors[i].tobytes())
+            for i in range(n)]
+
+
+def _rate(n, seconds):
+    return {"rows": n, "seconds": round(seconds, 3), "rows_per_sec": round(n / seconds, 1) if seconds else None}
+
+
+def bench_embeddings(conn, rows, batch_sizes, row_limit):
+    sql = f"INSERT INTO {EMB_TABLE} (training_id, question, embedding) VALUES (:1, :2, :3)"
+    out = {}
+
+    legacy = rows[:row_limit]
+    truncate(conn, EMB_TABLE)
+    cur = conn.cursor()
+    t0 = time.perf_counter()
+    for row in legacy:
+        cur.execute(sql, row)
+    conn.commit()
+    out["row_by_row"] = _rate(len(legacy), time.perf_counter() - t0)
+
+    for size in batch_sizes:
+        truncate(conn, EMB_TABLE)
+        t0 = time.perf_counter()
+        inserted, errors = executemany_batches(conn, sql, rows, input_sizes=(None, None, oracledb.DB_TYPE_LONG_RAW),
+                                               batch_size=size)
+        out[f"executemany/batch={size}"] = dict(_rate(inserted, time.perf_counter() - t0), errors=len(errors))
+    return out
+
+
+def bench_metrics(conn, n, batch_sizes, row_limit):
+    sql = f"INSERT INTO {METRICS_TABLE} (run_id, prompt_id, is_hit) VALUES (:1, :2, :3)"
+    rows = [(1, i, i % 3 == 0) for i in range(n)]
+    out = {}
+
+    legacy = rows[:row_limit]
+    truncate(conn, METRICS_TABLE)
+    cur = conn.cursor()
+    t0 = time.perf_counter()
+    for run_id, prompt_id, is_hit in legacy:
+        cur.execute(sql, [run_id, prompt_id, 1 if is_hit else 0])
+        conn.commit()
+    out["row_commit_each"] = _rate(len(legacy), time.perf_counter() - t0)
+
+    for size in batch_sizes:
+        truncate(conn, METRICS_TABLE)
+        t0 = time.perf_counter()
+        inserted, _ = executemany_batches(conn, sql, ((r, p, 1 if h else 0) for r, p, h in rows), batch_size=size)
+        out[f"executemany/batch={size}"] = _rate(inserted, time.perf_counter() - t0)
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=384, help="embedding dimension (MiniLM = 384)")
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    ap.add_argument("--row-limit", type=int, default=5000,
+                    help="rows for the slow per-row variants (rate is what matters)")
+    ap.add_argument("--keep-tables", action="store_true")
+    ap.add_argument("--out", help="write JSON report here (default: stdout)")
+    args = ap.parse_args(argv)
+
+    conn = oracledb.connect(user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+                            dsn=f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '1521')}/"
+                                f"{os.getenv('DB_SERVICE', 'orclpdb1')}")
+    report = {"python": platform.python_version(), "oracledb": oracledb.__version__, "rows": args.rows,
+              "dim": args.dim}
+    create_tables(conn)
+    try:
+        report["embeddings"] = bench_embeddings(conn, embedding_rows(args.rows, args.dim), args.batch_sizes,
+                                                args.row_limit)
+        report["metrics"] = bench_metrics(conn, args.rows, args.batch_sizes, args.row_limit)
+    finally:
+        if not args.keep_tables:
+            drop_tables(conn)
+        conn.close()
+
+    for section in ("embeddings", "metrics"):
+        for name, r in report[section].items():
+            print(f"{section:>10} {name:>24}: {r['rows_per_sec']:>10} rows/s", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
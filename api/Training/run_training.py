@@ -7,19 +7,31 @@ Steps (all togglable):
  2) Generate synthetic questions and store in NL2SQL_TRAINING
  3) Generate synonyms for each question and store in NL2SQL_SYNONYMS
  4) Build embeddings (questions + synonyms) into NL2SQL_EMBEDDINGS and refresh KD-Tree index
+    (chunked: encoding overlaps the bulk inserts; texts already in the shared
+    embedding cache, see agent_common/embedding_cache.py, are not re-encoded)
  5) Run evaluation prompts (if present) and store results in NL2SQL_METRICS
 
+With --incremental, step 2 diffs the generated questions against NL2SQL_TRAINING
+by stable hash instead of truncating: retired questions are deleted with their
+synonyms and embeddings, and only new ones are inserted. Steps 3 and 4 then
+cover only the new questions, so neither may be skipped. Everything runs in one transaction, committed
+as a new NL2SQL_INDEX_VERSION row, so serving agents switch from the old
+corpus to the new one in a single step rather than seeing an empty or
+half-built index.
+
 Usage:
   python api/Training/run_training.py \
     --host HOST --port 1521 --service SERVICE --user USER --password PASS \
     --schema-owner SCHEMA_OWNER \
-    [--skip-schema] [--skip-questions] [--skip-synonyms] [--skip-embeddings] [--skip-eval] \
+    [--skip-schema] [--skip-questions] [--skip-synonyms] [--skip-embeddings] [--skip-eval] [--incremental] \
     [--workers 4] [--use-processes] [--semantic-filter]
 """
 
 from __future__ import annotations
 
 import argparse
+import functools
+import os
 import sys
 import time
 from typing import List
@@ -27,23 +39,58 @@ from typing import List
 import pandas as pd
 from sentence_transformers import SentenceTransformer
 
-# Local imports
-from utils.oracle_utils import (
-    connect_oracle,
-    insert_schema,
-    fetch_schema_from_db,
-    insert_questions,
-    fetch_training_data,
-    insert_synonyms,
-    fetch_training_synonym_data,
-    insert_embeddings,
-    refresh_embedding_index,
-    fetch_evaluation_prompts,
-    insert_evaluation_metric,
-    search_embeddings_kdtree,
-)
-from utils.synthetic_questions import generate_questions
-from utils.synonyms import generate_synonyms_bulk
+# Local imports (relative when imported as a package, e.g. by the tests)
+try:
+    from .utils.oracle_utils import (
+        connect_oracle,
+        insert_schema,
+        fetch_schema_from_db,
+        insert_questions,
+        sync_questions,
+        publish_index_version,
+        fetch_training_data,
+        insert_synonyms,
+        insert_embedding_rows,
+        refresh_embedding_index,
+        fetch_evaluation_prompts,
+        run_bulk_evaluation,
+    )
+    from .utils.embedding_pipeline import (
+        QUESTIONS_SQL,
+        SYNONYMS_SQL,
+        NEW_QUESTIONS_SQL,
+        NEW_SYNONYMS_SQL,
+        encode_and_insert,
+        fetch_text_chunks,
+    )
+    from .utils.synthetic_questions import generate_questions
+except ImportError:
+    from utils.oracle_utils import (
+        connect_oracle,
+        insert_schema,
+        fetch_schema_from_db,
+        insert_questions,
+        sync_questions,
+        publish_index_version,
+        fetch_training_data,
+        insert_synonyms,
+        insert_embedding_rows,
+        refresh_embedding_index,
+        fetch_evaluation_prompts,
+        run_bulk_evaluation,
+    )
+    from utils.embedding_pipeline import (
+        QUESTIONS_SQL,
+        SYNONYMS_SQL,
+        NEW_QUESTIONS_SQL,
+        NEW_SYNONYMS_SQL,
+        encode_and_insert,
+        fetch_text_chunks,
+    )
+    from utils.synthetic_questions import generate_questions
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.embedding_cache import cached_encoder
 
 
 def build_tables_payload(schema_df: pd.DataFrame) -> List[dict]:
@@ -74,9 +121,18 @@ def build_tables_payload(schema_df: pd.DataFrame) -> List[dict]:
     return tables
 
 
+def _abort(conn, code: int = 2) -> int:
+    """Roll back uncommitted (incremental) work and close the connection; returns `code`."""
+    conn.rollback()
+    conn.close()
+    return code
+
+
 def run(args: argparse.Namespace) -> int:
     print("[run] Connecting to Oracle…")
     conn = connect_oracle(args.user, args.password, args.host, args.port, args.service)
+    # --incremental: result of sync_questions; steps 2-4 stay uncommitted until publish_index_version
+    diff = None
 
     # 1) Schema extraction
     if not args.skip_schema:
@@ -91,13 +147,21 @@ def run(args: argparse.Namespace) -> int:
         schema_df = fetch_schema_from_db(conn)
         if schema_df.empty:
             print("[questions] No schema found. Aborting questions step.")
-            return 2
+            return _abort(conn)
         print(f"[questions] Rows in NL2SQL_SCHEMA: {len(schema_df)}")
         tables = build_tables_payload(schema_df)
         print(f"[questions] Tables to generate from: {len(tables)}")
         q_list = generate_questions(tables)
         if not q_list:
             print("[questions] No questions generated.")
+            if args.incremental:
+                # An empty generation would retire the whole corpus; treat it as a failure instead
+                return _abort(conn)
+        elif args.incremental:
+            qdf = pd.DataFrame(q_list)
+            print(f"[questions] Diffing {len(qdf)} generated questions against NL2SQL_TRAINING…")
+            diff = sync_questions(conn, qdf)
+            print(f"[questions] +{diff['added']} new, -{diff['retired']} retired, {diff['kept']} unchanged")
         else:
             qdf = pd.DataFrame(q_list)
             print(f"[questions] Inserting {len(qdf)} questions…")
@@ -107,11 +171,17 @@ def run(args: argparse.Namespace) -> int:
 
     # 3) Generate synonyms
     if not args.skip_synonyms:
-        train_df = fetch_training_data(conn)  # columns: ID, QUESTION, SQL_TEMPLATE
+        # columns: ID, QUESTION, SQL_TEMPLATE (incremental: the new questions only)
+        train_df = fetch_training_data(conn, since_id=diff["since_id"] if diff else None)
         if train_df.empty:
-            print("[synonyms] No training data found. Aborting.")
+            print("[synonyms] No new questions." if diff else "[synonyms] No training data found. Aborting.")
         else:
             print(f"[synonyms] Generating synonyms for {len(train_df)} questions…")
+            # Imported here: nltk/WordNet is only needed by this step
+            try:
+                from .utils.synonyms import generate_synonyms_bulk
+            except ImportError:
+                from utils.synonyms import generate_synonyms_bulk
             questions = train_df["QUESTION"].tolist()
             syn_lists = generate_synonyms_bulk(
                 questions,
@@ -128,7 +198,7 @@ def run(args: argparse.Namespace) -> int:
             if rows:
                 sdf = pd.DataFrame(rows)
                 print(f"[synonyms] Inserting {len(sdf)} synonym rows…")
-                insert_synonyms(conn, sdf)
+                insert_synonyms(conn, sdf, commit=diff is None)
             else:
                 print("[synonyms] No synonyms generated.")
     else:
@@ -139,31 +209,41 @@ def run(args: argparse.Namespace) -> int:
         # Load model for embeddings
         model_path = args.model_path
         print(f"[embeddings] Loading model from {model_path}")
-        model = SentenceTransformer(model_path)
-
-        # Questions
-        qdf = fetch_training_data(conn)
-        if not qdf.empty:
-            print(f"[embeddings] Encoding {len(qdf)} questions…")
-            q_emb = model.encode(qdf["QUESTION"].tolist(), convert_to_numpy=True, batch_size=128, show_progress_bar=False)
-            insert_embeddings(conn, qdf.rename(columns=str.upper), q_emb, 'Quest')
-        else:
-            print("[embeddings] No questions found to embed.")
-
-        # Synonyms
-        sdf = fetch_training_synonym_data(conn)
-        if not sdf.empty:
-            print(f"[embeddings] Encoding {len(sdf)} synonyms…")
-            s_emb = model.encode(sdf["QUESTION_SYN"].tolist(), convert_to_numpy=True, batch_size=128, show_progress_bar=False)
-            insert_embeddings(conn, sdf.rename(columns=str.upper), s_emb, 'Syn')
+        model = cached_encoder(SentenceTransformer(model_path), model_path)
+
+        if diff is not None:
+            queries = (("questions", NEW_QUESTIONS_SQL), ("synonyms", NEW_SYNONYMS_SQL))
+            binds = {"since_id": diff["since_id"]}
+            insert_rows = functools.partial(insert_embedding_rows, commit=False)
         else:
-            print("[embeddings] No synonyms found to embed.")
+            queries = (("questions", QUESTIONS_SQL), ("synonyms", SYNONYMS_SQL))
+            binds, insert_rows = None, insert_embedding_rows
 
-        print("[embeddings] Refreshing in-memory KD-Tree index…")
-        refresh_embedding_index(conn)
+        # Questions, then synonyms: chunk N is encoded while chunk N-1 is inserted
+        for kind, sql in queries:
+            print(f"[embeddings] Encoding {kind} in chunks of {args.embed_chunk_size}…")
+            totals = encode_and_insert(conn, model, fetch_text_chunks(conn, sql, args.embed_chunk_size, binds),
+                                       label=f"embeddings:{kind}", batch_size=128,
+                                       queue_depth=args.embed_queue_depth, insert_rows=insert_rows)
+            if not totals["rows"]:
+                print(f"[embeddings] No {kind} found to embed.")
+        cache = getattr(model, "cache", None)
+        if cache is not None:
+            st = cache.stats()
+            print(f"[embeddings] Cache: {st['hits']} hits, {st['misses']} encoded, {st['entries']} entries in {st['dir']}")
+
+        if diff is None:
+            print("[embeddings] Refreshing in-memory KD-Tree index…")
+            refresh_embedding_index(conn)
     else:
         print("[embeddings] Skipped")
 
+    # Incremental: one commit publishes the retired and new rows together
+    if diff is not None:
+        version = publish_index_version(conn, diff)
+        print(f"[publish] Index version {version}: +{diff['added']} / -{diff['retired']} questions")
+        refresh_embedding_index(conn)
+
     # 5) Evaluation
     if not args.skip_eval:
         eval_df = fetch_evaluation_prompts(conn)
@@ -175,19 +255,9 @@ def run(args: argparse.Namespace) -> int:
             model_path = args.model_path
             model = SentenceTransformer(model_path)
             run_id = int(time.time())
-            hits = 0
-            for _, row in eval_df.iterrows():
-                pid = int(row["ID"])
-                prompt = str(row["PROMPT"]) or ""
-                expected_sql = str(row["EXPECTED_SQL"]) or ""
-                q_emb = model.encode([prompt], convert_to_numpy=True)[0]
-                results = search_embeddings_kdtree(conn, q_emb, top_k=5)
-                # Normalize quotes and whitespace for comparison
-                exp_norm = expected_sql.strip().replace("'", '"').lower()
-                is_hit = any((r["sql_template"] or "").strip().replace("'", '"').lower() == exp_norm for r in results)
-                if is_hit:
-                    hits += 1
-                insert_evaluation_metric(conn, run_id, pid, is_hit)
+            # One array insert and commit for the whole run instead of a round trip per prompt
+            hits, _ = run_bulk_evaluation(
+                conn, model, eval_df[["ID", "PROMPT", "EXPECTED_SQL"]].itertuples(index=False, name=None), run_id)
             print(f"[eval] Completed. Run ID={run_id}, Total={len(eval_df)}, Hits={hits}, HitRate={hits/len(eval_df)*100:.2f}%")
     else:
         print("[eval] Skipped")
@@ -211,6 +281,8 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
     p.add_argument("--skip-synonyms", action="store_true")
     p.add_argument("--skip-embeddings", action="store_true")
     p.add_argument("--skip-eval", action="store_true")
+    p.add_argument("--incremental", action="store_true",
+                   help="diff questions by hash; add new, retire removed, publish one new index version")
 
     # Synonym generation
     p.add_argument("--workers", type=int, default=4)
@@ -220,8 +292,19 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
 
     # Embedding model path (default consistent with app usage)
     p.add_argument("--model-path", default="../local_all-MiniLM-L6-v2")
+    # Embedding stage: texts per encode/insert chunk, encoded chunks allowed to wait for the DB
+    p.add_argument("--embed-chunk-size", type=int, default=2048)
+    p.add_argument("--embed-queue-depth", type=int, default=2)
 
-    return p.parse_args(argv)
+    args = p.parse_args(argv)
+    if args.incremental and args.skip_questions:
+        p.error("--incremental needs the questions step to compute the diff")
+    # New questions would be published without synonyms or vectors, and later diffs treat them as unchanged
+    if args.incremental and args.skip_synonyms:
+        p.error("--incremental needs the synonyms step to expand the new questions")
+    if args.incremental and args.skip_embeddings:
+        p.error("--incremental needs the embeddings step to embed the new questions")
+    return args
 
 
 if __name__ == "__main__":
@@ -1,10 +1,13 @@
 import base64
+import functools
 import logging
 import streamlit as st
 import pandas as pd
 import numpy as np
 import oracledb
 import json
+import os
+import sys
 import time
 from sentence_transformers import SentenceTransformer
 from utils.oracle_utils import (
@@ -12,12 +15,16 @@ from utils.oracle_utils import (
     insert_synonyms, insert_embeddings, search_embeddings_kdtree, search_embeddings,
     fetch_schema_from_db, fetch_training_data, fetch_training_synonym_data,
     fetch_embeddings_from_db,
-    fetch_evaluation_prompts, insert_evaluation_metric, fetch_evaluation_metrics,
-    refresh_embedding_index
+    fetch_evaluation_prompts, insert_evaluation_metrics, fetch_evaluation_metrics,
+    refresh_embedding_index, run_bulk_evaluation, sync_questions, publish_index_version, insert_embedding_rows
 )
+from utils.embedding_pipeline import NEW_QUESTIONS_SQL, NEW_SYNONYMS_SQL, encode_and_insert, fetch_text_chunks
 from utils.synthetic_questions import generate_questions
 from utils.synonyms import (generate_synonyms, generate_synonyms_bulk)
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.embedding_cache import cached_encoder
+
 st.set_page_config(layout="wide", page_title="ConBI • Training Centre", initial_sidebar_state="expanded")
 
 # === Global Synonym Generation Settings (always visible) ===
@@ -270,13 +277,22 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+MODEL_PATH = "../local_all-MiniLM-L6-v2"
+
+
 # Load model once
 @st.cache_resource
 def load_model():
     # Use a local path or a valid model name
-    return SentenceTransformer("../local_all-MiniLM-L6-v2")
+    return SentenceTransformer(MODEL_PATH)
+
+# Bulk embedding builds go through the shared on-disk cache: unchanged texts are not re-encoded
+@st.cache_resource
+def load_embed_model():
+    return cached_encoder(load_model(), MODEL_PATH)
 
 model = load_model()
+embed_model = load_embed_model()
 
 # Setup logging
 log_file = "synonym_generation.log"
@@ -384,6 +400,11 @@ with tab2:
     st.markdown("<h1 style='text-align: left; font-size: 1.5rem;'>Generate Synthetic Questions + Synonyms</h1>", unsafe_allow_html=True)
 
 
+    incremental = st.checkbox(
+        "Incremental (keep unchanged questions)", value=False,
+        help="Diff the generated questions against the stored ones: retire removed questions, add new ones, "
+             "expand and embed only the new ones, then publish everything as one new index version.")
+
     if st.button("Generate & Store Questions"):
         conn = st.session_state.get("conn")
         if not conn:
@@ -423,13 +444,23 @@ with tab2:
                     else:
                         # Convert to DataFrame for Oracle insert
                         q_df = pd.DataFrame(q_list)
-                        insert_questions(conn, q_df)
-                        st.success(f"✅ {len(q_df)} questions stored in Oracle")
+                        if incremental:
+                            # Nothing below is committed until publish_index_version
+                            diff = sync_questions(conn, q_df)
+                            st.success(f"✅ {len(q_df)} questions generated: {diff['added']} new, "
+                                       f"{diff['retired']} retired, {diff['kept']} unchanged")
+                        else:
+                            insert_questions(conn, q_df)
+                            st.success(f"✅ {len(q_df)} questions stored in Oracle")
                         st.dataframe(q_df.head(20))
 
-                        # Fetch back question IDs to maintain relationship
+                        # Fetch back question IDs to maintain relationship (incremental: new ones only)
                         cur = conn.cursor()
-                        cur.execute("SELECT id, question FROM NL2SQL_TRAINING")
+                        if incremental:
+                            cur.execute("SELECT id, question FROM NL2SQL_TRAINING WHERE id > :since_id",
+                                        {"since_id": diff["since_id"]})
+                        else:
+                            cur.execute("SELECT id, question FROM NL2SQL_TRAINING")
                         questions_in_db = cur.fetchall()  # list of tuples (training_id, question)
                         #logging.info(f"Fetched {questions_in_db} questions from Oracle.")
                         cur.close()
@@ -511,7 +542,7 @@ with tab2:
                                         if not rec_chunk:
                                             continue
                                         df_chunk = pd.DataFrame(rec_chunk, columns=["training_id","question_syn"])
-                                        insert_synonyms(conn, df_chunk)
+                                        insert_synonyms(conn, df_chunk, commit=not incremental)
                                         inserted_total += len(rec_chunk)
                                     ins_ms = (time.time() - t_ins) * 1000
 
@@ -523,7 +554,26 @@ with tab2:
                                     wave_log.markdown(f"**Wave {wave_idx} done** — generate: **{gen_ms:.0f} ms**, insert: **{ins_ms:.0f} ms**, records: **{len(records)}**")
 
                                 st.success(f"✅ Inserted {inserted_total} synonyms for {processed_q} questions")
+
+                        if incremental:
+                            # Embed only the new questions and synonyms, then commit it all as one version
+                            with st.spinner("Embedding new questions and publishing..."):
+                                embedded = 0
+                                for kind, sql in (("questions", NEW_QUESTIONS_SQL), ("synonyms", NEW_SYNONYMS_SQL)):
+                                    totals = encode_and_insert(
+                                        conn, embed_model,
+                                        fetch_text_chunks(conn, sql, binds={"since_id": diff["since_id"]}),
+                                        label=f"embeddings:{kind}",
+                                        insert_rows=functools.partial(insert_embedding_rows, commit=False),
+                                        log=logging.info)
+                                    embedded += totals["rows"]
+                                version = publish_index_version(conn, diff)
+                                refresh_embedding_index(conn)
+                            st.success(f"✅ Published index version {version}: {embedded} new embeddings, "
+                                       f"{diff['retired']} questions retired")
             except Exception as e:
+                            if incremental:
+                                conn.rollback()  # leave the published version untouched
                             st.error(f"❌ Failed to generate/store questions: {str(e)}")
 
     
@@ -574,7 +624,7 @@ with tab3:
             q_df['question'] = q_df['QUESTION'].apply(lambda x: x.read() if hasattr(x, 'read') else str(x))
             
             texts = q_df["question"].tolist()
-            embeddings = model.encode(texts, convert_to_numpy=True)
+            embeddings = embed_model.encode(texts, convert_to_numpy=True)
             insert_embeddings(conn, q_df, embeddings, 'Quest')
             
             st.success(f"✅ Stored {len(texts)} embeddings into NL2SQL_EMBEDDINGS")
@@ -585,7 +635,7 @@ with tab3:
             q_df_syn['question_syn'] = q_df_syn['QUESTION_SYN'].apply(lambda x: x.read() if hasattr(x, 'read') else str(x))
             
             texts = q_df_syn["question_syn"].tolist()
-            embeddings = model.encode(texts, convert_to_numpy=True)
+            embeddings = embed_model.encode(texts, convert_to_numpy=True)
             insert_embeddings(conn, q_df_syn, embeddings , 'Syn')
             
             st.success(f"✅ Stored {len(texts)} synonym embeddings into NL2SQL_EMBEDDINGS")
@@ -654,26 +704,11 @@ with tab4:
                     if total_runs == 0:
                         st.warning("No evaluation prompts found. Please populate the `NL2SQL_EVALUATION` table.")
                     else:
-                        hits = 0
                         run_id = int(time.time()) # Use timestamp as a unique run ID
-                        
-                        # Loop through each evaluation prompt
-                        for index, row in eval_df.iterrows():
-                            prompt_id = row['ID']
-                            prompt_text = row['PROMPT']
-                            expected_sql = row['EXPECTED_SQL']
-
-                            # Get top-k SQL candidates from the vector search
-                            q_emb = model.encode([prompt_text], convert_to_numpy=True)[0]
-                            results = search_embeddings_kdtree(conn, q_emb, top_k=5) # Using top_k=5 for evaluation
-
-                            # Check if the expected SQL is in the top-k results
-                            is_hit = any(res['sql_template'].strip().replace("'", '"').lower() == expected_sql.strip().replace("'", '"').lower() for res in results)
-                            if is_hit:
-                                hits += 1
-
-                            # Log the result to the metrics table
-                            insert_evaluation_metric(conn, run_id, prompt_id, is_hit)
+                        # Top-5 retrieval per prompt; all results go to the metrics table in one array insert
+                        hits, _ = run_bulk_evaluation(
+                            conn, model, eval_df[["ID", "PROMPT", "EXPECTED_SQL"]].itertuples(index=False, name=None),
+                            run_id, top_k=5)
 
                         hit_rate = (hits / total_runs) * 100
                         st.success(f"✅ Bulk evaluation complete. Total runs: {total_runs}, Hits: {hits}, Hit Rate: {hit_rate:.2f}%")
@@ -0,0 +1,107 @@
+"""
+Pipelined encode -> insert for NL2SQL_EMBEDDINGS.
+
+Texts are read from Oracle `chunk_size` rows at a time. The calling thread
+encodes chunk N while a writer thread bulk-inserts chunk N-1, so the model and
+the database work at the same time. At most `queue_depth` encoded chunks wait
+between the two: peak memory is a few chunks of vectors, not the whole corpus,
+and a slow database holds the encoder back rather than piling up vectors.
+Every chunk logs its encode and insert throughput; the call returns totals.
+"""
+import queue
+import threading
+import time
+
+from .oracle_utils import _read_lob, insert_embedding_rows
+
+QUESTIONS_SQL = "SELECT id, question FROM NL2SQL_TRAINING ORDER BY id"
+SYNONYMS_SQL = "SELECT training_id, question_syn FROM NL2SQL_SYNONYMS ORDER BY training_id"
+# Incremental runs: only questions (and their synonyms) inserted after :since_id
+NEW_QUESTIONS_SQL = "SELECT id, question FROM NL2SQL_TRAINING WHERE id > :since_id ORDER BY id"
+NEW_SYNONYMS_SQL = ("SELECT training_id, question_syn FROM NL2SQL_SYNONYMS WHERE training_id > :since_id "
+                    "ORDER BY training_id")
+
+DEFAULT_CHUNK_SIZE = 2048
+DEFAULT_QUEUE_DEPTH = 2
+
+
+def fetch_text_chunks(conn, sql, chunk_size=DEFAULT_CHUNK_SIZE, binds=None):
+    """Yield lists of (training_id, text) from a two-column query, `chunk_size` rows at a time."""
+    cur = conn.cursor()
+    try:
+        cur.arraysize = chunk_size
+        cur.execute(sql, binds or {})
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield [(int(tid), str(_read_lob(text) or "")) for tid, text in rows]
+    finally:
+        cur.close()
+
+
+def _rate(n, seconds):
+    return n / seconds if seconds > 0 else float("inf")
+
+
+def encode_and_insert(conn, model, chunks, label="embeddings", batch_size=128,
+                      queue_depth=DEFAULT_QUEUE_DEPTH, insert_rows=insert_embedding_rows, log=print):
+    """
+    Encode each chunk of (training_id, text) with `model` and insert it on a
+    writer thread while the next chunk is encoded. An insert failure stops
+    the encoder at the next chunk and is re-raised here.
+    Returns {"chunks", "rows", "encode_s", "insert_s", "wall_s", "rows_per_s"}.
+    """
+    pending = queue.Queue(maxsize=max(1, queue_depth))
+    totals = {"chunks": 0, "rows": 0, "encode_s": 0.0, "insert_s": 0.0}
+    failures = []
+
+    def writer():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if failures:
+                continue  # drain so the encoder never blocks on a dead writer
+            n, ids, texts, vectors, encode_s = item
+            t0 = time.perf_counter()
+            try:
+                inserted = insert_rows(conn, ids, texts, vectors)
+            except Exception as e:
+                failures.append(e)
+                continue
+            insert_s = time.perf_counter() - t0
+            totals["chunks"] += 1
+            totals["rows"] += inserted
+            totals["insert_s"] += insert_s
+            log(f"[{label}] chunk {n}: {len(texts)} texts | encode {encode_s * 1000:.0f} ms "
+                f"({_rate(len(texts), encode_s):.0f}/s) | insert {insert_s * 1000:.0f} ms "
+                f"({_rate(inserted, insert_s):.0f} rows/s)")
+
+    thread = threading.Thread(target=writer, name=f"{label}-writer", daemon=True)
+    thread.start()
+    t_start = time.perf_counter()
+    try:
+        for n, chunk in enumerate(chunks, 1):
+            if failures:
+                break
+            ids = [tid for tid, _ in chunk]
+            texts = [text for _, text in chunk]
+            t0 = time.perf_counter()
+            vectors = model.encode(texts, convert_to_numpy=True, batch_size=batch_size, show_progress_bar=False)
+            encode_s = time.perf_counter() - t0
+            totals["encode_s"] += encode_s
+            pending.put((n, ids, texts, vectors, encode_s))
+    finally:
+        pending.put(None)
+        thread.join()
+    if failures:
+        raise failures[0]
+
+    wall_s = time.perf_counter() - t_start
+    totals["wall_s"] = wall_s
+    totals["rows_per_s"] = round(_rate(totals["rows"], wall_s), 1) if totals["rows"] else 0.0
+    if totals["rows"]:
+        log(f"[{label}] {totals['rows']} rows in {wall_s:.2f} s ({totals['rows_per_s']:.0f} rows/s); "
+            f"encode busy {totals['encode_s']:.2f} s, insert busy {totals['insert_s']:.2f} s")
+    return totals
@@ -7,13 +7,20 @@ import sys
 import streamlit as st
 import logging
 import json
+import hashlib
+import os
 import time
+from collections import namedtuple
 from sentence_transformers import SentenceTransformer
 
-# Global variables to store the in-memory index and metadata
-KD_TREE_INDEX = None
-EMBEDDINGS_DATA = {}
+# The in-memory index: KD-Tree, row -> metadata, the vectors behind the tree and the
+# highest embedding id loaded (for incremental refreshes). Published as one immutable
+# tuple in a single assignment, so a reader never mixes a new tree with old metadata.
+EmbeddingIndex = namedtuple("EmbeddingIndex", ["tree", "data", "matrix", "watermark"])
+EMBEDDING_INDEX = None
 INDEX_BUILD_LOCK = threading.Lock()
+# Rows per executemany round trip for bulk inserts (embeddings, evaluation metrics)
+INSERT_BATCH_SIZE = int(os.getenv("NL2SQL_INSERT_BATCH_SIZE", "1000"))
 
 
 # ----------------------
@@ -123,6 +130,24 @@ def ensure_tables(conn):
     WHEN OTHERS THEN
             IF SQLCODE != -955 THEN RAISE; END IF;
     END;
+    """)
+
+    # NL2SQL_INDEX_VERSION: one row per incremental training run, committed with its changes
+    cur.execute("""
+    BEGIN
+        EXECUTE IMMEDIATE '
+        CREATE TABLE NL2SQL_INDEX_VERSION (
+            version NUMBER GENERATED ALWAYS AS IDENTITY,
+            questions_added NUMBER,
+            questions_retired NUMBER,
+            questions_total NUMBER,
+            published_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (version)
+        )';
+    EXCEPTION
+        WHEN OTHERS THEN
+            IF SQLCODE != -955 THEN RAISE; END IF;
+    END;
     """)
 
      # NL2SQL_FALLBACK
@@ -278,16 +303,130 @@ def insert_questions(conn, df):
     conn.commit()
 
 
-def insert_synonyms(conn, df):
+def insert_synonyms(conn, df, commit=True):
     cur = conn.cursor()
     cur.executemany(
         "INSERT INTO NL2SQL_SYNONYMS (training_id, question_syn) VALUES (:1,:2)",
         df[["training_id","question_syn"]].values.tolist()
     )
-    conn.commit()
+    if commit:
+        conn.commit()
+
+def fetch_training_data(conn, since_id=None):
+    """Training rows; with `since_id`, only those added after it (the new rows of an incremental run)."""
+    if since_id is None:
+        return pd.read_sql("SELECT id, question, sql_template FROM NL2SQL_TRAINING", conn)
+    return pd.read_sql("SELECT id, question, sql_template FROM NL2SQL_TRAINING WHERE id > :since_id ORDER BY id",
+                       conn, params={"since_id": since_id})
+
+
+# ----------------------
+# Incremental training
+# ----------------------
+QUESTION_COLUMNS = ["schema_name", "table_name", "question", "sql_template"]
+
+
+def question_hash(schema_name, table_name, question, sql_template):
+    """Stable identity of a generated question: whitespace runs collapsed, case kept."""
+    key = "\x1f".join(" ".join(str(v or "").split()) for v in (schema_name, table_name, question, sql_template))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def fetch_question_hashes(conn):
+    """[(id, question_hash)] for every stored NL2SQL_TRAINING row, oldest first."""
+    cur = conn.cursor()
+    cur.execute("SELECT id, schema_name, table_name, question, sql_template FROM NL2SQL_TRAINING ORDER BY id")
+    rows = [(int(r[0]), question_hash(r[1], r[2], _read_lob(r[3]), _read_lob(r[4]))) for r in cur.fetchall()]
+    cur.close()
+    return rows
+
+
+def diff_questions(existing, rows):
+    """
+    Compare stored questions, [(id, hash)], with freshly generated rows of
+    (schema_name, table_name, question, sql_template).
+    Returns (new_rows, retired_ids, kept): generated rows not stored yet (once
+    each), stored ids that are no longer generated or duplicate an earlier
+    stored row, and the number of stored questions that stay as they are.
+    """
+    hashes = [question_hash(*r) for r in rows]
+    wanted = set(hashes)
+    kept, retired = {}, []
+    for id_, h in existing:
+        if h in wanted and h not in kept:
+            kept[h] = id_
+        else:
+            retired.append(id_)
+    seen = set(kept)
+    new_rows = []
+    for row, h in zip(rows, hashes):
+        if h not in seen:
+            new_rows.append(row)
+            seen.add(h)
+    return new_rows, retired, len(kept)
+
+
+def delete_training_rows(conn, training_ids, batch_size=None):
+    """Delete questions with their synonyms and embeddings (no commit). Returns the number of questions."""
+    batch_size = max(1, batch_size or INSERT_BATCH_SIZE)
+    ids = [(int(i),) for i in training_ids]
+    cur = conn.cursor()
+    # Children first: both reference NL2SQL_TRAINING(id)
+    for sql in ("DELETE FROM NL2SQL_EMBEDDINGS WHERE training_id = :1",
+                "DELETE FROM NL2SQL_SYNONYMS WHERE training_id = :1",
+                "DELETE FROM NL2SQL_TRAINING WHERE id = :1"):
+        for i in range(0, len(ids), batch_size):
+            cur.executemany(sql, ids[i:i + batch_size])
+    cur.close()
+    return len(ids)
+
+
+def sync_questions(conn, df):
+    """
+    Incremental counterpart of insert_questions: diff `df` (a DataFrame like
+    insert_questions takes, or rows in QUESTION_COLUMNS order) against the stored
+    questions by question_hash, delete the retired ones (with their synonyms
+    and embeddings) and insert only the new ones. Unchanged questions keep
+    their ids, synonyms and embeddings. Nothing is committed: the caller adds
+    synonyms and embeddings for the new rows, then calls publish_index_version.
+    Returns {"since_id", "added", "retired", "kept"}; new rows have id > since_id.
+    """
+    if isinstance(df, pd.DataFrame):
+        rows = df.loc[:, QUESTION_COLUMNS].values.tolist()
+    else:
+        rows = [list(r) for r in df]
+
+    new_rows, retired, kept = diff_questions(fetch_question_hashes(conn), rows)
+    cur = conn.cursor()
+    cur.execute("SELECT NVL(MAX(id), 0) FROM NL2SQL_TRAINING")
+    since_id = int(cur.fetchone()[0])
+    cur.close()
+
+    delete_training_rows(conn, retired)
+    added = 0
+    if new_rows:
+        added, _ = executemany_batches(
+            conn, "INSERT INTO NL2SQL_TRAINING (schema_name, table_name, question, sql_template) VALUES (:1,:2,:3,:4)",
+            new_rows, label="questions", commit=False)
+    return {"since_id": since_id, "added": added, "retired": len(retired), "kept": kept}
+
 
-def fetch_training_data(conn):
-    return pd.read_sql("SELECT id, question, sql_template FROM NL2SQL_TRAINING", conn)
+def publish_index_version(conn, diff):
+    """
+    Record the run in NL2SQL_INDEX_VERSION and commit. This single commit makes
+    the retired and new questions, synonyms and embeddings visible together, so
+    the serving agents' incremental refresh never sees a half-applied run.
+    Returns the new version number.
+    """
+    cur = conn.cursor()
+    version = cur.var(oracledb.DB_TYPE_NUMBER)
+    cur.execute(
+        "INSERT INTO NL2SQL_INDEX_VERSION (questions_added, questions_retired, questions_total) "
+        "VALUES (:1, :2, :3) RETURNING version INTO :4",
+        [diff["added"], diff["retired"], diff["kept"] + diff["added"], version])
+    conn.commit()
+    cur.close()
+    return int(version.getvalue()[0])
 
 
 def fetch_training_synonym_data(conn):
@@ -297,33 +436,97 @@ def fetch_training_synonym_data(conn):
 # ----------------------
 # Embeddings
 # ----------------------
-def insert_embeddings(conn, q_df, embeddings, questOrSyn: str):
+def executemany_batches(conn, sql, rows, input_sizes=None, batch_size=None, label="rows", commit=True):
+    """
+    Insert `rows` with array DML: one executemany round trip per `batch_size`
+    rows, a single commit at the end (commit=False leaves it to the caller).
+    Input sizes are set once for all batches.
+    Rows the database rejects are collected with batcherrors instead of aborting
+    the load. Returns (inserted, errors) with errors as [(row number, message)].
+    """
+    batch_size = max(1, batch_size or INSERT_BATCH_SIZE)
     cur = conn.cursor()
-    #cur.execute("DELETE FROM NL2SQL_EMBEDDINGS")  # refresh
-    for i, row in q_df.iterrows():
-        emb_bytes = np.asarray(embeddings[i], dtype=np.float32).tobytes()
-        
-        if questOrSyn == 'Quest':
-            cur.execute(
-                "INSERT INTO NL2SQL_EMBEDDINGS (training_id, question, embedding) VALUES (:1, :2, :3)",
-                (int(row["ID"]), row["QUESTION"], emb_bytes)
-            )
-        else:
-            cur.execute(
-                "INSERT INTO NL2SQL_EMBEDDINGS (training_id, question, embedding) VALUES (:1, :2, :3)",
-                (int(row["TRAINING_ID"]), row["QUESTION_SYN"], emb_bytes)
-            )
+    if input_sizes:
+        cur.setinputsizes(*input_sizes)
+    inserted = 0
+    errors = []
+    offset = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        cur.executemany(sql, batch, batcherrors=True)
+        rejected = cur.getbatcherrors()
+        errors.extend((offset + e.offset, e.message) for e in rejected)
+        inserted += len(batch) - len(rejected)
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+            offset += len(batch)
+            batch = []
+    if batch:
+        flush()
+    if commit:
+        conn.commit()
+    cur.close()
+    if errors:
+        row_no, message = errors[0]
+        print(f"⚠️ {len(errors)} {label} rejected (first: row {row_no}: {message})", file=sys.stderr)
+    return inserted, errors
 
-    conn.commit()
+
+def insert_embedding_rows(conn, training_ids, texts, embeddings, batch_size=None, commit=True):
+    """
+    Insert (training_id, text, vector) rows into NL2SQL_EMBEDDINGS, `batch_size`
+    rows per round trip. Returns the number of rows inserted.
+    """
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    rows = ((int(tid), text, vec.tobytes()) for tid, text, vec in zip(training_ids, texts, vectors))
+    # LONG RAW sends each vector inline with the array; DB_TYPE_BLOB would create a temporary LOB per row
+    inserted, _ = executemany_batches(
+        conn, "INSERT INTO NL2SQL_EMBEDDINGS (training_id, question, embedding) VALUES (:1, :2, :3)",
+        rows, input_sizes=(None, None, oracledb.DB_TYPE_LONG_RAW), batch_size=batch_size, label="embeddings",
+        commit=commit)
+    return inserted
+
+
+def insert_embeddings(conn, q_df, embeddings, questOrSyn: str, batch_size=None):
+    """
+    Insert one NL2SQL_EMBEDDINGS row per question (questOrSyn='Quest') or synonym,
+    `batch_size` rows per round trip. Returns the number of rows inserted.
+    """
+    id_col, text_col = ("ID", "QUESTION") if questOrSyn == 'Quest' else ("TRAINING_ID", "QUESTION_SYN")
+    return insert_embedding_rows(conn, q_df[id_col].tolist(), q_df[text_col].tolist(), embeddings, batch_size)
+
+
+def _read_lob(val):
+    return val.read() if hasattr(val, "read") else val
+
+
+def _publish_embedding_index(embeddings_array, data):
+    """Build a KD-Tree over `embeddings_array` and swap it in together with its metadata."""
+    global EMBEDDING_INDEX
+
+    if len(data) == 0:
+        print("No embeddings found to build index.")
+        EMBEDDING_INDEX = None
+        return
+
+    print("Building KD-Tree index...")
+    index = EmbeddingIndex(KDTree(embeddings_array), data, embeddings_array, max(d["id"] for d in data.values()))
+    # Searches keep using the previous index until this single assignment
+    EMBEDDING_INDEX = index
+    print("KD-Tree index built successfully.")
 
 
 def build_embedding_index(conn):
     """
     Loads all embeddings from the database into memory and builds a KD-Tree index.
     This function should be called within a lock to ensure thread-safety.
+    On failure the previous index (if any) keeps serving; returns False.
     """
-    global KD_TREE_INDEX, EMBEDDINGS_DATA
-    
     try:
         cur = conn.cursor()
         print("Fetching all embeddings from the database...")
@@ -335,48 +538,77 @@ def build_embedding_index(conn):
 
         # Prepare data for KD-Tree and store related metadata
         embeddings_list = []
-        EMBEDDINGS_DATA.clear()
+        data = {}
         for r in rows:
-            emb = np.frombuffer(r[3].read(), dtype=np.float32)
+            emb = np.frombuffer(_read_lob(r[3]), dtype=np.float32)
             embeddings_list.append(emb)
             # Store metadata for efficient lookup later, using the order of the fetched rows
-            EMBEDDINGS_DATA[len(embeddings_list) - 1] = {"id": r[0], "training_id": r[1], "question": r[2]}
-        
-        # Check for empty data
-        if not embeddings_list:
-            print("No embeddings found to build index.")
-            KD_TREE_INDEX = None
-            return
+            data[len(embeddings_list) - 1] = {"id": r[0], "training_id": r[1], "question": r[2]}
 
         embeddings_array = np.array(embeddings_list, dtype='float32')
-
-        print("Building KD-Tree index...")
-        KD_TREE_INDEX = KDTree(embeddings_array)
-
-        print("KD-Tree index built successfully.")
+        _publish_embedding_index(embeddings_array, data)
+        return True
 
     except oracledb.Error as e:
         error, = e.args
-        print(f"Error building embedding index: {error.code} - {error.message}", file=sys.stderr)
-        KD_TREE_INDEX = None
+        print(f"Error building embedding index: {error.code} - {error.message}; keeping the previous index.",
+              file=sys.stderr)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}", file=sys.stderr)
-        KD_TREE_INDEX = None
+        print(f"An unexpected error occurred: {e}; keeping the previous index.", file=sys.stderr)
+    return False
 
 
-def refresh_embedding_index(conn):
+def apply_embedding_delta(conn):
     """
-    Clears the existing in-memory index and rebuilds it from the database.
-    This function should be called when the underlying data has been updated.
+    Incrementally updates the in-memory index: loads only embeddings with an id above
+    the current watermark and drops rows deleted since the last refresh. The vectors
+    already in memory are reused, so no existing BLOB is read again.
+    Returns (added, deleted).
+    """
+    current = EMBEDDING_INDEX
+    cur = conn.cursor()
+    cur.execute("SELECT id, training_id, question, embedding FROM NL2SQL_EMBEDDINGS WHERE id > :1",
+                [current.watermark])
+    new_rows = cur.fetchall()
+    cur.execute("SELECT id FROM NL2SQL_EMBEDDINGS")
+    live_ids = {r[0] for r in cur.fetchall()}
+    cur.close()
+
+    keep = [i for i in range(len(current.data)) if current.data[i]["id"] in live_ids]
+    deleted = len(current.data) - len(keep)
+    if not new_rows and not deleted:
+        return 0, 0
+
+    data = {}
+    for pos, i in enumerate(keep):
+        data[pos] = current.data[i]
+    parts = [current.matrix[keep]]
+    for r in new_rows:
+        data[len(data)] = {"id": r[0], "training_id": r[1], "question": r[2]}
+    if new_rows:
+        parts.append(np.array([np.frombuffer(_read_lob(r[3]), dtype=np.float32) for r in new_rows], dtype='float32'))
+    _publish_embedding_index(np.concatenate(parts), data)
+    return len(new_rows), deleted
+
+
+def refresh_embedding_index(conn, full=False):
+    """
+    Brings the in-memory index up to date with the database. By default only rows
+    added or deleted since the last refresh are fetched; pass full=True (or call it
+    before any index exists) to reload everything. The old index keeps serving
+    searches until the new one is swapped in, and keeps serving if the refresh fails.
     """
-    global KD_TREE_INDEX, EMBEDDINGS_DATA
-    
     with INDEX_BUILD_LOCK:
-        print("Clearing existing in-memory index...")
-        KD_TREE_INDEX = None
-        EMBEDDINGS_DATA = {}
-        print("Index cleared. Rebuilding now.")
-        build_embedding_index(conn)
+        if full or EMBEDDING_INDEX is None:
+            print("Rebuilding embedding index from the database...")
+            build_embedding_index(conn)
+        else:
+            try:
+                added, deleted = apply_embedding_delta(conn)
+                print(f"Incremental index refresh: +{added} / -{deleted} embeddings.")
+            except Exception as e:
+                print(f"Incremental index refresh failed ({e}); rebuilding.", file=sys.stderr)
+                build_embedding_index(conn)
         print("Index refresh complete.")
 
 
@@ -385,20 +617,22 @@ def search_embeddings_kdtree(conn, query_emb, top_k=3):
     Searches for the most similar embeddings using the in-memory KD-Tree index.
     The index is built automatically on the first call.
     """
-    global KD_TREE_INDEX, EMBEDDINGS_DATA
-    
-    if KD_TREE_INDEX is None:
+    if EMBEDDING_INDEX is None:
         print("KD-Tree index is not built. Building now...")
-        build_embedding_index(conn)
-        
-    if KD_TREE_INDEX is None:
+        with INDEX_BUILD_LOCK:
+            if EMBEDDING_INDEX is None:
+                build_embedding_index(conn)
+
+    # Read the index once so a concurrent refresh cannot mix an old tree with new metadata
+    index = EMBEDDING_INDEX
+    if index is None:
         # If the build failed, we can't proceed
         print("Failed to build KD-Tree index.", file=sys.stderr)
         return []
 
     # Perform the search on the in-memory index
     # D: Distances, I: Indices of the found embeddings
-    distances, indices = KD_TREE_INDEX.query(query_emb, k=top_k)
+    distances, indices = index.tree.query(query_emb, k=top_k)
     
     # KDTree returns a tuple of distances and indices, convert to list if only one result
     if top_k == 1:
@@ -407,7 +641,7 @@ def search_embeddings_kdtree(conn, query_emb, top_k=3):
     
     results = []
     # Fetch SQL templates in a single query to avoid the N+1 query problem
-    db_ids_to_fetch = [EMBEDDINGS_DATA[idx]["training_id"] for idx in indices]
+    db_ids_to_fetch = [index.data[idx]["training_id"] for idx in indices]
     
     if not db_ids_to_fetch:
         return []
@@ -422,7 +656,7 @@ def search_embeddings_kdtree(conn, query_emb, top_k=3):
 
     for idx, distance in zip(indices, distances):
         # We need to map the KD-Tree index back to our original database IDs
-        db_data = EMBEDDINGS_DATA.get(idx)
+        db_data = index.data.get(idx)
         if not db_data:
             continue
             
@@ -511,27 +745,61 @@ def fetch_evaluation_prompts(conn):
         return pd.DataFrame()
 
 
-def insert_evaluation_metric(conn, run_id, prompt_id, is_hit):
+def insert_evaluation_metrics(conn, run_id, results, batch_size=None):
     """
-    Inserts a single evaluation metric record into the NL2SQL_METRICS table.
-    Records whether a specific prompt was a 'hit' (1) or a 'miss' (0).
+    Inserts the (prompt_id, is_hit) results of an evaluation run into NL2SQL_METRICS
+    in batches, with one commit. Returns the number of rows inserted (0 on error).
     """
     try:
-        cur = conn.cursor()
-        sql = "INSERT INTO NL2SQL_METRICS (RUN_ID, PROMPT_ID, IS_HIT) VALUES (:1, :2, :3)"
-        cur.execute(sql, [run_id, prompt_id, 1 if is_hit else 0])
-        conn.commit()
-        cur.close()
-        return True
+        rows = ((run_id, int(prompt_id), 1 if is_hit else 0) for prompt_id, is_hit in results)
+        inserted, _ = executemany_batches(
+            conn, "INSERT INTO NL2SQL_METRICS (RUN_ID, PROMPT_ID, IS_HIT) VALUES (:1, :2, :3)",
+            rows, batch_size=batch_size, label="evaluation metrics")
+        return inserted
     except oracledb.Error as e:
         error, = e.args
-        print(f"Error inserting evaluation metric: {error.code} - {error.message}", file=sys.stderr)
+        print(f"Error inserting evaluation metrics: {error.code} - {error.message}", file=sys.stderr)
         conn.rollback()
-        return False
+        return 0
     except Exception as e:
         print(f"An unexpected error occurred: {e}", file=sys.stderr)
         conn.rollback()
-        return False
+        return 0
+
+
+def _sql_key(sql):
+    """Quotes and case folded so expected and retrieved templates compare as equal."""
+    return str(_read_lob(sql) or "").strip().replace("'", '"').lower()
+
+
+def run_bulk_evaluation(conn, model, prompts, run_id, top_k=5, search=None):
+    """
+    Retrieve the top_k templates for each (prompt_id, prompt, expected_sql) and
+    count a hit when the expected SQL is among them. All (prompt_id, is_hit)
+    rows are stored in one insert_evaluation_metrics call.
+    Returns (hits, total).
+    """
+    search = search or search_embeddings_kdtree
+    metrics = []
+    hits = 0
+    for prompt_id, prompt, expected_sql in prompts:
+        q_emb = model.encode([str(_read_lob(prompt) or "")], convert_to_numpy=True)[0]
+        candidates = search(conn, q_emb, top_k=top_k)
+        expected = _sql_key(expected_sql)
+        is_hit = any(_sql_key(c["sql_template"]) == expected for c in candidates)
+        hits += is_hit
+        metrics.append((prompt_id, is_hit))
+    insert_evaluation_metrics(conn, run_id, metrics)
+    return hits, len(metrics)
+
+
+def insert_evaluation_metric(conn, run_id, prompt_id, is_hit):
+    """
+    Inserts a single evaluation metric record into the NL2SQL_METRICS table.
+    Records whether a specific prompt was a 'hit' (1) or a 'miss' (0).
+    Prefer insert_evaluation_metrics for a whole run.
+    """
+    return insert_evaluation_metrics(conn, run_id, [(prompt_id, is_hit)]) == 1
 
 
 def fetch_evaluation_metrics(conn):
@@ -0,0 +1 @@
+"""Helpers shared by the Flask agents (row serialization, streaming, result profiling, Oracle tuning, embeddings)."""
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark query-time sentence embeddings: PyTorch vs ONNX Runtime (fp32 / int8).
+
+Encodes a fixed set of NL2SQL-style questions with each backend. For single
+queries and small batches it reports p50/p95 latency, the load time and peak
+RSS. For parity it compares cosine scores against the torch model (max
+absolute difference of the question-question similarity matrix, and top-1
+retrieval agreement). Output is JSON.
+
+Usage:
+  cd api
+  python agent_common/benchmark_embeddings.py --model local_all-MiniLM-L6-v2 \
+      --backends torch onnx-fp32 onnx-int8 --threads 1 4 --out embed_bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.embedding_service import l2_normalize  # noqa: E402
+from agent_common.onnx_embedding import OnnxEncoder  # noqa: E402
+
+SUBJECTS = ['employees', 'sales', 'customers', 'trades', 'orders', 'invoices', 'accounts', 'products']
+TEMPLATES = [
+    'list all {s}', 'show {s} created last month', 'how many {s} are there', 'top 10 {s} by amount',
+    'count {s} per region', 'which {s} were updated today', 'average value of {s} in 2024',
+    'find duplicate {s}', '{s} with missing owner', 'total {s} for department 10',
+]
+
+
+def questions():
+    return [t.format(s=s) for s in SUBJECTS for t in TEMPLATES]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _load(backend, model_dir, threads):
+    if backend == 'torch':
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_dir, device='cpu')
+    return OnnxEncoder(model_dir, quantized=(backend == 'onnx-int8'), threads=threads)
+
+
+def _latency(model, texts, batch, repeats):
+    latencies = []
+    for r in range(repeats):
+        for start in range(0, len(texts), batch):
+            chunk = texts[start:start + batch]
+            t0 = time.perf_counter()
+            model.encode(chunk, batch_size=batch, normalize_embeddings=True)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+    lat = np.array(latencies)
+    return {'p50_ms': round(float(np.percentile(lat, 50)), 3), 'p95_ms': round(float(np.percentile(lat, 95)), 3),
+            'calls': len(latencies)}
+
+
+def parity(reference, candidate):
+    """Max |cos diff| over the similarity matrix, and top-1 nearest-neighbour agreement."""
+    ref_sim = reference @ reference.T
+    cand_sim = candidate @ candidate.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    finite = np.isfinite(ref_sim)
+    return {
+        'max_abs_cos_diff': round(float(np.max(np.abs(ref_sim[finite] - cand_sim[finite]))), 5),
+        'top1_agreement': round(float(np.mean(ref_sim.argmax(1) == cand_sim.argmax(1))), 4),
+        'self_cos_min': round(float(np.min(np.sum(reference * candidate, axis=1))), 5),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--model', default='local_all-MiniLM-L6-v2', help='local sentence-transformers directory')
+    ap.add_argument('--backends', nargs='+', default=['torch', 'onnx-fp32', 'onnx-int8'])
+    ap.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    ap.add_argument('--batches', type=int, nargs='+', default=[1, 8, 32])
+    ap.add_argument('--repeats', type=int, default=3)
+    ap.add_argument('--out', help='write JSON report here (default: stdout)')
+    args = ap.parse_args(argv)
+
+    texts = questions()
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'model': args.model,
+              'questions': len(texts), 'results': {}}
+    reference = None
+    for threads in args.threads:
+        for backend in args.backends:
+            key = f'{backend}/threads={threads}'
+            try:
+                t0 = time.perf_counter()
+                model = _load(backend, args.model, threads)
+                load_ms = (time.perf_counter() - t0) * 1000.0
+            except Exception as e:
+                report['results'][key] = {'error': str(e)}
+                continue
+            model.encode(texts[:4])  # warm-up
+            entry = {'load_ms': round(load_ms, 1)}
+            for batch in args.batches:
+                entry[f'batch={batch}'] = _latency(model, texts, batch, args.repeats)
+            vecs = l2_normalize(np.asarray(model.encode(texts, batch_size=32), dtype=np.float32))
+            if backend == 'torch' and reference is None:
+                reference = vecs
+            if reference is not None:
+                entry['parity_vs_torch'] = parity(reference, vecs)
+            entry['peak_rss_mb'] = _peak_rss_mb()
+            report['results'][key] = entry
+            single = entry['batch=1']
+            print(f"{key:>24}: single p50 {single['p50_ms']:>7.2f} ms  p95 {single['p95_ms']:>7.2f} ms  "
+                  f"{entry.get('parity_vs_torch', '')}", file=sys.stderr)
+            del model
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""
+Content-addressed, persistent embedding cache for training and indexing tools.
+
+Vectors are keyed by (model fingerprint, hash of the normalized text) and kept
+on disk. A re-run over mostly unchanged text therefore encodes only the new
+text. The layout for one model fingerprint:
+
+  <EMBEDDING_CACHE_DIR>/<fingerprint>/
+    meta.json    {"format", "model", "variant", "dim"}
+    vectors.f32  append-only float32 rows, memory-mapped for reads
+    keys.bin     append-only 16-byte text hashes; record i names row i
+
+Appends hold an exclusive lock on `.lock` and write the vectors before their
+keys. Concurrent writers (two training runs, an indexer) therefore never
+interleave. If a crash happens mid-append, it only leaves unreferenced trailing
+bytes, which the next writer truncates.
+
+`CachedEncoder(model, cache)` wraps anything with SentenceTransformer's
+`encode()`: hits come from the cache, and misses are encoded in one call and
+appended. `cached_encoder(model, model_name, variant)` builds one, or returns
+`model` unchanged when the cache is disabled.
+
+Environment:
+  EMBEDDING_CACHE_DIR  cache root (default api/embedding_cache)
+  EMBEDDING_CACHE      0 disables the cache
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from .embedding_service import _EncoderAPI
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer use only
+    fcntl = None
+
+FORMAT_VERSION = 1
+KEY_BYTES = 16
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'embedding_cache')
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', DEFAULT_CACHE_DIR)
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE', '1') != '0'
+
+_SMALL_FILE_BYTES = 4 * 1024 * 1024
+_SAMPLE_BYTES = 1024 * 1024
+_WS = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Unicode NFC with whitespace runs collapsed and trimmed. Case is kept: cased models see it."""
+    return _WS.sub(' ', unicodedata.normalize('NFC', str(text))).strip()
+
+
+def text_key(text):
+    return hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=KEY_BYTES).digest()
+
+
+def model_fingerprint(model, variant=''):
+    """Stable id for the vectors a model produces.
+
+    For a local model directory it hashes the files: small ones (configs,
+    tokenizer) in full, large weight files by size plus their first and last MiB.
+    Otherwise it hashes the model name (e.g. a hub id or an API model). `variant`
+    names anything else that changes the vectors, such as the backend or
+    quantization.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{FORMAT_VERSION}|{variant}|'.encode('utf-8'))
+    path = os.fspath(model)
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != 'onnx')
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                full = os.path.join(root, name)
+                size = os.path.getsize(full)
+                h.update(f'{os.path.relpath(full, path)}|{size}|'.encode('utf-8'))
+                with open(full, 'rb') as f:
+                    if size <= _SMALL_FILE_BYTES:
+                        h.update(f.read())
+                    else:
+                        h.update(f.read(_SAMPLE_BYTES))
+                        f.seek(size - _SAMPLE_BYTES)
+                        h.update(f.read(_SAMPLE_BYTES))
+    else:
+        h.update(path.encode('utf-8'))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, root, fingerprint, model=None, variant=''):
+        self.dir = os.path.join(root, fingerprint)
+        self.fingerprint = fingerprint
+        self.model = None if model is None else os.fspath(model)
+        self.variant = variant
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        self._rows = {}
+        self._count = 0
+        self._vectors = None
+        self._lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+        self._load_meta()
+        self._load_keys()
+
+    # -- on-disk state -------------------------------------------------------
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _load_meta(self):
+        try:
+            with open(self._path('meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get('format') == FORMAT_VERSION:
+            self.dim = int(meta['dim'])
+
+    def _complete_rows(self):
+        """Rows present in both files; anything past them is a torn append."""
+        if self.dim is None:
+            self._load_meta()  # another writer may have created the cache since we opened it
+        if self.dim is None:
+            return 0
+        try:
+            keys = os.path.getsize(self._path('keys.bin')) // KEY_BYTES
+            vecs = os.path.getsize(self._path('vectors.f32')) // (4 * self.dim)
+        except OSError:
+            return 0
+        return min(keys, vecs)
+
+    def _load_keys(self):
+        """Read key records appended (by any process) since the last load."""
+        total = self._complete_rows()
+        if total <= self._count:
+            return
+        with open(self._path('keys.bin'), 'rb') as f:
+            f.seek(self._count * KEY_BYTES)
+            data = f.read((total - self._count) * KEY_BYTES)
+        for i in range(total - self._count):
+            self._rows.setdefault(data[i * KEY_BYTES:(i + 1) * KEY_BYTES], self._count + i)
+        self._count = total
+        self._vectors = None
+
+    def _matrix(self):
+        if self._vectors is None and self._count:
+            self._vectors = np.memmap(self._path('vectors.f32'), dtype=np.float32, mode='r',
+                                      shape=(self._count, self.dim))
+        return self._vectors
+
+    def _append(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with open(self._path('.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._load_meta()
+                if self.dim is None:
+                    self.dim = int(vectors.shape[1])
+                    tmp = self._path(f'meta.json.tmp{os.getpid()}')
+                    with open(tmp, 'w', encoding='utf-8') as f:
+                        json.dump({'format': FORMAT_VERSION, 'model': self.model, 'variant': self.variant,
+                                   'dim': self.dim}, f)
+                    os.replace(tmp, self._path('meta.json'))
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"embedding cache {self.dir} holds dim {self.dim}, got {vectors.shape[1]}")
+                self._load_keys()
+                fresh = [i for i, k in enumerate(keys) if k not in self._rows]
+                if not fresh:
+                    return
+                # Drop torn trailing bytes, then vectors first, keys last
+                with open(self._path('vectors.f32'), 'ab') as f:
+                    f.truncate(self._count * 4 * self.dim)
+                    f.write(vectors[fresh].tobytes())
+                with open(self._path('keys.bin'), 'ab') as f:
+                    f.truncate(self._count * KEY_BYTES)
+                    f.write(b''.join(keys[i] for i in fresh))
+                self._load_keys()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # -- public API ----------------------------------------------------------
+    def __len__(self):
+        return self._count
+
+    def get_or_compute(self, texts, compute):
+        """float32 (n, dim) vectors for `texts`, calling `compute(missing_texts)` once for the misses."""
+        texts = list(texts)
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            self._load_keys()
+            rows = [self._rows.get(k) for k in keys]
+        missing = {}
+        for i, (k, row) in enumerate(zip(keys, rows)):
+            if row is None:
+                missing.setdefault(k, i)
+        self.hits += len(texts) - sum(1 for r in rows if r is None)
+        self.misses += len(missing)
+
+        computed = {}
+        if missing:
+            order = list(missing)
+            vectors = np.asarray(compute([texts[missing[k]] for k in order]), dtype=np.float32)
+            computed = dict(zip(order, vectors))
+            with self._lock:
+                self._append(order, vectors)
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+
+        with self._lock:
+            matrix = self._matrix()
+            dim = self.dim
+            out = np.empty((len(texts), dim), dtype=np.float32)
+            for i, (k, row) in enumerate(zip(keys, rows)):
+                out[i] = matrix[row] if row is not None else computed[k]
+        return out
+
+    def stats(self):
+        return {"entries": self._count, "hits": self.hits, "misses": self.misses, "dir": self.dir}
+
+
+class CachedEncoder(_EncoderAPI):
+    """SentenceTransformer-compatible `encode()` that only runs `model` on texts not in `cache`."""
+
+    def __init__(self, model, cache):
+        self.model = model
+        self.cache = cache
+
+    def _encode_texts(self, texts, batch_size=None):
+        return self.cache.get_or_compute(texts, lambda missing: self.model.encode(
+            missing, batch_size=batch_size or 32, convert_to_numpy=True, show_progress_bar=False))
+
+    def get_sentence_embedding_dimension(self):
+        getter = getattr(self.model, 'get_sentence_embedding_dimension', None)
+        return getter() if getter is not None else super().get_sentence_embedding_dimension()
+
+
+_caches = {}
+_caches_by_model = {}
+_caches_lock = threading.Lock()
+
+
+def open_cache(model, variant='', root=None):
+    """The shared cache for `model`/`variant`, or None when EMBEDDING_CACHE=0.
+
+    The model is fingerprinted once per process and (root, model, variant); a
+    model whose files change needs a new process to get a new cache.
+    """
+    if not EMBEDDING_CACHE_ENABLED and root is None:
+        return None
+    root = root or EMBEDDING_CACHE_DIR
+    by_model = (root, os.fspath(model), variant)
+    with _caches_lock:
+        cache = _caches_by_model.get(by_model)
+    if cache is not None:
+        return cache
+    fingerprint = model_fingerprint(model, variant)
+    with _caches_lock:
+        cache = _caches.get((root, fingerprint))
+        if cache is None:
+            cache = _caches[(root, fingerprint)] = EmbeddingCache(root, fingerprint, model, variant)
+        _caches_by_model[by_model] = cache
+        return cache
+
+
+def cached_encoder(model, model_name, variant='torch', root=None):
+    """Wrap `model` (loaded from `model_name`) in a CachedEncoder, unless the cache is disabled."""
+    cache = open_cache(model_name, variant, root)
+    return model if cache is None else CachedEncoder(model, cache)
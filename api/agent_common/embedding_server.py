@@ -0,0 +1,54 @@
+"""
+Shared embedding service: one copy of each model for every agent on the host.
+
+Run:  python api/agent_common/embedding_server.py
+Then start the agents with EMBEDDING_SERVICE_URL=http://localhost:5020.
+
+  POST /encode  {"texts": [...], "model": optional}  ->  {"shape": [n, dim], "embeddings_b64": "..."}
+  GET  /health  ->  {"status": "ok", "models": {name: batching stats}}
+
+Requests are served on a threaded server and go through the in-process
+`BatchingEncoder`, so concurrent requests from different agents become one
+model call. Only the models in EMBEDDING_SERVICE_MODELS (default
+LOCAL_EMBED_MODEL) are loaded; they are loaded at startup.
+"""
+import os
+import sys
+
+from flask import Flask, jsonify, request
+
+try:
+    from .embedding_service import encode_vectors, get_local_encoder
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from agent_common.embedding_service import encode_vectors, get_local_encoder
+
+DEFAULT_MODEL = os.getenv('LOCAL_EMBED_MODEL', 'all-MiniLM-L6-v2')
+SERVICE_MODELS = [m.strip() for m in os.getenv('EMBEDDING_SERVICE_MODELS', DEFAULT_MODEL).split(',') if m.strip()]
+SERVICE_PORT = int(os.getenv('EMBEDDING_SERVICE_PORT', '5020'))
+
+app = Flask(__name__)
+
+
+@app.route("/encode", methods=["POST"])
+def encode():
+    body = request.get_json(silent=True) or {}
+    texts = body.get("texts")
+    model = body.get("model") or SERVICE_MODELS[0]
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({"error": "texts must be a list of strings"}), 400
+    if model not in SERVICE_MODELS:
+        return jsonify({"error": f"model not served: {model}"}), 400
+    return jsonify(encode_vectors(get_local_encoder(model).encode(texts)))
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    return jsonify({"status": "ok", "models": {m: get_local_encoder(m).stats() for m in SERVICE_MODELS}})
+
+
+if __name__ == "__main__":
+    for name in SERVICE_MODELS:
+        print(f"Loading embedding model {name}...")
+        get_local_encoder(name)
+    app.run(host="0.0.0.0", port=SERVICE_PORT, threaded=True)
@@ -0,0 +1,255 @@
+"""
+Shared sentence-embedding access for the agents.
+
+`get_encoder(model_name)` returns a drop-in replacement for
+`SentenceTransformer(model_name)`: same `encode()` call (a str gives a 1-D
+vector, a list gives a 2-D array; `normalize_embeddings` supported), plus
+`embed_query`/`embed_documents` for LangChain-style callers.
+
+- In process (default): each model is loaded once per process and wrapped in a
+  `BatchingEncoder`. Small concurrent `encode()` calls from request threads are
+  queued and run as one model call. The worker takes what is already waiting,
+  then waits at most `EMBED_BATCH_WINDOW_MS` for more, up to `EMBED_BATCH_MAX`
+  texts. Calls with at least `EMBED_BATCH_MAX` texts (index builds) go straight
+  to the model.
+- Shared service: with `EMBEDDING_SERVICE_URL` set, `encode()` posts to the
+  embedding server (`embedding_server.py`). All agents then share one copy of
+  each model, and requests from different agents are batched together.
+
+Models run on PyTorch via sentence-transformers, or on ONNX Runtime with
+`EMBED_BACKEND=onnx` (int8 quantized by default, see onnx_embedding.py).
+
+Environment:
+  EMBEDDING_SERVICE_URL    e.g. http://localhost:5020 (unset = in process)
+  EMBED_BACKEND            torch (default) | onnx
+  EMBED_ONNX_QUANTIZE      1 = int8 ONNX model (default), 0 = fp32
+  EMBED_ONNX_THREADS       ONNX Runtime intra-op threads (0 = runtime default)
+  EMBED_BATCH_MAX          max texts per batched model call (64)
+  EMBED_BATCH_WINDOW_MS    max wait for more requests before encoding (2)
+"""
+import base64
+import json
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+DEFAULT_MAX_BATCH = int(os.getenv('EMBED_BATCH_MAX', '64'))
+DEFAULT_WINDOW_SECONDS = float(os.getenv('EMBED_BATCH_WINDOW_MS', '2')) / 1000.0
+EMBEDDING_SERVICE_URL = os.getenv('EMBEDDING_SERVICE_URL', '').strip()
+EMBED_BACKEND = os.getenv('EMBED_BACKEND', 'torch').strip().lower()
+EMBED_ONNX_QUANTIZE = os.getenv('EMBED_ONNX_QUANTIZE', '1') != '0'
+EMBED_ONNX_THREADS = int(os.getenv('EMBED_ONNX_THREADS', '0'))
+
+
+def l2_normalize(vecs):
+    norms = np.linalg.norm(vecs, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vecs / norms).astype(np.float32, copy=False)
+
+
+class _EncoderAPI:
+    """SentenceTransformer-compatible surface over `_encode_texts(list) -> float32 (n, dim)`."""
+
+    def encode(self, sentences, batch_size=None, show_progress_bar=None, convert_to_numpy=True,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vecs = self._encode_texts(texts, batch_size) if texts else np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(vecs):
+            vecs = l2_normalize(vecs)
+        return vecs[0] if single else vecs
+
+    def embed_query(self, text):
+        return self.encode(text).tolist()
+
+    def embed_documents(self, texts):
+        return self.encode(list(texts)).tolist()
+
+    def get_sentence_embedding_dimension(self):
+        return int(self.encode(['dim_probe']).shape[1])
+
+
+class _Pending:
+    __slots__ = ('texts', 'done', 'result', 'error')
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchingEncoder(_EncoderAPI):
+    def __init__(self, model, max_batch=None, window_seconds=None, name='embed-batcher'):
+        """`model` is anything with SentenceTransformer's `encode(texts, batch_size=..., ...)`."""
+        self.model = model
+        self.max_batch = max(1, DEFAULT_MAX_BATCH if max_batch is None else max_batch)
+        self.window_seconds = DEFAULT_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.name = name
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def _model_encode(self, texts, batch_size=None):
+        vecs = self.model.encode(texts, batch_size=batch_size or max(len(texts), 1), convert_to_numpy=True,
+                                 show_progress_bar=False)
+        return np.asarray(vecs, dtype=np.float32)
+
+    def _encode_texts(self, texts, batch_size=None):
+        self.requests += 1
+        if len(texts) >= self.max_batch:
+            return self._model_encode(texts, batch_size or 32)
+        self._ensure_worker()
+        pending = _Pending(texts)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def get_sentence_embedding_dimension(self):
+        getter = getattr(self.model, 'get_sentence_embedding_dimension', None)
+        return getter() if getter is not None else super().get_sentence_embedding_dimension()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(): each worker process starts its own batcher
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name=self.name, daemon=True)
+            self._thread.start()
+
+    def _collect(self, q):
+        batch = [q.get()]
+        n = len(batch[0].texts)
+        deadline = time.monotonic() + self.window_seconds
+        while n < self.max_batch:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            batch.append(item)
+            n += len(item.texts)
+        return batch
+
+    def _run(self, q):
+        while True:
+            batch = self._collect(q)
+            texts = [t for p in batch for t in p.texts]
+            try:
+                vecs = self._model_encode(texts)
+                i = 0
+                for p in batch:
+                    p.result = vecs[i:i + len(p.texts)]
+                    i += len(p.texts)
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            finally:
+                self.batches += 1
+                self.texts += len(texts)
+                self.largest_batch = max(self.largest_batch, len(texts))
+                for p in batch:
+                    p.done.set()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+
+class RemoteEncoder(_EncoderAPI):
+    def __init__(self, url, model_name=None, timeout=30.0):
+        self.url = url.rstrip('/') + '/encode'
+        self.model_name = model_name
+        self.timeout = timeout
+
+    def _encode_texts(self, texts, batch_size=None):
+        body = json.dumps({"texts": texts, "model": self.model_name}).encode('utf-8')
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                payload = json.loads(resp.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            # The service reports bad requests as {"error": ...} with a 4xx/5xx status
+            detail = e.read().decode('utf-8', 'replace')
+            try:
+                detail = json.loads(detail).get("error", detail)
+            except (ValueError, AttributeError):
+                pass
+            raise RuntimeError(f"embedding service: HTTP {e.code}: {detail}") from e
+        if "error" in payload:
+            raise RuntimeError(f"embedding service: {payload['error']}")
+        return decode_vectors(payload)
+
+
+def encode_vectors(vecs):
+    """float32 (n, dim) -> JSON-safe dict (base64 little-endian bytes; much smaller than float lists)."""
+    vecs = np.ascontiguousarray(vecs, dtype='<f4')
+    return {"shape": list(vecs.shape), "embeddings_b64": base64.b64encode(vecs.tobytes()).decode('ascii')}
+
+
+def decode_vectors(payload):
+    shape = tuple(payload["shape"])
+    return np.frombuffer(base64.b64decode(payload["embeddings_b64"]), dtype='<f4').reshape(shape).astype(np.float32)
+
+
+_local_encoders = {}
+_remote_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def load_model(model_name, backend=None):
+    backend = EMBED_BACKEND if backend is None else backend
+    if backend == 'onnx':
+        from .onnx_embedding import OnnxEncoder
+        return OnnxEncoder(model_name, quantized=EMBED_ONNX_QUANTIZE, threads=EMBED_ONNX_THREADS)
+    if backend != 'torch':
+        raise ValueError(f"Unknown EMBED_BACKEND: {backend}")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def get_local_encoder(model_name):
+    """Batching encoder over a model loaded once per process."""
+    with _encoders_lock:
+        encoder = _local_encoders.get(model_name)
+        if encoder is None:
+            encoder = _local_encoders[model_name] = BatchingEncoder(load_model(model_name))
+        return encoder
+
+
+def get_encoder(model_name, service_url=None):
+    """Encoder for `model_name`: the shared embedding service if configured, else in process."""
+    url = EMBEDDING_SERVICE_URL if service_url is None else service_url
+    if not url:
+        return get_local_encoder(model_name)
+    with _encoders_lock:
+        encoder = _remote_encoders.get((url, model_name))
+        if encoder is None:
+            encoder = _remote_encoders[(url, model_name)] = RemoteEncoder(url, model_name)
+        return encoder
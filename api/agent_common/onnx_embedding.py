@@ -0,0 +1,187 @@
+"""
+ONNX Runtime backend for sentence-transformers models (CPU inference).
+
+`export_onnx(model_dir)` exports the transformer of a local sentence-transformers
+model directory (e.g. api/local_all-MiniLM-L6-v2) to `<model_dir>/onnx/model.onnx`.
+By default it also writes an int8 dynamically quantized copy, `model.int8.onnx`.
+The export needs torch, transformers and onnxruntime, and runs once.
+
+`OnnxEncoder(model_dir)` serves the exported model. At query time it needs only
+onnxruntime, the `tokenizers` package and numpy. It reads the pooling mode,
+max_seq_length and Normalize step from the model directory, so its output
+matches `SentenceTransformer(model_dir).encode()` up to quantization error. It
+has the same `encode()` signature, so it can replace the torch model anywhere,
+including inside `embedding_service.BatchingEncoder`.
+
+Environment (read by embedding_service.load_model):
+  EMBED_BACKEND        torch (default) | onnx
+  EMBED_ONNX_QUANTIZE  1 = int8 model (default), 0 = fp32 export
+  EMBED_ONNX_THREADS   ONNX Runtime intra-op threads (0 = runtime default)
+"""
+import json
+import os
+
+import numpy as np
+
+from .embedding_service import l2_normalize
+
+ONNX_SUBDIR = 'onnx'
+
+
+def onnx_model_path(model_dir, quantized=True):
+    return os.path.join(model_dir, ONNX_SUBDIR, 'model.int8.onnx' if quantized else 'model.onnx')
+
+
+def read_model_config(model_dir):
+    """Pooling mode, Normalize step and max_seq_length from a sentence-transformers directory."""
+    cfg = {'pooling': 'mean', 'normalize': False, 'max_seq_length': 256}
+    try:
+        with open(os.path.join(model_dir, 'modules.json'), encoding='utf-8') as f:
+            modules = json.load(f)
+    except (OSError, ValueError):
+        modules = []
+    for m in modules:
+        mtype = m.get('type', '')
+        if mtype.endswith('.Normalize'):
+            cfg['normalize'] = True
+        elif mtype.endswith('.Pooling'):
+            try:
+                with open(os.path.join(model_dir, m.get('path', ''), 'config.json'), encoding='utf-8') as f:
+                    pooling = json.load(f)
+            except (OSError, ValueError):
+                pooling = {}
+            if pooling.get('pooling_mode_cls_token'):
+                cfg['pooling'] = 'cls'
+            elif pooling.get('pooling_mode_max_tokens'):
+                cfg['pooling'] = 'max'
+    try:
+        with open(os.path.join(model_dir, 'sentence_bert_config.json'), encoding='utf-8') as f:
+            cfg['max_seq_length'] = int(json.load(f).get('max_seq_length', cfg['max_seq_length']))
+    except (OSError, ValueError, TypeError):
+        pass
+    return cfg
+
+
+def pool(hidden, attention_mask, mode='mean'):
+    """Token embeddings (batch, seq, dim) -> sentence embeddings (batch, dim), padding masked out."""
+    if mode == 'cls':
+        return hidden[:, 0].astype(np.float32)
+    mask = attention_mask[..., None].astype(np.float32)
+    if mode == 'max':
+        return np.where(mask > 0, hidden, -1e9).max(axis=1).astype(np.float32)
+    summed = (hidden * mask).sum(axis=1)
+    return (summed / np.clip(mask.sum(axis=1), 1e-9, None)).astype(np.float32)
+
+
+def export_onnx(model_dir, quantize=True, opset=14):
+    """Export `model_dir` to ONNX (and int8). Returns the path of the model to serve."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir = os.path.join(model_dir, ONNX_SUBDIR)
+    os.makedirs(out_dir, exist_ok=True)
+    fp32_path = onnx_model_path(model_dir, quantized=False)
+    if not os.path.exists(fp32_path):
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        model = AutoModel.from_pretrained(model_dir).eval()
+        inputs = tokenizer(["export probe sentence"], return_tensors='pt')
+        input_names = [n for n in ('input_ids', 'attention_mask', 'token_type_ids') if n in inputs]
+        dynamic_axes = {n: {0: 'batch', 1: 'seq'} for n in input_names + ['last_hidden_state']}
+        tmp = fp32_path + f'.tmp{os.getpid()}'
+        with torch.no_grad():
+            torch.onnx.export(model, tuple(inputs[n] for n in input_names), tmp, input_names=input_names,
+                              output_names=['last_hidden_state'], dynamic_axes=dynamic_axes,
+                              opset_version=opset, do_constant_folding=True)
+        os.replace(tmp, fp32_path)
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    int8_path = onnx_model_path(model_dir, quantized=True)
+    if not os.path.exists(int8_path):
+        tmp = int8_path + f'.tmp{os.getpid()}.onnx'
+        quantize_dynamic(fp32_path, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, int8_path)
+    return int8_path
+
+
+class OnnxEncoder:
+    def __init__(self, model_dir, quantized=True, threads=0, onnx_path=None, export_if_missing=True):
+        from tokenizers import Tokenizer
+
+        if not os.path.isdir(model_dir):
+            raise ValueError(f"ONNX embedding backend needs a local model directory, got: {model_dir}")
+        path = onnx_path or onnx_model_path(model_dir, quantized)
+        if not os.path.exists(path):
+            if not export_if_missing:
+                raise FileNotFoundError(path)
+            path = export_onnx(model_dir, quantize=quantized)
+
+        self.model_dir = model_dir
+        self.onnx_path = path
+        self.threads = int(threads or 0)
+        self.config = read_model_config(model_dir)
+        self._session = None
+        self._session_pid = None
+        self._input_names = None
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        pad_id = self.tokenizer.token_to_id('[PAD]')
+        self.tokenizer.enable_padding(pad_id=0 if pad_id is None else pad_id, pad_token='[PAD]')
+        self._dim = None
+
+    @property
+    def session(self):
+        # ONNX Runtime sessions do not survive fork(): a pre-fork worker opens its own
+        if self._session_pid != os.getpid():
+            import onnxruntime as ort
+            opts = ort.SessionOptions()
+            opts.intra_op_num_threads = self.threads
+            opts.inter_op_num_threads = 1
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._session = ort.InferenceSession(self.onnx_path, opts, providers=['CPUExecutionProvider'])
+            self._session_pid = os.getpid()
+            self._input_names = {i.name for i in self._session.get_inputs()}
+        return self._session
+
+    @property
+    def input_names(self):
+        # Read from the session on first use, so a preloading master never opens one
+        self.session
+        return self._input_names
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {'input_ids': ids, 'attention_mask': mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+        return pool(hidden, mask, self.config['pooling'])
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=None, convert_to_numpy=True,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Length-sorted batches keep padding (and wasted compute) low, as SentenceTransformer does
+        order = np.argsort([-len(t) for t in texts], kind='stable')
+        out = np.empty((len(texts), 0), dtype=np.float32)
+        step = max(1, batch_size or 32)
+        for start in range(0, len(texts), step):
+            rows = order[start:start + step]
+            vecs = self._embed_batch([texts[i] for i in rows])
+            if out.shape[1] == 0:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[rows] = vecs
+        if self.config['normalize'] or normalize_embeddings:
+            out = l2_normalize(out)
+        return out[0] if single else out
+
+    def get_sentence_embedding_dimension(self):
+        if self._dim is None:
+            self._dim = int(self._embed_batch(['dim_probe']).shape[1])
+        return self._dim
@@ -0,0 +1,145 @@
+"""
+Oracle connection tuning shared by the agents.
+
+An inline LOB output type handler fetches CLOB / NCLOB columns as `str` and
+BLOB columns as `bytes` directly in the row data (`DB_TYPE_LONG` /
+`DB_TYPE_LONG_NVARCHAR` / `DB_TYPE_LONG_RAW`). Rows then no longer carry LOB
+locators that each cost an extra round trip to `.read()`.
+
+An inline var holds at most `LOB_INLINE_MAX_BYTES` per value, and the driver
+allocates that for every row of a fetch. So inlining is opt-in, where values
+are known to be bounded:
+
+- `inline_lobs(cursor)` before `execute()`, for one statement (template SQL,
+  embedding vectors, ...). It also lowers the cursor's arraysize so that one
+  LOB column's buffer stays within `LOB_INLINE_BUFFER_BYTES`. python-oracledb
+  requires a var's arraysize to be at least the cursor's, so the LOB var alone
+  cannot be made smaller.
+- `install_lob_handler(conn)` for a whole connection, with `LOB_INLINE=1`.
+  Here the arraysize belongs to the caller: a LOB column whose buffer would
+  exceed the budget keeps its locators instead.
+
+Everything else keeps locators. Every locator `.read()` should go through
+`read_lob()`, so `lob_stats()` reports the remaining LOB round trips.
+
+Environment:
+  LOB_INLINE               1 inlines LOBs on every connection the agents open (0)
+  LOB_INLINE_MAX_BYTES     largest inlined value (128 KiB)
+  LOB_INLINE_BUFFER_BYTES  per-column fetch buffer budget (32 MiB)
+"""
+import os
+import threading
+
+try:
+    import oracledb
+except Exception:  # pragma: no cover - oracledb is optional for callers that only format rows
+    oracledb = None
+
+LOB_INLINE = os.getenv('LOB_INLINE', '0') == '1'
+LOB_INLINE_MAX_BYTES = int(os.getenv('LOB_INLINE_MAX_BYTES', str(128 * 1024)))
+LOB_INLINE_BUFFER_BYTES = int(os.getenv('LOB_INLINE_BUFFER_BYTES', str(32 * 1024 * 1024)))
+
+_stats_lock = threading.Lock()
+_stats = {'lob_round_trips': 0, 'lob_bytes_read': 0, 'inline_lob_columns': 0, 'locator_lob_columns': 0}
+
+
+def _count(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def lob_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_lob_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+def _lob_types():
+    lob = getattr(oracledb, 'LOB', None) if oracledb is not None else None
+    return (lob,) if isinstance(lob, type) else ()
+
+
+def is_lob(value):
+    types = _lob_types()
+    return bool(types) and isinstance(value, types)
+
+
+def read_lob(value):
+    """Return LOB contents (one round trip, counted); other values pass through."""
+    if not is_lob(value):
+        return value
+    data = value.read()
+    _count('lob_round_trips')
+    if data is not None:
+        _count('lob_bytes_read', len(data))
+    return data
+
+
+def make_lob_handler(max_bytes=None, fallback=None, buffer_bytes=None):
+    """Output type handler inlining LOB columns; other columns go to `fallback` if given.
+
+    A LOB column whose buffer (`max_bytes` x the cursor's arraysize) would exceed
+    `buffer_bytes` keeps its locators.
+    """
+    max_bytes = LOB_INLINE_MAX_BYTES if max_bytes is None else max_bytes
+    buffer_bytes = LOB_INLINE_BUFFER_BYTES if buffer_bytes is None else buffer_bytes
+    inline = {
+        'DB_TYPE_CLOB': 'DB_TYPE_LONG',
+        'DB_TYPE_NCLOB': 'DB_TYPE_LONG_NVARCHAR',
+        'DB_TYPE_BLOB': 'DB_TYPE_LONG_RAW',
+    }
+    targets = {}
+    for src, dst in inline.items():
+        s, d = getattr(oracledb, src, None), getattr(oracledb, dst, None)
+        if s is not None and d is not None:
+            targets[s] = d
+
+    def handler(cursor, name, default_type, size, precision, scale):
+        target = targets.get(default_type)
+        if target is not None and max_bytes * cursor.arraysize > buffer_bytes:
+            _count('locator_lob_columns')
+            target = None
+        if target is None:
+            return fallback(cursor, name, default_type, size, precision, scale) if fallback else None
+        _count('inline_lob_columns')
+        return cursor.var(target, size=max_bytes, arraysize=cursor.arraysize)
+    return handler
+
+
+def install_lob_handler(conn, max_bytes=None):
+    """Fetch LOB columns inline on `conn` when LOB_INLINE=1 (or `max_bytes` is given),
+    keeping any handler already installed (e.g. SQLAlchemy's) for the other columns.
+    Returns `conn` for chaining."""
+    if max_bytes is None:
+        max_bytes = LOB_INLINE_MAX_BYTES if LOB_INLINE else 0
+    if oracledb is None or max_bytes <= 0:
+        return conn
+    previous = getattr(conn, 'outputtypehandler', None)
+    if getattr(previous, '_inlines_lobs', False):
+        return conn
+    handler = make_lob_handler(max_bytes, fallback=previous)
+    handler._inlines_lobs = True
+    handler._fallback = previous
+    conn.outputtypehandler = handler
+    return conn
+
+
+def inline_lobs(cursor, max_bytes=None):
+    """Fetch this cursor's LOB columns inline; call before `execute()`, and only for
+    statements whose LOB values stay within `max_bytes`. Returns `cursor`."""
+    max_bytes = LOB_INLINE_MAX_BYTES if max_bytes is None else max_bytes
+    if oracledb is None or max_bytes <= 0:
+        return cursor
+    # Cap rows per fetch so one LOB column's buffer fits the budget
+    cursor.arraysize = max(1, min(cursor.arraysize, LOB_INLINE_BUFFER_BYTES // max_bytes))
+    connection = getattr(cursor, 'connection', None)
+    previous = getattr(connection, 'outputtypehandler', None)
+    if getattr(previous, '_inlines_lobs', False):
+        previous = getattr(previous, '_fallback', None)
+    cursor.outputtypehandler = make_lob_handler(max_bytes, fallback=previous)
+    return cursor
@@ -0,0 +1,94 @@
+"""
+Pre-fork serving support for the agents (see api/gunicorn.conf.py).
+
+Under gunicorn with `preload_app`, the master imports the agent once. Models,
+memory-mapped template indexes and other read-only state are then loaded before
+any worker is forked, and the workers share those pages copy-on-write.
+Everything that cannot cross a fork is created per process instead:
+
+- `ProcessLocal(factory)` builds its value lazily, once per PID. Use it for
+  Oracle pools and other resources that hold sockets. If the master opened one
+  during preload, `prepare_fork()` closes it and each worker opens its own.
+- `on_worker_start(fn)` runs `fn` right away in a normal single-process run.
+  In a pre-fork master it runs `fn` in every worker just after the fork. Use it
+  to start background threads, since threads do not survive fork().
+
+`prepare_fork()` also collects garbage once and then calls `gc.freeze()`. Objects
+that already exist move to the permanent generation, so the collector in a
+worker never writes to them and never un-shares their pages.
+
+Environment:
+  AGENT_PREFORK  set to 1 by gunicorn.conf.py before the app is imported
+"""
+import gc
+import os
+import threading
+import weakref
+
+_IMPORT_PID = os.getpid()
+_worker_hooks = []
+_process_locals = weakref.WeakSet()
+_collected = False
+
+
+def preforking():
+    """True while importing the app in a pre-fork master (before any worker exists)."""
+    return os.environ.get('AGENT_PREFORK') == '1' and os.getpid() == _IMPORT_PID
+
+
+def on_worker_start(fn):
+    """Run `fn()` now, or in each worker after fork when the app is preloaded. Usable as a decorator."""
+    if preforking():
+        _worker_hooks.append(fn)
+    else:
+        fn()
+    return fn
+
+
+def after_fork():
+    """Call in each worker right after fork (gunicorn `post_fork`)."""
+    for fn in list(_worker_hooks):
+        fn()
+
+
+def prepare_fork():
+    """Call in the master before forking workers (gunicorn `pre_fork`)."""
+    global _collected
+    for local in list(_process_locals):
+        local.close()
+    if not _collected:
+        gc.collect()
+        _collected = True
+    gc.freeze()
+
+
+class ProcessLocal:
+    def __init__(self, factory, close=None):
+        """`factory()` builds the value; `close(value)` (optional) releases it in the process that built it."""
+        self.factory = factory
+        self._close = close
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+        _process_locals.add(self)
+
+    def get(self):
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid != os.getpid():
+                # A value inherited across fork belongs to the parent: never use or close it here
+                self._value = self.factory()
+                self._pid = os.getpid()
+            return self._value
+
+    def close(self):
+        with self._lock:
+            value, owned = self._value, self._pid == os.getpid()
+            self._value = None
+            self._pid = None
+        if owned and value is not None and self._close is not None:
+            try:
+                self._close(value)
+            except Exception as e:
+                print(f"Closing {value!r} before fork failed: {e}")
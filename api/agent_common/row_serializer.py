@@ -0,0 +1,194 @@
+"""
+Per-query compiled row serializer.
+
+`build_row_serializer(cursor.description, ...)` inspects the column types once
+and picks one converter per column (date -> ISO string, NUMBER -> int/float,
+CLOB -> text or preview, BLOB -> base64 preview or size summary, everything
+else passthrough). Serializing a row is then a `dict(zip(...))` plus the
+converters for the few columns that need one, encoded with orjson when it is
+installed.
+"""
+import base64
+import datetime
+import decimal
+import json
+
+try:
+    import orjson as _orjson
+except Exception:  # pragma: no cover - optional dependency
+    _orjson = None
+
+from .oracle_tuning import is_lob, read_lob
+
+
+DEFAULT_MAX_CLOB_PREVIEW = 8192
+DEFAULT_MAX_BLOB_PREVIEW = 2048
+
+# Type names as exposed by python-oracledb / cx_Oracle DbType objects
+_DATE_TYPES = {'DB_TYPE_DATE', 'DB_TYPE_TIMESTAMP', 'DB_TYPE_TIMESTAMP_TZ', 'DB_TYPE_TIMESTAMP_LTZ', 'DATETIME', 'TIMESTAMP'}
+_NUMBER_TYPES = {'DB_TYPE_NUMBER', 'NUMBER'}
+_FLOAT_TYPES = {'DB_TYPE_BINARY_FLOAT', 'DB_TYPE_BINARY_DOUBLE', 'DB_TYPE_BINARY_INTEGER', 'NATIVE_FLOAT', 'NATIVE_INT'}
+_STRING_TYPES = {'DB_TYPE_VARCHAR', 'DB_TYPE_NVARCHAR', 'DB_TYPE_CHAR', 'DB_TYPE_NCHAR', 'DB_TYPE_LONG', 'DB_TYPE_LONG_NVARCHAR',
+                 'DB_TYPE_ROWID', 'DB_TYPE_UROWID', 'DB_TYPE_BOOLEAN', 'STRING', 'FIXED_CHAR', 'ROWID', 'BOOLEAN'}
+_CLOB_TYPES = {'DB_TYPE_CLOB', 'DB_TYPE_NCLOB', 'CLOB', 'NCLOB'}
+_BLOB_TYPES = {'DB_TYPE_BLOB', 'DB_TYPE_RAW', 'DB_TYPE_LONG_RAW', 'BLOB', 'BINARY', 'LONG_BINARY'}
+
+
+def _type_name(type_code):
+    if type_code is None:
+        return ''
+    return str(getattr(type_code, 'name', type_code)).upper()
+
+
+def _iso(v):
+    return None if v is None else v.isoformat()
+
+
+def _number(v):
+    if type(v) is decimal.Decimal:
+        try:
+            return float(v)
+        except Exception:
+            return str(v)
+    return v
+
+
+def _clob_converter(max_preview):
+    def conv(v):
+        if v is None:
+            return None
+        try:
+            data = read_lob(v)
+        except Exception:
+            return {"_type": "LOB", "repr": str(v)}
+        if max_preview is not None and isinstance(data, str) and len(data) > max_preview:
+            return {"_type": "CLOB", "length": len(data), "preview": data[:max_preview], "truncated": True}
+        return data
+    return conv
+
+
+def blob_preview(b, max_preview):
+    length = len(b)
+    preview_len = min(length, max_preview)
+    return {
+        "_type": "BLOB",
+        "length": length,
+        "preview_base64": base64.b64encode(b[:preview_len]).decode('ascii'),
+        "preview_bytes": preview_len,
+        "truncated": length > preview_len,
+    }
+
+
+def _blob_converter(max_preview, blob_format):
+    def conv(v):
+        if v is None:
+            return None
+        try:
+            data = read_lob(v)
+        except Exception:
+            return {"_type": "LOB", "repr": str(v)}
+        if isinstance(data, str):
+            return data
+        b = bytes(data)
+        if blob_format == 'summary':
+            return f"(BLOB {len(b)} bytes)"
+        return blob_preview(b, max_preview)
+    return conv
+
+
+def generic_converter(max_clob_preview=DEFAULT_MAX_CLOB_PREVIEW, max_blob_preview=DEFAULT_MAX_BLOB_PREVIEW, blob_format='preview'):
+    """Value-inspecting converter for columns whose type is unknown up front."""
+    clob = _clob_converter(max_clob_preview)
+    blob = _blob_converter(max_blob_preview, blob_format)
+
+    def conv(v):
+        if v is None or isinstance(v, (str, int, float, bool)):
+            return v
+        if isinstance(v, (datetime.date, datetime.datetime, datetime.time)):
+            return v.isoformat()
+        if isinstance(v, decimal.Decimal):
+            return _number(v)
+        if is_lob(v):
+            try:
+                data = read_lob(v)
+            except Exception:
+                return {"_type": "LOB", "repr": str(v)}
+            return clob(data) if isinstance(data, str) else blob(data)
+        if isinstance(v, (bytes, bytearray, memoryview)):
+            return blob(v)
+        return v
+    return conv
+
+
+def _default(o):
+    if isinstance(o, (datetime.date, datetime.datetime, datetime.time)):
+        return o.isoformat()
+    return str(o)
+
+
+if _orjson is not None:
+    def dumps(obj):
+        try:
+            return _orjson.dumps(obj, default=_default).decode('utf-8')
+        except TypeError:
+            # orjson rejects ints wider than 64 bits (e.g. NUMBER(38) ids)
+            return json.dumps(obj, default=_default)
+else:
+    def dumps(obj):
+        return json.dumps(obj, default=_default)
+
+
+class RowSerializer:
+    def __init__(self, columns, converters):
+        self.columns = list(columns)
+        self.converters = list(converters)
+        # Only columns that need work are touched per row; the rest go through dict(zip())
+        self._active = [(i, c, conv) for i, (c, conv) in enumerate(zip(self.columns, self.converters)) if conv is not None]
+
+    def to_dict(self, row):
+        d = dict(zip(self.columns, row))
+        for i, col, conv in self._active:
+            d[col] = conv(row[i])
+        return d
+
+    def dumps(self, row):
+        return dumps(self.to_dict(row))
+
+    def ndjson(self, rows):
+        """Encode a batch of rows as one NDJSON string (trailing newline included)."""
+        if not rows:
+            return ''
+        to_dict = self.to_dict
+        return '\n'.join(dumps(to_dict(r)) for r in rows) + '\n'
+
+
+def build_row_serializer(description, columns=None, max_clob_preview=DEFAULT_MAX_CLOB_PREVIEW,
+                         max_blob_preview=DEFAULT_MAX_BLOB_PREVIEW, blob_format='preview'):
+    """Compile a serializer from a DB-API `cursor.description`.
+
+    `max_clob_preview=None` returns CLOB text untruncated. `blob_format` is
+    'preview' (base64 preview object) or 'summary' ("(BLOB n bytes)").
+    Columns of unrecognised type fall back to the value-inspecting converter.
+    """
+    description = list(description or [])
+    if columns is None:
+        columns = [d[0] for d in description]
+    clob = _clob_converter(max_clob_preview)
+    blob = _blob_converter(max_blob_preview, blob_format)
+    generic = generic_converter(max_clob_preview, max_blob_preview, blob_format)
+    converters = []
+    for i, _ in enumerate(columns):
+        name = _type_name(description[i][1]) if i < len(description) and len(description[i]) > 1 else ''
+        if name in _STRING_TYPES or name in _FLOAT_TYPES:
+            converters.append(None)
+        elif name in _NUMBER_TYPES:
+            converters.append(_number)
+        elif name in _DATE_TYPES:
+            converters.append(_iso)
+        elif name in _CLOB_TYPES:
+            converters.append(clob)
+        elif name in _BLOB_TYPES:
+            converters.append(blob)
+        else:
+            converters.append(generic)
+    return RowSerializer(columns, converters)
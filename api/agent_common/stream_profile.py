@@ -0,0 +1,289 @@
+"""
+Bounded-memory profiling of streamed query results (used for narration).
+
+Sketches, each updated with a whole fetchmany batch at a time:
+- `HeavyHitters`   Misra-Gries top values; `capacity` counters, counts are
+                   underestimated by at most `error` (<= n / (capacity + 1))
+- `KLLQuantiles`   KLL quantile sketch (numpy compactors), ~1-2% rank error at k=200
+- `HyperLogLog`    distinct-count estimate, ~1.6% standard error at p=12 (4 KiB)
+- `RunningMoments` count/min/max/mean/variance, merged per batch (Welford/Chan)
+
+`build_result_profile(cursor.description)` picks the sketches per column from
+the column type once (numbers get moments + quantiles, dates min/max, LOBs are
+only counted), so a batch costs one transpose plus a few C-level passes per
+column instead of Python work per value.
+"""
+import heapq
+import math
+import random
+from collections import Counter
+
+import numpy as np
+
+from .row_serializer import _BLOB_TYPES, _CLOB_TYPES, _DATE_TYPES, _FLOAT_TYPES, _NUMBER_TYPES, _type_name
+
+DEFAULT_TOP_CAPACITY = 64
+DEFAULT_KLL_K = 200
+DEFAULT_HLL_PRECISION = 12
+
+
+class HeavyHitters:
+    def __init__(self, capacity=DEFAULT_TOP_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.n = 0
+        self.error = 0
+
+    def update(self, values):
+        batch = Counter(values)
+        if not batch:
+            return
+        self.n += sum(batch.values())
+        counts = self.counts
+        for v, c in batch.items():
+            counts[v] = counts.get(v, 0) + c
+        if len(counts) > self.capacity:
+            # Mergeable Misra-Gries: subtract the (capacity+1)-th largest count from every counter
+            cut = heapq.nlargest(self.capacity + 1, counts.values())[-1]
+            self.error += cut
+            self.counts = {v: c - cut for v, c in counts.items() if c > cut}
+
+    def top(self, n=5):
+        return heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])
+
+
+class KLLQuantiles:
+    def __init__(self, k=DEFAULT_KLL_K, c=2.0 / 3.0, seed=None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = random.Random(seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(2, int(math.ceil(self.k * self.c ** depth)))
+
+    def update(self, values):
+        arr = np.asarray(values, dtype=np.float64).ravel()
+        arr = arr[np.isfinite(arr)]
+        if not arr.size:
+            return
+        self.n += arr.size
+        self.levels[0] = np.concatenate((self.levels[0], arr))
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            buf = self.levels[h]
+            if len(buf) >= self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                buf = np.sort(buf)
+                odd = len(buf) % 2
+                # Every other item moves up with twice the weight; an odd one out stays here
+                promoted = buf[self._rng.randint(0, 1):len(buf) - odd:2]
+                self.levels[h] = buf[len(buf) - odd:]
+                self.levels[h + 1] = np.concatenate((self.levels[h + 1], promoted))
+            h += 1
+
+    def quantiles(self, qs):
+        items = np.concatenate(self.levels)
+        if not items.size:
+            return [None for _ in qs]
+        weights = np.concatenate([np.full(len(buf), 2.0 ** h) for h, buf in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cum = items[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cum, np.asarray(qs, dtype=np.float64) * cum[-1], side='left')
+        return [float(items[min(i, len(items) - 1)]) for i in idx]
+
+
+def _mix64(h):
+    # splitmix64 finalizer; Python's hash() of small ints is the int itself
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+class HyperLogLog:
+    def __init__(self, p=DEFAULT_HLL_PRECISION):
+        if not 11 <= p <= 18:
+            raise ValueError("HyperLogLog precision must be between 11 and 18")
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, values):
+        if not values:
+            return
+        with np.errstate(over='ignore'):
+            h = _mix64(np.fromiter(map(_hash, values), dtype=np.int64, count=len(values)).view(np.uint64))
+        idx = (h >> np.uint64(64 - self.p)).astype(np.intp)
+        # The low 64-p bits are exact in a float64, so frexp gives their bit length
+        _, bits = np.frexp((h & np.uint64((1 << (64 - self.p)) - 1)).astype(np.float64))
+        rho = (64 - self.p) - bits + 1
+        np.maximum.at(self.registers, idx, rho.astype(np.uint8))
+
+    def count(self):
+        m = self.m
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+def _hash(v):
+    try:
+        return hash(v)
+    except TypeError:
+        return hash(str(v))
+
+
+class RunningMoments:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        arr = np.asarray(values, dtype=np.float64).ravel()
+        arr = arr[np.isfinite(arr)]
+        n_b = arr.size
+        if not n_b:
+            return
+        mean_b = float(arr.mean())
+        m2_b = float(np.square(arr - mean_b).sum())
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.count * n_b / n
+        self.count = n
+        lo, hi = float(arr.min()), float(arr.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+NUMERIC, TEMPORAL, TEXT, LOB = 'numeric', 'temporal', 'text', 'lob'
+
+
+def column_kind(type_code):
+    name = _type_name(type_code)
+    if name in _NUMBER_TYPES or name in _FLOAT_TYPES:
+        return NUMERIC
+    if name in _DATE_TYPES:
+        return TEMPORAL
+    if name in _CLOB_TYPES or name in _BLOB_TYPES:
+        return LOB
+    return TEXT  # strings and unknown types
+
+
+class ColumnProfile:
+    def __init__(self, name, kind, top_capacity=DEFAULT_TOP_CAPACITY, kll_k=DEFAULT_KLL_K,
+                 hll_precision=DEFAULT_HLL_PRECISION):
+        self.name = name
+        self.kind = kind
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.moments = RunningMoments() if kind == NUMERIC else None
+        self.quantiles = KLLQuantiles(kll_k) if kind == NUMERIC else None
+        self.top = HeavyHitters(top_capacity) if kind != LOB else None
+        self.distinct = HyperLogLog(hll_precision) if kind != LOB else None
+
+    def update(self, column):
+        values = [v for v in column if v is not None and v != ""]
+        self.nulls += len(column) - len(values)
+        if not values:
+            return
+        self.count += len(values)
+        if self.kind == LOB:
+            return
+        if self.kind == NUMERIC:
+            try:
+                arr = np.asarray(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                arr = np.asarray([_to_float(v) for v in values], dtype=np.float64)
+            self.moments.update(arr)
+            self.quantiles.update(arr)
+        elif self.kind == TEMPORAL:
+            try:
+                lo, hi = min(values), max(values)
+                self.min = lo if self.min is None else min(self.min, lo)
+                self.max = hi if self.max is None else max(self.max, hi)
+            except TypeError:
+                pass
+        try:
+            self.top.update(values)
+        except TypeError:
+            values = [str(v) for v in values]
+            self.top.update(values)
+        self.distinct.update(values)
+
+
+def _to_float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class ResultProfile:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.rows = 0
+
+    def update(self, rows):
+        if not rows:
+            return
+        self.rows += len(rows)
+        for col, values in zip(self.columns, zip(*rows)):
+            col.update(values)
+
+    def tap(self, batches):
+        """Pass row batches through unchanged, profiling each one on the way."""
+        for batch in batches:
+            self.update(batch)
+            yield batch
+
+    def summary(self, top_n=5, qs=(0.5, 0.9, 0.99)):
+        """Compact JSON-ready profile: {"rows", "numeric": [...], "temporal": [...], "categorical": [...]}."""
+        numeric, temporal, categorical = [], [], []
+        for c in self.columns:
+            if c.moments is not None and c.moments.count:
+                m = c.moments
+                entry = {"column": c.name, "count": m.count, "min": m.min, "max": m.max, "avg": m.mean,
+                         "stddev": math.sqrt(m.variance)}
+                entry.update({f"p{int(q * 100)}": v for q, v in zip(qs, c.quantiles.quantiles(qs))})
+                numeric.append(entry)
+            if c.kind == TEMPORAL and c.min is not None:
+                temporal.append({"column": c.name, "count": c.count, "min": c.min, "max": c.max})
+            if c.top is not None and c.top.counts:
+                categorical.append({
+                    "column": c.name,
+                    "top_values": [{"value": str(k), "count": v} for k, v in c.top.top(top_n)],
+                    "distinct_estimate": c.distinct.count(),
+                })
+        return {"rows": self.rows, "numeric": numeric, "temporal": temporal, "categorical": categorical}
+
+
+def build_result_profile(description, columns=None, **opts):
+    """Create a `ResultProfile` for a DB-API `cursor.description` (column kind chosen by type)."""
+    description = list(description or [])
+    if columns is None:
+        columns = [d[0] for d in description]
+    profiles = []
+    for i, name in enumerate(columns):
+        type_code = description[i][1] if i < len(description) and len(description[i]) > 1 else None
+        profiles.append(ColumnProfile(name, column_kind(type_code), **opts))
+    return ResultProfile(profiles)
@@ -0,0 +1,184 @@
+"""
+Batched NDJSON streaming for cursor results.
+
+Rows are pulled with `fetchmany(arraysize)` and a whole batch is encoded into
+one buffered chunk, so the WSGI server sees a few large writes instead of one
+tiny write per row. A chunk is flushed when it reaches `flush_bytes` or when
+`flush_seconds` have passed since the last flush; the first batch is always
+flushed immediately to keep time-to-first-byte low.
+
+`multiplex()` runs several such streams concurrently (e.g. the queries of one
+dashboard) and interleaves their chunks in one response, every line tagged
+with the id of the query it belongs to.
+
+Environment defaults:
+  AGENT_FETCH_ARRAYSIZE     rows per fetchmany round trip (1000)
+  AGENT_FETCH_PREFETCHROWS  rows returned with the execute round trip (1000)
+  AGENT_FLUSH_BYTES         flush threshold in bytes (64 KiB)
+  AGENT_FLUSH_SECONDS       max buffering time in seconds (0.05)
+"""
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_ARRAYSIZE = int(os.getenv('AGENT_FETCH_ARRAYSIZE', '1000'))
+DEFAULT_PREFETCHROWS = int(os.getenv('AGENT_FETCH_PREFETCHROWS', '1000'))
+DEFAULT_FLUSH_BYTES = int(os.getenv('AGENT_FLUSH_BYTES', str(64 * 1024)))
+DEFAULT_FLUSH_SECONDS = float(os.getenv('AGENT_FLUSH_SECONDS', '0.05'))
+
+
+def tune_cursor(cursor, arraysize=None, prefetchrows=None):
+    """Set fetch sizes on a DB-API cursor. `prefetchrows` only takes effect before execute()."""
+    arraysize = DEFAULT_ARRAYSIZE if arraysize is None else arraysize
+    prefetchrows = DEFAULT_PREFETCHROWS if prefetchrows is None else prefetchrows
+    try:
+        cursor.arraysize = arraysize
+    except Exception:
+        pass
+    if hasattr(cursor, 'prefetchrows'):
+        try:
+            cursor.prefetchrows = prefetchrows
+        except Exception:
+            pass
+    return cursor
+
+
+def fetch_batches(cursor, arraysize=None):
+    """Yield lists of rows from anything with fetchmany() (DB-API cursor or SQLAlchemy Result)."""
+    size = DEFAULT_ARRAYSIZE if arraysize is None else arraysize
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def ndjson_chunks(batches, encode_row, flush_bytes=None, flush_seconds=None, clock=time.monotonic):
+    """Encode row batches into NDJSON chunks flushed by size or time.
+
+    `encode_row(row)` returns one JSON document without the trailing newline.
+    """
+    flush_bytes = DEFAULT_FLUSH_BYTES if flush_bytes is None else flush_bytes
+    flush_seconds = DEFAULT_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+    parts = []
+    size = 0
+    flushed = False
+    last = clock()
+    for batch in batches:
+        for row in batch:
+            line = encode_row(row)
+            parts.append(line)
+            size += len(line) + 1
+        if parts and (not flushed or size >= flush_bytes or clock() - last >= flush_seconds):
+            parts.append('')
+            yield '\n'.join(parts)
+            parts = []
+            size = 0
+            flushed = True
+            last = clock()
+    if parts:
+        parts.append('')
+        yield '\n'.join(parts)
+
+
+def stream_cursor(cursor, encode_row, arraysize=None, flush_bytes=None, flush_seconds=None):
+    """fetch_batches + ndjson_chunks in one call."""
+    return ndjson_chunks(fetch_batches(cursor, arraysize), encode_row, flush_bytes, flush_seconds)
+
+
+# Metadata lines the agents emit between rows; any other line is a row, even one
+# whose first column name starts with an underscore
+META_KEYS = ('_narration', '_base_sql', '_column_types', '_search_columns')
+_META_PREFIXES = tuple('{"%s"' % k for k in META_KEYS)
+
+
+def tag_chunk(chunk, request_id):
+    """Tag every NDJSON line of `chunk` with `request_id`. Returns (tagged chunk, row lines).
+
+    Metadata lines (starting with a META_KEYS key) get `"id"` added; row lines
+    become `{"id": ..., "row": {...}}` so a column named ID cannot clash with the tag.
+    """
+    tag = json.dumps(request_id)
+    out = []
+    rows = 0
+    for line in chunk.split('\n'):
+        if not line:
+            continue
+        if line.startswith(_META_PREFIXES):
+            out.append('{"id":' + tag + ',' + line[1:])
+        else:
+            out.append('{"id":' + tag + ',"row":' + line + '}')
+            rows += 1
+    if out:
+        out.append('')
+    return '\n'.join(out), rows
+
+
+_STREAM_DONE = object()
+
+
+def multiplex(streams, max_workers=4, max_pending=64):
+    """Run NDJSON streams concurrently and yield their tagged chunks as they arrive.
+
+    `streams` is a list of (request_id, make_chunks); `make_chunks()` returns the
+    plain NDJSON chunks of one query and runs on one of `max_workers` threads, so
+    at most that many connections are busy at once. Each stream ends with a
+    `{"id", "done": true, "rows", "elapsed_ms"}` line, or `{"id", "error"}` if it
+    raised. At most `max_pending` chunks are buffered; a slow client therefore
+    slows the queries down instead of growing memory. Closing the generator
+    (client disconnect) stops the remaining streams at their next chunk.
+    """
+    if not streams:
+        return
+    out = queue.Queue(maxsize=max(1, max_pending))
+    cancelled = threading.Event()
+
+    def put(item):
+        while not cancelled.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(request_id, make_chunks):
+        t0 = time.perf_counter()
+        rows = 0
+        chunks = None
+        try:
+            chunks = iter(make_chunks())
+            for chunk in chunks:
+                tagged, n = tag_chunk(chunk, request_id)
+                rows += n
+                if tagged and not put(tagged):
+                    return
+            put(json.dumps({"id": request_id, "done": True, "rows": rows,
+                            "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 1)}) + '\n')
+        except Exception as e:
+            put(json.dumps({"id": request_id, "error": str(e)}, default=str) + '\n')
+        finally:
+            # Closing the generator releases its cursor and connection right away
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            put(_STREAM_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(streams))),
+                                  thread_name_prefix='ndjson-mux')
+    try:
+        for request_id, make_chunks in streams:
+            executor.submit(run, request_id, make_chunks)
+        remaining = len(streams)
+        while remaining:
+            item = out.get()
+            if item is _STREAM_DONE:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
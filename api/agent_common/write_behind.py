@@ -0,0 +1,164 @@
+"""
+Write-behind queue for fire-and-forget writes (audit logs, fallback prompts).
+
+Request handlers `submit()` a record and return immediately. A daemon thread
+drains the queue and hands the sink one batch at a time, either once
+`max_batch` records are waiting or `flush_seconds` after the first record of
+a batch arrived. So N misses cost one `executemany` and one commit instead of
+N commits on the request path. Memory is bounded by `max_pending`; records
+submitted while the queue is full are dropped and counted. `close()` (also
+registered with atexit) writes whatever is still queued.
+
+Environment defaults:
+  AGENT_WRITE_BEHIND_BATCH        records per sink call (200)
+  AGENT_WRITE_BEHIND_FLUSH_MS     max delay before a partial batch is written (200, at least 10)
+  AGENT_WRITE_BEHIND_MAX_PENDING  queued records before new ones are dropped (10000)
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+DEFAULT_MAX_BATCH = int(os.getenv('AGENT_WRITE_BEHIND_BATCH', '200'))
+DEFAULT_FLUSH_SECONDS = int(os.getenv('AGENT_WRITE_BEHIND_FLUSH_MS', '200')) / 1000.0
+DEFAULT_MAX_PENDING = int(os.getenv('AGENT_WRITE_BEHIND_MAX_PENDING', '10000'))
+# The worker waits up to flush_seconds for records; 0 would make it spin
+MIN_FLUSH_SECONDS = 0.01
+
+
+class WriteBehindQueue:
+    def __init__(self, sink, max_batch=None, flush_seconds=None, max_pending=None, name='write-behind'):
+        """`sink(records)` writes a list of records; it runs on the background thread only."""
+        self.sink = sink
+        self.max_batch = max(1, DEFAULT_MAX_BATCH if max_batch is None else max_batch)
+        self.flush_seconds = max(MIN_FLUSH_SECONDS, DEFAULT_FLUSH_SECONDS if flush_seconds is None else flush_seconds)
+        self.max_pending = DEFAULT_MAX_PENDING if max_pending is None else max_pending
+        self.name = name
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(): a worker process gets its own queue and thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, record):
+        """Queue one record; returns False if it was dropped (queue full or closed)."""
+        if self._closed.is_set():
+            self._count_drop()
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count_drop()
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _count_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def _next_batch(self, q):
+        try:
+            batch = [q.get(timeout=self.flush_seconds)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.max_batch:
+            try:
+                if self._closed.is_set():
+                    batch.append(q.get_nowait())
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        q = self._queue
+        while not (self._closed.is_set() and q.empty()):
+            batch = self._next_batch(q)
+            if not batch:
+                continue
+            try:
+                self.sink(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"{self.name}: failed to write {len(batch)} record(s): {e}")
+            finally:
+                for _ in batch:
+                    q.task_done()
+
+    def flush(self, timeout=None):
+        """Block until every record queued so far has been handed to the sink. Returns True if it was."""
+        q = self._queue
+        if q is None:
+            return True
+        with q.all_tasks_done:
+            return q.all_tasks_done.wait_for(lambda: q.unfinished_tasks == 0, timeout)
+
+    def close(self, timeout=5.0):
+        """Stop accepting records and write out the ones already queued."""
+        self._closed.set()
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            thread.join(timeout)
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+def executemany_sink(get_conn, sql):
+    """Sink that inserts each batch with one `executemany` and one commit on a fresh/pooled connection."""
+    def sink(records):
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.executemany(sql, records)
+            finally:
+                cur.close()
+            conn.commit()
+        finally:
+            conn.close()
+    return sink
+
+
+def text_file_sink(path):
+    """Sink that appends pre-formatted text records to `path` with one open/write per batch."""
+    def sink(records):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(''.join(records))
+    return sink
@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify, Response, stream_with_context
 from sqlalchemy import create_engine, text
-from sentence_transformers import SentenceTransformer
 from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
 from sklearn.metrics.pairwise import cosine_similarity
@@ -10,6 +9,9 @@ import datetime
 import decimal
 import json
 import pickle
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.embedding_service import get_encoder
 
 app = Flask(__name__)
 
@@ -28,7 +30,8 @@ engine = create_engine(db_uri)
 LOCAL_EMBED_MODEL=os.getenv('LOCAL_EMBED_MODEL')
 
 # -- Load embedder --
-embedder = SentenceTransformer(LOCAL_EMBED_MODEL)
+# Shared, micro-batched encoder (see agent_common/embedding_service.py)
+embedder = get_encoder(LOCAL_EMBED_MODEL)
 
 # -- Cache examples in memory --
 cached_examples = []
@@ -17,14 +17,35 @@ export ORACLE_DSN=host:port/service_name
 
 import os
 import json
-import re
 import numpy as np
 from flask import Flask, request, Response, jsonify
 # Removed urllib; HTTP calls are currently disabled/commented
-from sentence_transformers import SentenceTransformer
 import oracledb
-from scipy.spatial import KDTree
 import datetime
+import sys
+import threading
+import time
+from collections import namedtuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.row_serializer import build_row_serializer
+from agent_common.streaming import fetch_batches, multiplex, ndjson_chunks, stream_cursor, tune_cursor
+from agent_common.stream_profile import build_result_profile
+from agent_common.oracle_tuning import inline_lobs, install_lob_handler, lob_stats, read_lob
+from agent_common.write_behind import WriteBehindQueue, executemany_sink
+from agent_common.embedding_service import get_encoder
+from agent_common.prefork import ProcessLocal, on_worker_start, preforking
+
+try:
+    from .template_index import apply_delta, build_index as build_template_index
+    from .template_snapshot import load_snapshot, save_snapshot
+    from .prompt_cache import EmbeddingLRU, build_exact_map, normalize_prompt
+    from .template_plan import attach_plans, parse_named_parameters
+except ImportError:
+    from template_index import apply_delta, build_index as build_template_index
+    from template_snapshot import load_snapshot, save_snapshot
+    from prompt_cache import EmbeddingLRU, build_exact_map, normalize_prompt
+    from template_plan import attach_plans, parse_named_parameters
 
 
 ###############################################################################
@@ -40,28 +61,50 @@ ORACLE_SERVICE  = os.environ.get("DB_SERVICE", "orcl")
 EMBEDDER_MODEL = os.environ.get("LOCAL_EMBED_MODEL", "/Users/naveengupta/veda-chatbot/api/local_all-MiniLM-L6-v2")
 SIMILARITY_THRESHOLD = 0.52
 DEFAULT_LIMIT = 10
-SEARCH_K = 20  # Number of neighbors to retrieve from KD-Tree for similarity check
+SEARCH_K = 20  # Number of neighbors to retrieve from the template index for similarity check
 
-# Global variables for the index and data
-kdtree_index = None
-templates_data = []
+# On-disk index snapshot (memory-mapped at startup, refreshed from Oracle in the background)
+TEMPLATE_INDEX_DIR = os.environ.get("TEMPLATE_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "template_index_snapshot"))
+TEMPLATE_INDEX_REFRESH_ON_START = os.environ.get("TEMPLATE_INDEX_REFRESH_ON_START", "1") != "0"
+# Incremental refresh period (rows with id > watermark, plus deletions); 0 = only at startup
+TEMPLATE_INDEX_REFRESH_SECONDS = int(os.environ.get("TEMPLATE_INDEX_REFRESH_SECONDS", "60"))
+
+# Recent prompt -> query embedding, so repeated prompts skip the encoder
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+
+# /query_batch: max prompts per request, and queries run at once (keep below the pool max of 5)
+QUERY_BATCH_MAX = int(os.environ.get("QUERY_BATCH_MAX", "32"))
+QUERY_BATCH_CONCURRENCY = int(os.environ.get("QUERY_BATCH_CONCURRENCY", "4"))
+
+# The live index and its templates (row i of the index is templates[i]), swapped as one object.
+# `exact` maps normalized question/synonym text -> row for the no-embedding fast path.
+IndexState = namedtuple("IndexState", ["index", "templates", "manifest", "exact"])
+index_state = IndexState(None, [], None, {})
+_rebuild_lock = threading.Lock()
 
 
 ###############################################################################
 # 1) Oracle connection
 ###############################################################################
 
-pool = oracledb.create_pool(
+# One pool per process: a pool opened by a pre-fork master is closed before forking
+pool = ProcessLocal(lambda: oracledb.create_pool(
     user=ORACLE_USER,
     password=ORACLE_PASS,
     dsn=f"{ORACLE_HOST}:{ORACLE_PORT}/?service_name={ORACLE_SERVICE}",
     min=1,
     max=5,
     increment=1
-)
+), close=lambda p: p.close(force=True))
 
 def get_conn():
-    return pool.acquire()
+    # LOB_INLINE=1 fetches every CLOB/BLOB inline; otherwise only statements that opt in
+    return install_lob_handler(pool.get().acquire())
+
+# Prompts that fell below the similarity threshold, inserted in batches off the request path
+fallback_log = WriteBehindQueue(
+    executemany_sink(get_conn, "insert into NL2SQL_FALLBACK(prompt) values(:user_query)"),
+    name="nl2sql-fallback-log")
 
 #def get_conn():
  #   return oracledb.connect(user=ORACLE_USER, password=ORACLE_PASS, dsn=f"{ORACLE_HOST}:{ORACLE_PORT}/?service_name={ORACLE_SERVICE}")
@@ -70,39 +113,39 @@ def get_conn():
 # Load Templates + Embeddings
 ###############################################################################
 print("Loading embedder...")
-EMBEDDER = SentenceTransformer(EMBEDDER_MODEL)
+# Loaded once per process (or served by EMBEDDING_SERVICE_URL); concurrent encodes are micro-batched
+EMBEDDER = get_encoder(EMBEDDER_MODEL)
+query_embeddings = EmbeddingLRU(QUERY_EMBEDDING_CACHE_SIZE)
 
-def load_templates_from_db():
+def load_templates_from_db(since_id=None):
     """
-    Loads all query templates and their embeddings from the Oracle database.
+    Loads query templates and their embeddings from the Oracle database.
+    With `since_id`, only embeddings with a larger id are loaded.
     """
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT a.id, a.training_id name, a.question intent_text, b.sql_template, a.embedding FROM nl2sql_embeddings a , nl2sql_training b where b.id=a.training_id")
+    # Questions, SQL templates and embedding vectors are small: fetch them inline, not per locator
+    cur = inline_lobs(conn.cursor())
+    sql = "SELECT a.id, a.training_id name, a.question intent_text, b.sql_template, a.embedding FROM nl2sql_embeddings a , nl2sql_training b where b.id=a.training_id"
+    if since_id is None:
+        cur.execute(sql + " order by a.id")
+    else:
+        cur.execute(sql + " and a.id > :since_id order by a.id", {"since_id": since_id})
     templates = []
     for row in cur:
         id_, name, intent_text, sql_template, embedding_blob = row
 
-        # Convert CLOB -> str, handling potential LOB objects for intent_text
-        if isinstance(intent_text, oracledb.LOB):
-            intent_text_str = intent_text.read()
-        elif isinstance(intent_text, str):
-            intent_text_str = intent_text
-        else:
-            intent_text_str = ""
-
-        # Convert CLOB -> str, handling potential LOB objects for sql_template
-        sql_text = ""
-        if isinstance(sql_template, oracledb.LOB):
-            sql_text = sql_template.read()
-        elif isinstance(sql_template, str):
-            sql_text = sql_template
-        
-        # Convert BLOB -> numpy array, handling potential LOB objects
+        # CLOB/BLOB values normally arrive inline; locators (if any) are read via read_lob
+        intent_text = read_lob(intent_text)
+        intent_text_str = intent_text if isinstance(intent_text, str) else ""
+
+        sql_template = read_lob(sql_template)
+        sql_text = sql_template if isinstance(sql_template, str) else ""
+
+        # Convert BLOB -> numpy array
         emb = None
-        if isinstance(embedding_blob, oracledb.LOB):
-            emb_bytes = embedding_blob.read()
-            emb = np.frombuffer(emb_bytes, dtype=np.float32)
+        embedding_blob = read_lob(embedding_blob)
+        if isinstance(embedding_blob, (bytes, bytearray)):
+            emb = np.frombuffer(embedding_blob, dtype=np.float32)
 
         templates.append({
             "id": id_,
@@ -115,88 +158,155 @@ def load_templates_from_db():
     conn.close()
     return templates
 
-def retrieve_best_template(query: str):
-    """
-    Searches for the best matching template using the KD-Tree index.
-    """
-    global kdtree_index
-    global templates_data
-
-    if kdtree_index is None or not templates_data:
-        raise RuntimeError("Index has not been built. Please call /build_index first.")
-
-    # Encode the user query
-    q_emb = EMBEDDER.encode([query], normalize_embeddings=True)[0]
-
-    # Use the KD-Tree to find the top K nearest neighbors by Euclidean distance
-    distances, indices = kdtree_index.query(q_emb, k=SEARCH_K)
-
-    # KD-Tree returns Euclidean distance. We need cosine similarity
-    # Formula for L2-normalized vectors: cos_sim = 1 - (dist^2 / 2)
-    # This is a bit of a hack, but ensures consistency with the threshold.
-    # A more robust solution might be to re-calculate dot product on top K.
-    similarities = 1 - (distances**2 / 2)
+def load_template_ids():
+    """Ids of every embedding row (no LOBs), used to detect deletions."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            tune_cursor(cur)
+            cur.execute("SELECT id FROM nl2sql_embeddings")
+            return {row[0] for row in cur}
+
+def _save_index_snapshot(index, templates, watermark):
+    # Deleted rows are masked in memory but never written out
+    if hasattr(index, "compacted"):
+        matrix, keep = index.compacted()
+        templates = [templates[i] for i in keep]
+    else:
+        matrix = index.matrix
+    return save_snapshot(TEMPLATE_INDEX_DIR, matrix, templates, watermark,
+                         model=EMBEDDER_MODEL, extra={"kind": index.kind})
+
+def publish_index(templates, vectors, watermark=None, normalized=False, save=True, manifest=None):
+    """Build an index over `vectors` and make it live; optionally persist it as the new snapshot."""
+    global index_state
+    attach_plans(templates)
+    index = build_template_index(vectors, normalized=normalized)
+    if save:
+        manifest = _save_index_snapshot(index, templates, watermark)
+    index_state = IndexState(index, templates, manifest, build_exact_map(templates))
+    return index_state
+
+def load_index_snapshot():
+    """Serve from the last snapshot on disk, if there is one for this model."""
+    t0 = time.perf_counter()
+    snap = load_snapshot(TEMPLATE_INDEX_DIR, model=EMBEDDER_MODEL)
+    if snap is None:
+        return None
+    vectors, templates, manifest = snap
+    state = publish_index(templates, vectors, normalized=True, save=False, manifest=manifest)
+    print(f"Loaded template index snapshot v{manifest['version']} ({len(templates)} templates, "
+          f"watermark {manifest['watermark']}) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    return state
+
+def rebuild_index_from_db():
+    """Reload every template from Oracle, publish the new index and snapshot it. Returns the state."""
+    with _rebuild_lock:
+        # Templates without an embedding are dropped so index rows line up with the template list
+        templates = [t for t in load_templates_from_db() if t["embedding"] is not None]
+        if not templates:
+            return None
+        vectors = np.stack([t.pop("embedding") for t in templates])
+        return publish_index(templates, vectors, watermark=max(t["id"] for t in templates))
 
-    # Combine global indices and similarities for sorting
-    ranked_results = sorted(list(zip(indices, similarities)), key=lambda x: x[1], reverse=True)
-
-    # The best result is the first one in the sorted list
-    best_match_global_index, best_sim = ranked_results[0]
-    
-    # Get the best template object from the global data list using the correct index
-    best_template = templates_data[best_match_global_index]
-    
-    # Return the full ranked list for the fallback message
-    ranked = ranked_results
-    
-    return best_template, best_sim, ranked
+def refresh_index_delta():
+    """Apply rows added (id > watermark) or deleted since the last refresh, copy-on-write.
 
+    Falls back to a full rebuild when there is no index yet. Returns (state, added, deleted).
+    """
+    global index_state
+    with _rebuild_lock:
+        state = index_state
+        watermark = (state.manifest or {}).get("watermark")
+        if state.index is not None and watermark is not None:
+            added = [t for t in load_templates_from_db(since_id=watermark) if t["embedding"] is not None]
+            live_ids = load_template_ids()
+            deleted_mask = getattr(state.index, "deleted", None)
+            drop_rows = [i for i, t in enumerate(state.templates)
+                         if t["id"] not in live_ids and not (deleted_mask is not None and deleted_mask[i])]
+            if not added and not drop_rows:
+                return state, 0, 0
+            vectors = np.stack([t.pop("embedding") for t in added]) if added else None
+            attach_plans(added)
+            index, templates = apply_delta(state.index, state.templates, vectors, added, drop_rows)
+            new_watermark = max([watermark] + [t["id"] for t in added])
+            # Readers keep the state they already hold; this single assignment publishes the new one
+            exact = build_exact_map(templates, getattr(index, "deleted", None))
+            index_state = IndexState(index, templates, dict(state.manifest, watermark=new_watermark), exact)
+            manifest = _save_index_snapshot(index, templates, new_watermark)
+            index_state = index_state._replace(manifest=manifest)
+            return index_state, len(added), len(drop_rows)
+    state = rebuild_index_from_db()
+    return state, len(state.templates) if state else 0, 0
+
+def _refresh_index_in_background():
+    while True:
+        try:
+            state, added, deleted = refresh_index_delta()
+            if added or deleted:
+                print(f"Template index refreshed from Oracle (+{added} / -{deleted}, "
+                      f"{len(state.index) if state else 0} live templates).")
+        except Exception as e:
+            print(f"Background template index refresh failed: {e}")
+        if TEMPLATE_INDEX_REFRESH_SECONDS <= 0:
+            return
+        time.sleep(TEMPLATE_INDEX_REFRESH_SECONDS)
 
-###############################################################################
-# Named Parameter Extraction
-###############################################################################
-def extract_named_parameters(user_query: str) -> dict:
+def retrieve_best_template(query: str):
     """
-    Extract parameters in the format {param=value} from user query.
-    Returns a dict of param_name -> value
+    Searches for the best matching template in the template index.
+    Scores are cosine similarities, best first.
+    A prompt that normalizes to a known training question or synonym is
+    matched directly (similarity 1.0) without encoding; its stored vector
+    still ranks the suggestions.
     """
-    params = {}
-    matches = re.findall(r"\{(.*?)=(.*?)\}", user_query)
-    for name, value in matches:
-        name = name.strip()
-        value = value.strip()
-        # Convert numeric if possible
-        if value.isdigit():
-            value = int(value)
-        else:
-            try:
-                value = float(value)
-            except ValueError:
-                pass
-        params[name] = value
-    return params
+    return retrieve_best_templates([query])[0]
 
-def inject_named_parameters(sql_template: str, param_dict: dict) -> str:
+def retrieve_best_templates(queries):
     """
-    Replace {param_name} in SQL template with :param_name bind variables.
-    Case-insensitive for parameter names.
+    retrieve_best_template for several prompts against one index snapshot.
+    Prompts that miss the exact map and the embedding LRU are encoded in a
+    single encoder call. Returns one (template, similarity, ranked) per prompt.
     """
-    new_sql = sql_template
+    index, data, _, exact = index_state
 
-    # Build lowercase dict for matching
-    lower_param_dict = {k.lower(): v for k, v in param_dict.items()}
-
-    # Find all placeholders like {param}
-    placeholders = re.findall(r"\{(.*?)\}", sql_template)
+    if index is None or not data:
+        raise RuntimeError("Index has not been built. Please call /build_index first.")
 
-    for ph in placeholders:
-        key = ph.lower()
-        if key not in lower_param_dict:
-            raise ValueError(f"Missing value for parameter: {ph} SQL:{new_sql}")
-        # Replace exactly as it appears in the template with the bind variable
-        new_sql = new_sql.replace(f"{{{ph}}}", f":{key}")
+    results = [None] * len(queries)
+    embeddings = {}
+    exact_rows = {}
+    for i, query in enumerate(queries):
+        row = exact.get(normalize_prompt(query))
+        if row is not None:
+            exact_rows[i] = row
+            embeddings[i] = index.matrix[row]
+            continue
+        # Reuse the embedding of a recent identical prompt
+        q_emb = query_embeddings.get(query)
+        if q_emb is not None:
+            embeddings[i] = q_emb
+
+    to_encode = list(dict.fromkeys(q for i, q in enumerate(queries) if i not in embeddings))
+    if to_encode:
+        encoded = dict(zip(to_encode, EMBEDDER.encode(to_encode, normalize_embeddings=True)))
+        for query, q_emb in encoded.items():
+            query_embeddings.put(query, q_emb)
+        for i, query in enumerate(queries):
+            if i not in embeddings:
+                embeddings[i] = encoded[query]
+
+    for i, q_emb in embeddings.items():
+        rows, scores = index.search(q_emb, SEARCH_K)
+        # (template, similarity) pairs, resolved against the same snapshot the index belongs to
+        ranked = [(data[r], float(s)) for r, s in zip(rows, scores)]
+        if i in exact_rows:
+            # The matched question leads; the neighbours of its vector remain the suggestions
+            row = exact_rows[i]
+            ranked = [(data[row], 1.0)] + [pair for r, pair in zip(rows, ranked) if r != row]
+        best_template, best_sim = ranked[0]
+        results[i] = (best_template, best_sim, ranked)
+    return results
 
-    return new_sql, lower_param_dict
 
 def json_serial(obj):
     """JSON serializer for objects not serializable by default json code"""
@@ -212,84 +322,31 @@ app = Flask(__name__)
 @app.route("/build_index", methods=["POST"])
 def build_index():
     """
-    Endpoint to build or rebuild the KD-Tree index from Oracle embeddings.
+    Endpoint to build or rebuild the template index from Oracle embeddings.
+    Send {"incremental": true} to apply only rows added/deleted since the last refresh;
+    the default full rebuild also compacts deleted rows away.
     """
-    global kdtree_index
-    global templates_data
-
+    body = request.get_json(silent=True) or {}
     try:
-        # Step 1: Load all templates and embeddings from the database
-        templates_data = load_templates_from_db()
-
-        # Step 2: Extract just the embedding vectors into a NumPy array
-        # Note: We filter out any templates that might have a missing embedding
-        embedding_vectors = np.array([t["embedding"] for t in templates_data if t["embedding"] is not None])
-
-        if len(embedding_vectors) == 0:
+        if body.get("incremental"):
+            state, added, deleted = refresh_index_delta()
+        else:
+            print("Building template index...")
+            state = rebuild_index_from_db()
+            added, deleted = (len(state.templates) if state else 0), 0
+        if state is None:
             return jsonify({"Success": False, "error": "No valid embeddings found to build the index."})
-        
-        # Step 3: Build the KD-Tree index
-        print("Building KD-Tree index...")
-        kdtree_index = KDTree(embedding_vectors)
-        print("KD-Tree index built successfully.")
+        print(f"Template index built successfully ({state.index.kind}, {len(state.index)} templates).")
 
-        return jsonify({"Success": True, "Message": "Index successfully built"})
+        return jsonify({"Success": True, "Message": "Index successfully built",
+                        "version": state.manifest["version"], "watermark": state.manifest["watermark"],
+                        "added": added, "deleted": deleted, "lobStats": lob_stats()})
     
     except Exception as e:
         print(f"Error building index: {e}")
         return jsonify({"Success": False, "error": f"Failed to build index: {str(e)}"})
     
 
-import re
-
-_BIND_RE = re.compile(r"(?<!:):([A-Za-z_][A-Za-z0-9_$#]*)")
-
-def _strip_comments_and_strings(sql: str) -> str:
-    # Remove block comments
-    sql = re.sub(r"/\*.*?\*/", "", sql, flags=re.DOTALL)
-    # Remove line comments
-    sql = re.sub(r"--.*?$", "", sql, flags=re.MULTILINE)
-    # Remove Oracle q-quoted strings: q'<delim> ... <delim>'
-    # Example: q'[hello:world]' or q'~text:here~'
-    sql = re.sub(r"q'(.).*?\1'", "''", sql, flags=re.IGNORECASE | re.DOTALL)
-    # Remove normal single-quoted strings (handles escaped single quotes '')
-    sql = re.sub(r"'(?:''|[^'])*'", "''", sql)
-    return sql
-
-def extract_bind_names_from_sql(sql: str) -> set:
-    """
-    Return a set of named bind identifiers (without the leading colon) present
-    in the SQL, ignoring comments and string literals. Positional binds (:1) are ignored.
-    """
-    cleaned = _strip_comments_and_strings(sql)
-    names = set()
-    for m in _BIND_RE.finditer(cleaned):
-        name = m.group(1)
-        # skip positional binds like :1, :2 (already excluded by regex) but keep here defensively
-        if not name[0].isdigit():
-            names.add(name)
-    return names
-
-def filter_bind_params(sql: str, params: dict) -> dict:
-    """
-    Keep only params whose (colonless) key appears as a named bind in the SQL.
-    Also normalizes keys by stripping a leading ':' if present.
-    """
-    if not params:
-        return {}
-    normalized = { (k[1:] if isinstance(k, str) and k.startswith(":") else k): v
-                   for k, v in params.items() }
-    needed = extract_bind_names_from_sql(sql)
-    return { k: v for k, v in normalized.items() if k in needed }
-
-def find_missing_binds(sql: str, params: dict) -> set:
-    """
-    Return bind names that exist in SQL but are not provided in params.
-    """
-    needed = extract_bind_names_from_sql(sql)
-    normalized_keys = { (k[1:] if isinstance(k, str) and k.startswith(":") else k)
-                        for k in (params or {}).keys() }
-    return needed - normalized_keys
 
 
 @app.route("/query", methods=["POST"])
@@ -340,20 +397,13 @@ def query():
 
         def fallback():
 
-            # learn that the prompt is a mis so it can be supported
-            with get_conn() as conn:   # conn will be closed automatically
-                with conn.cursor() as cur:
-                    cur.execute("insert into NL2SQL_FALLBACK(prompt) values(:user_query)", {"user_query": user_query})
-                    conn.commit()
+            # learn that the prompt is a mis so it can be supported (written in the background)
+            fallback_log.submit({"user_query": user_query})
             # Get the top 3 suggestions from the already ranked list
-            for idx, sim_score in ranked:
-                template = templates_data[idx]
-                template_sql = template["sql"]
-                # Extract expected parameters from template
-                placeholders = re.findall(r"\{(.*?)\}", template_sql)
+            for template, sim_score in ranked:
                 yield json.dumps({
                     "suggestion": template["intent_text"],
-                    "parameters": placeholders,  # just the names, not values,
+                    "parameters": list(template["plan"].placeholders),  # just the names, not values,
                     "Similarity": sim_score,
                     "Similarity found": sim
                 }) + "\n"
@@ -361,11 +411,13 @@ def query():
         return Response(fallback(), mimetype="application/x-ndjson")
 
     try:
-        param_dict = extract_named_parameters(user_query)
-        new_sql, param_dict = inject_named_parameters(template["sql"], param_dict)
+        # Placeholders, bind names and types were worked out when the index was built
+        plan = template["plan"]
+        param_dict = parse_named_parameters(user_query)
+        bind_params, missing = plan.bind(param_dict)
+        new_sql = plan.sql
 
         # NEW: validate/filter params to avoid DPY-4008
-        missing = find_missing_binds(new_sql, param_dict)
         if missing:
             # If you prefer to allow missing and let DB error, you can skip this block.
             return Response(json.dumps({
@@ -373,7 +425,6 @@ def query():
                 "error": f"Missing values for bind(s): {sorted(missing)}"
             }) + "\n", mimetype="application/x-ndjson")
 
-        bind_params = filter_bind_params(new_sql, param_dict)
         print("new_Sql========", new_sql)
     except ValueError as e:
         return Response(json.dumps({"matched": False, "error": str(e)}) + "\n",
@@ -382,25 +433,12 @@ def query():
     def generate():
         conn = get_conn()
         cur = conn.cursor()
+        tune_cursor(cur)
         cur.execute(new_sql, bind_params)
-        cols = [d[0] for d in cur.description]
+        # CLOBs are returned in full; BLOBs as "(BLOB n bytes)" to avoid huge payloads
+        serializer = build_row_serializer(cur.description, max_clob_preview=None, blob_format='summary')
 
-        def to_jsonable(v):
-            try:
-                if isinstance(v, oracledb.LOB):
-                    data = v.read()
-                    # CLOB returns str; BLOB returns bytes. Avoid huge payloads for BLOBs.
-                    if isinstance(data, bytes):
-                        return f"(BLOB {len(data)} bytes)"
-                    return data
-                return v
-            except Exception:
-                # Fallback to string representation if anything goes wrong
-                return str(v)
-
-        for row in cur:
-            row_obj = { c: to_jsonable(v) for c, v in zip(cols, row) }
-            yield json.dumps(row_obj, default=json_serial) + "\n"
+        yield from stream_cursor(cur, serializer.dumps)
         cur.close()
         conn.close()
 
@@ -466,100 +504,24 @@ def query():
 
         with get_conn() as conn:   # conn will be closed automatically
             with conn.cursor() as cur:
+                tune_cursor(cur)
                 cur.execute(new_sql, bind_params)
-                cols = [d[0] for d in cur.description]
+                serializer = build_row_serializer(cur.description, max_clob_preview=None, blob_format='summary')
+                # Bounded-memory per-column profile (top values, quantiles, distinct counts), updated per batch
+                profile = build_result_profile(cur.description)
 
-                def to_jsonable(v):
-                    try:
-                        if isinstance(v, oracledb.LOB):
-                            data = v.read()
-                            if isinstance(data, bytes):
-                                return f"(BLOB {len(data)} bytes)"
-                            return data
-                        return v
-                    except Exception:
-                        return str(v)
-
-                # Stats accumulators
-                row_count = 0
-                num_stats = {c: {"count": 0, "sum": 0.0, "min": None, "max": None} for c in cols}
-                cat_counts = {c: {} for c in cols}  # value -> count (capped)
-                CAT_CAP = 200  # cap per-column unique tracking
-
-                def try_float(v):
-                    try:
-                        if v is None or v == "":
-                            return None
-                        x = float(v)
-                        if np.isfinite(x):
-                            return x
-                        return None
-                    except Exception:
-                        return None
-
-                for row in cur:
-                    row_count += 1
-                    row_obj = { c: to_jsonable(v) for c, v in zip(cols, row) }
-                    # Stream the row to client immediately
-                    yield json.dumps(row_obj, default=json_serial) + "\n"
-
-                    # Update stats (cheap ops)
-                    for c in cols:
-                        v = row_obj.get(c)
-                        # numeric path
-                        nv = try_float(v)
-                        if nv is not None:
-                            s = num_stats[c]
-                            s["count"] += 1
-                            s["sum"] += nv
-                            s["min"] = nv if s["min"] is None else min(s["min"], nv)
-                            s["max"] = nv if s["max"] is None else max(s["max"], nv)
-                        # categorical/top-values (limit memory)
-                        if v is not None and v != "":
-                            d = cat_counts[c]
-                            # keep the map bounded by pruning smallest counts occasionally
-                            if len(d) >= CAT_CAP and v not in d:
-                                # prune ~10% least frequent keys
-                                try:
-                                    # build a list of (key,count), sort by count asc, drop first N
-                                    items = sorted(d.items(), key=lambda x: x[1])
-                                    drop_n = max(1, CAT_CAP // 10)
-                                    for k, _ in items[:drop_n]:
-                                        d.pop(k, None)
-                                except Exception:
-                                    pass
-                            d[v] = d.get(v, 0) + 1
+                # Rows go out in buffered NDJSON chunks; each fetched batch is profiled before it is encoded
+                batches = fetch_batches(cur)
+                if send_sql_to_llm:
+                    batches = profile.tap(batches)
+                yield from ndjson_chunks(batches, serializer.dumps)
 
                 print("sqltollm=====", send_sql_to_llm)
                 # After streaming rows, optionally generate narration
                 if send_sql_to_llm:
                     try:
-                        # Build compact summary for LLM
-                        num_summary = []
-                        for c, s in num_stats.items():
-                            if s["count"] > 0:
-                                avg = s["sum"] / max(1, s["count"])
-                                num_summary.append({
-                                    "column": c,
-                                    "count": s["count"],
-                                    "min": s["min"],
-                                    "max": s["max"],
-                                    "avg": avg,
-                                })
-                        cat_summary = []
-                        for c, d in cat_counts.items():
-                            if d:
-                                top = sorted(d.items(), key=lambda x: x[1], reverse=True)[:5]
-                                cat_summary.append({
-                                    "column": c,
-                                    "top_values": [{"value": str(k), "count": v} for k, v in top],
-                                    "tracked_unique": len(d),
-                                })
-
                         analysis = {
-                            "rows": row_count,
-                            "numeric": num_summary,
-                            "categorical": cat_summary,
+                            **profile.summary(),
                             "sql": new_sql,
                             "params": bind_params,
                             "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
@@ -591,8 +553,117 @@ def query():
     #return Response(generate(), mimetype="application/x-ndjson")
     return Response(stream_query(), mimetype="application/x-ndjson")
 
+def _template_rows(sql, bind_params):
+    """NDJSON chunks for one matched template, on its own pooled connection."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            tune_cursor(cur)
+            cur.execute(sql, bind_params)
+            serializer = build_row_serializer(cur.description, max_clob_preview=None, blob_format='summary')
+            yield from stream_cursor(cur, serializer.dumps)
+
+@app.route("/query_batch", methods=["POST"])
+def query_batch():
+    """
+    Run several prompts in one request, e.g. the widgets of a dashboard.
+    Body: {"queries": [{"id": "w1", "prompt": "...", "cosineSimilarityThreshold": 0.6}, ...]}
+    ("cosineSimilarityThreshold" may also be given once at the top level).
+
+    All prompts are matched first, with one encoder call. The SQL then runs on up
+    to QUERY_BATCH_CONCURRENCY pooled connections at once, and the results stream
+    back as one NDJSON response in which every line carries the query "id":
+      {"id", "matched": true, "intent", "similarity"}  one per query, sent first
+      (or "matched": false with "error" or fallback "suggestions")
+      {"id", "row": {...}}                             rows, interleaved across queries
+      {"id", "done": true, "rows", "elapsed_ms"}       or {"id", "error"} at the end of each query
+    """
+    body = request.get_json(silent=True) or {}
+    items = body.get("queries")
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "queries must be a non-empty list of objects"}), 400
+    if len(items) > QUERY_BATCH_MAX:
+        return jsonify({"error": f"At most {QUERY_BATCH_MAX} queries per batch"}), 400
+    ids = [item.get("id", i) for i, item in enumerate(items)]
+    if len(set(map(str, ids))) != len(ids):
+        return jsonify({"error": "query ids must be unique"}), 400
+
+    prompts = [str(item.get("prompt") or "").strip() for item in items]
+    try:
+        matches = iter(retrieve_best_templates([p for p in prompts if p]))
+    except RuntimeError as e:
+        return Response(json.dumps({"matched": False, "error": str(e)}) + "\n",
+                        mimetype="application/x-ndjson")
+
+    default_thresh = body.get("cosineSimilarityThreshold")
+    head = []
+    streams = []
+    for rid, item, prompt in zip(ids, items, prompts):
+        if not prompt:
+            head.append({"id": rid, "matched": False, "error": "missing query"})
+            continue
+        template, sim, ranked = next(matches)
+        client_thresh = item.get("cosineSimilarityThreshold", default_thresh)
+        thresh = client_thresh if isinstance(client_thresh, (int, float)) else SIMILARITY_THRESHOLD
+        if sim < thresh:
+            fallback_log.submit({"user_query": prompt})
+            head.append({"id": rid, "matched": False, "similarity": sim, "suggestions": [
+                {"suggestion": t["intent_text"], "parameters": list(t["plan"].placeholders), "Similarity": score}
+                for t, score in ranked]})
+            continue
+        plan = template["plan"]
+        try:
+            bind_params, missing = plan.bind(parse_named_parameters(prompt))
+        except ValueError as e:
+            head.append({"id": rid, "matched": False, "error": str(e)})
+            continue
+        if missing:
+            head.append({"id": rid, "matched": False, "error": f"Missing values for bind(s): {sorted(missing)}"})
+            continue
+        head.append({"id": rid, "matched": True, "intent": template["intent_text"], "similarity": sim})
+        streams.append((rid, lambda sql=plan.sql, binds=bind_params: _template_rows(sql, binds)))
+
+    def generate():
+        yield "".join(json.dumps(line, default=str) + "\n" for line in head)
+        yield from multiplex(streams, max_workers=QUERY_BATCH_CONCURRENCY)
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+###############################################################################
+# Startup: serve the last snapshot immediately, refresh from Oracle behind it
+###############################################################################
+def _start_refresh_thread():
+    thread = threading.Thread(target=_refresh_index_in_background, name="template-index-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+# One refresh thread per serving process, started by the entry point rather than on import
+_index_refresh = ProcessLocal(_start_refresh_thread)
+
+
+def start_index_refresh():
+    if TEMPLATE_INDEX_REFRESH_ON_START:
+        _index_refresh.get()
+
+
+load_index_snapshot()
+if TEMPLATE_INDEX_REFRESH_ON_START and preforking():
+    # Catch up once in the master so every worker inherits the same fresh index pages
+    try:
+        refresh_index_delta()
+    except Exception as e:
+        print(f"Template index refresh before fork failed: {e}")
+    on_worker_start(start_index_refresh)
+
+
+@app.before_request
+def _ensure_index_refresh():
+    # `flask run` never executes __main__: start on the first request instead
+    start_index_refresh()
+
 ###############################################################################
 # Run App
 ###############################################################################
 if __name__ == "__main__":
+    start_index_refresh()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -2,21 +2,41 @@ from flask import Flask, request, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
 import os
 import time
+import threading
+import itertools
 import diskcache
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 
 import json
 
 import datetime
 
 import decimal  # ✅ Handle Decimal types
-import base64   # ✅ Encode BLOB previews safely
+import sys
 
 try:
     import oracledb  # python-oracledb (successor to cx_Oracle)
 except Exception:
     oracledb = None
 
+try:
+    from .intent_matcher import IntentMatcher
+    from .result_cache import TeeCacheWriter, result_cache_key, tee, replay
+    from ..agent_common.row_serializer import build_row_serializer, generic_converter
+    from ..agent_common.streaming import fetch_batches, multiplex, ndjson_chunks, tune_cursor
+    from ..agent_common.oracle_tuning import install_lob_handler, lob_stats
+    from ..agent_common.write_behind import WriteBehindQueue, text_file_sink
+    from ..agent_common.prefork import on_worker_start
+except ImportError:
+    from intent_matcher import IntentMatcher
+    from result_cache import TeeCacheWriter, result_cache_key, tee, replay
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from agent_common.row_serializer import build_row_serializer, generic_converter
+    from agent_common.streaming import fetch_batches, multiplex, ndjson_chunks, tune_cursor
+    from agent_common.oracle_tuning import install_lob_handler, lob_stats
+    from agent_common.write_behind import WriteBehindQueue, text_file_sink
+    from agent_common.prefork import on_worker_start
+
 
 # Load .env credentials
 load_dotenv()
@@ -26,6 +46,11 @@ app = Flask(__name__)
 # Cache setup (30 min)
 CACHE_EXPIRATION_SECONDS = 1800
 cache = diskcache.Cache("./llm_cache")
+# Result cache: streams larger than this (uncompressed) are not cached
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# /query_batch: max prompts per request, and queries run at once on the engine pool
+QUERY_BATCH_MAX = int(os.getenv('QUERY_BATCH_MAX', '32'))
+QUERY_BATCH_CONCURRENCY = int(os.getenv('QUERY_BATCH_CONCURRENCY', '4'))
 
 # DB setup
 db_uri = f"oracle+oracledb://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT', '1521')}/?service_name={os.getenv('DB_SERVICE')}"
@@ -34,17 +59,30 @@ print("db_uri====", db_uri)
 engine = create_engine(db_uri)
 
 
+@event.listens_for(engine, "connect")
+def _install_lob_handler(dbapi_connection, connection_record):
+    install_lob_handler(dbapi_connection)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _tune_fetch(conn, cursor, statement, parameters, context, executemany):
+    # arraysize/prefetchrows must be set before execute to cut fetch round trips
+    tune_cursor(cursor)
+
+
 
 # Utility
 def is_safe_sql(sql: str) -> bool:
     return sql.strip().lower().startswith("select")
 
+# Write next to this file so location is predictable regardless of CWD; entries are
+# appended in batches by a background thread instead of one open/write per request
+query_log = WriteBehindQueue(text_file_sink(os.path.join(os.path.dirname(__file__), "query_log.txt")),
+                             name="query-log")
+
 def log_query(intent, sql, user_agent, client_ip, model):
     ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    # Write next to this file so location is predictable regardless of CWD
-    log_path = os.path.join(os.path.dirname(__file__), "query_log.txt")
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(f"\n---\n[{ts}] IP: {client_ip}, UA: {user_agent}, Model: {model}\nIntent: {intent}\nSQL: {sql}\n")
+    query_log.submit(f"\n---\n[{ts}] IP: {client_ip}, UA: {user_agent}, Model: {model}\nIntent: {intent}\nSQL: {sql}\n")
 
 # Predefined intent-to-SQL map
 INTENT_SQL_MAP = {
@@ -55,90 +93,158 @@ INTENT_SQL_MAP = {
     # Add more intents and safe queries here
 }
 
-def detect_intent(prompt: str) -> str:
-    prompt_lower = prompt.lower()
-    # Simple intent detection by checking if any intent phrase is contained in prompt
-    for intent in INTENT_SQL_MAP.keys():
-        if intent in prompt_lower:
-            return intent
-    return None
-
-# ✅ Updated to handle Decimal, CLOB, and BLOB serialization
-def serialize_row(row, columns, max_clob_preview=None, max_blob_preview=None):
-    MAX_CLOB_PREVIEW = int(max_clob_preview if max_clob_preview is not None else os.getenv('MAX_CLOB_PREVIEW', '8192'))
-    MAX_BLOB_PREVIEW = int(max_blob_preview if max_blob_preview is not None else os.getenv('MAX_BLOB_PREVIEW', '2048'))
+# Intents can also be loaded from Oracle (rows override the built-ins above) and
+# are hot-reloaded when the table changes, without restarting the agent.
+INTENT_TABLE = os.getenv('INTENT_TABLE', 'INTENT_SQL_MAP')
+INTENT_RELOAD_SECONDS = int(os.getenv('INTENT_RELOAD_SECONDS', '60'))
 
-    def serialize_value(val):
-        # Null passthrough
-        if val is None:
-            return None
+# Per-intent result cache TTL in seconds (0 disables caching for that intent);
+# intents not listed use CACHE_EXPIRATION_SECONDS. DB rows may set CACHE_TTL_SECONDS.
+INTENT_CACHE_TTL = {
+    # "list all sales": 300,
+}
+_intent_cache_ttl = dict(INTENT_CACHE_TTL)
 
-        # Date/time → ISO strings
-        if isinstance(val, (datetime.date, datetime.datetime)):
-            return val.isoformat()
+# Compiled matcher; replaced wholesale on reload so readers never see a half-built one
+_intent_matcher = IntentMatcher(INTENT_SQL_MAP)
+_intent_fingerprint = None
+_intent_reload_lock = threading.Lock()
+# Tables created before cache_ttl_seconds existed are still read; None = not probed yet
+_intent_ttl_column = None
 
-        # Decimal → float (or use str(val) to preserve precision)
-        if isinstance(val, decimal.Decimal):
-            try:
-                return float(val)
-            except Exception:
-                return str(val)
 
-        # Oracle LOBs (CLOB/BLOB) via python-oracledb
-        if oracledb is not None:
-            try:
-                if isinstance(val, getattr(oracledb, 'LOB', ())):
-                    try:
-                        data = val.read()
-                    except Exception:
-                        # Fallback to string repr if reading fails
-                        return {"_type": "LOB", "repr": str(val)}
-
-                    # CLOB returns str; BLOB returns bytes
-                    if isinstance(data, str):
-                        length = len(data)
-                        if length > MAX_CLOB_PREVIEW:
-                            return {
-                                "_type": "CLOB",
-                                "length": length,
-                                "preview": data[:MAX_CLOB_PREVIEW],
-                                "truncated": True,
-                            }
-                        return data
-                    elif isinstance(data, (bytes, bytearray, memoryview)):
-                        b = bytes(data)
-                        length = len(b)
-                        preview_len = min(length, MAX_BLOB_PREVIEW)
-                        preview_b64 = base64.b64encode(b[:preview_len]).decode('ascii')
-                        return {
-                            "_type": "BLOB",
-                            "length": length,
-                            "preview_base64": preview_b64,
-                            "preview_bytes": preview_len,
-                            "truncated": length > preview_len,
-                        }
-            except Exception:
-                # If LOB handling fails, fall through to generic handling
-                pass
+def _ttl_column(conn):
+    """`cache_ttl_seconds` if INTENT_TABLE has that column, else NULL (agent default TTL)."""
+    global _intent_ttl_column
+    if _intent_ttl_column is None:
+        try:
+            conn.execute(text(f"SELECT cache_ttl_seconds FROM {INTENT_TABLE} WHERE 1 = 0")).fetchall()
+            _intent_ttl_column = "cache_ttl_seconds"
+        except Exception:
+            print(f"{INTENT_TABLE} has no cache_ttl_seconds column; using default result cache TTLs")
+            _intent_ttl_column = "NULL"
+    return _intent_ttl_column
+
+
+def load_intents_from_db():
+    """Return (({intent: sql}, {intent: ttl}), fingerprint) from INTENT_TABLE, or (None, None) if the table is absent."""
+    with engine.connect() as conn:
+        try:
+            # MAX(updated_at) alone misses edits that do not touch it; hash the content too.
+            # Each part is hashed on its own (1000 chars stays under 4000 bytes even multibyte)
+            # and mixed per row as a NUMBER, so no concatenation can exceed the VARCHAR2 limit.
+            fp = conn.execute(text(
+                f"SELECT COUNT(*), MAX(updated_at), "
+                f"SUM(MOD(ORA_HASH(intent) * 1000003 + ORA_HASH(DBMS_LOB.SUBSTR(sql_text, 1000, 1)), 4294967296) "
+                f"+ NVL(DBMS_LOB.GETLENGTH(sql_text), 0)) "
+                f"FROM {INTENT_TABLE} WHERE NVL(enabled, 1) = 1"
+            )).fetchone()
+        except Exception as e:
+            if "ORA-00942" not in str(e):  # table or view does not exist: built-in intents only
+                print(f"Reading the {INTENT_TABLE} fingerprint failed: {e}")
+            return None, None
+        fingerprint = (int(fp[0] or 0), str(fp[1]), int(fp[2] or 0))
+        if fingerprint == _intent_fingerprint:
+            return None, fingerprint
+        rows = conn.execute(text(
+            f"SELECT intent, sql_text, {_ttl_column(conn)} FROM {INTENT_TABLE} WHERE NVL(enabled, 1) = 1"
+        )).fetchall()
+    intents = {}
+    ttls = {}
+    for intent, sql_text, ttl in rows:
+        if hasattr(sql_text, 'read'):
+            sql_text = sql_text.read()
+        if intent and sql_text:
+            key = str(intent).strip().lower()
+            intents[key] = str(sql_text)
+            if ttl is not None:
+                ttls[key] = int(ttl)
+    return (intents, ttls), fingerprint
+
+
+def reload_intents(force=False):
+    """Rebuild the matcher from built-ins + DB rows if the table changed. Returns the intent count."""
+    global _intent_matcher, _intent_fingerprint, _intent_cache_ttl, _intent_ttl_column
+    with _intent_reload_lock:
+        if force:
+            _intent_fingerprint = None
+            _intent_ttl_column = None
+        loaded, fingerprint = load_intents_from_db()
+        if loaded is None:
+            return len(_intent_matcher)
+        db_intents, db_ttls = loaded
+        merged = dict(INTENT_SQL_MAP)
+        merged.update(db_intents)
+        ttls = dict(INTENT_CACHE_TTL)
+        ttls.update(db_ttls)
+        _intent_cache_ttl = ttls
+        _intent_matcher = IntentMatcher(merged)
+        _intent_fingerprint = fingerprint
+        return len(_intent_matcher)
+
+
+def _intent_reload_loop():
+    while True:
+        try:
+            reload_intents()
+        except Exception as e:
+            print(f"Intent reload failed: {e}")
+        time.sleep(INTENT_RELOAD_SECONDS)
+
+
+def match_intent(prompt: str):
+    """Longest intent phrase contained in the prompt, as (intent, sql), or (None, None)."""
+    hit = _intent_matcher.find(prompt or '')
+    return hit if hit else (None, None)
+
+
+def detect_intent(prompt: str) -> str:
+    return match_intent(prompt)[0]
+
+def _preview_limits(max_clob_preview=None, max_blob_preview=None):
+    return (int(max_clob_preview if max_clob_preview is not None else os.getenv('MAX_CLOB_PREVIEW', '8192')),
+            int(max_blob_preview if max_blob_preview is not None else os.getenv('MAX_BLOB_PREVIEW', '2048')))
+
+
+# Per-value dispatch kept for callers without a cursor description; query_db compiles a plan per query
+def serialize_row(row, columns, max_clob_preview=None, max_blob_preview=None):
+    conv = generic_converter(*_preview_limits(max_clob_preview, max_blob_preview))
+    return {col: conv(val) for col, val in zip(columns, row)}
+
+def stream_intent_result(sql, req_max_clob=None, req_max_blob=None):
+    """NDJSON chunks for one intent query: _base_sql and _column_types lines, then the rows."""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(text(sql))
+        columns = list(result.keys())
+        # Emit metadata for pushdown support
+        first_row = result.fetchone()
+        col_types = {}
+        if first_row is not None:
+            for col, val in zip(columns, first_row):
+                if isinstance(val, (datetime.date, datetime.datetime)):
+                    col_types[col] = 'date'
+                elif isinstance(val, (int, float, decimal.Decimal)):
+                    col_types[col] = 'number'
+                else:
+                    col_types[col] = 'string'
+        else:
+            col_types = { c: 'string' for c in columns }
+        yield json.dumps({"_base_sql": sql}) + "\n"
+        yield json.dumps({"_column_types": col_types, "_search_columns": columns}) + "\n"
+        # Compile the per-column converters once from the cursor description
+        try:
+            description = result.cursor.description
+        except Exception:
+            description = None
+        max_clob, max_blob = _preview_limits(req_max_clob, req_max_blob)
+        serializer = build_row_serializer(description, columns=columns,
+                                          max_clob_preview=max_clob, max_blob_preview=max_blob)
+        # First row goes out on its own, then fetchmany batches as buffered NDJSON chunks
+        batches = fetch_batches(result)
+        if first_row is not None:
+            batches = itertools.chain([[first_row]], batches)
+        yield from ndjson_chunks(batches, serializer.dumps)
 
-        # Generic bytes-like (BLOBs mapped directly)
-        if isinstance(val, (bytes, bytearray, memoryview)):
-            b = bytes(val)
-            length = len(b)
-            preview_len = min(length, MAX_BLOB_PREVIEW)
-            preview_b64 = base64.b64encode(b[:preview_len]).decode('ascii')
-            return {
-                "_type": "BLOB",
-                "length": length,
-                "preview_base64": preview_b64,
-                "preview_bytes": preview_len,
-                "truncated": length > preview_len,
-            }
-
-        # Default: return as-is (JSON serializer will handle primitives)
-        return val
-
-    return {col: serialize_value(val) for col, val in zip(columns, row)}
 
 @app.route("/query", methods=["POST"])
 def query_db():
@@ -165,69 +271,47 @@ def query_db():
     client_ip = request.remote_addr or 'unknown'
 
     # Detect intent
-    intent = detect_intent(prompt)
+    intent, sql = match_intent(prompt)
     if not intent:
         return jsonify({"error": "Sorry, I don't understand that query."}), 400
 
-    sql = INTENT_SQL_MAP[intent]
-
     if not is_safe_sql(sql):
         return jsonify({"error": "Unsafe SQL detected."}), 403
 
-    # # Cache check by intent + model
-    # cache_key = f"{model}:{intent}"
-    # cached = cache.get(cache_key)
-    # if cached:
-    #     return jsonify({"response": cached, "cached": True})
+    # Result cache: keyed by SQL + binds + LOB preview options, TTL per intent
+    binds = {}
+    cache_ttl = _intent_cache_ttl.get(intent, CACHE_EXPIRATION_SECONDS)
+    use_cache = cache_ttl > 0 and not (data.get('noCache') or data.get('no_cache'))
+    cache_key = result_cache_key(sql, binds, max_clob_preview=req_max_clob, max_blob_preview=req_max_blob)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            try:
+                log_query(intent, sql, user_agent, client_ip, model)
+            except Exception:
+                pass
+            resp = Response(replay(cached), mimetype='application/x-ndjson')
+            resp.headers['X-Result-Cache'] = 'HIT'
+            return resp
 
     try:
 
 
-        def generate():
-            with engine.connect() as conn:
-                result = conn.execution_options(stream_results=True).execute(text(sql))
-                columns = list(result.keys())
-                # Emit metadata for pushdown support
-                first_row = result.fetchone()
-                col_types = {}
-                if first_row is not None:
-                    for col, val in zip(columns, first_row):
-                        if isinstance(val, (datetime.date, datetime.datetime)):
-                            col_types[col] = 'date'
-                        elif isinstance(val, (int, float, decimal.Decimal)):
-                            col_types[col] = 'number'
-                        else:
-                            col_types[col] = 'string'
-                else:
-                    col_types = { c: 'string' for c in columns }
-                yield json.dumps({"_base_sql": sql}) + "\n"
-                yield json.dumps({"_column_types": col_types, "_search_columns": columns}) + "\n"
-                # Yield first row if present
-                if first_row is not None:
-                    row_dict = serialize_row(first_row, columns, max_clob_preview=req_max_clob, max_blob_preview=req_max_blob)
-                    yield json.dumps(row_dict) + "\n"
-                # Continue remaining rows
-                for row in result:
-                    row_dict = serialize_row(row, columns, max_clob_preview=req_max_clob, max_blob_preview=req_max_blob)
-                    yield json.dumps(row_dict) + "\n"
-                    
-
-
-        # Cache the full SQL result as text (optional: cache partial or JSON)
-        # To cache the streamed result fully, we need to collect it first (here simplified)
-        # with engine.connect() as conn:
-        #     res = conn.execute(text(sql))
-        #     all_rows = [dict(zip(res.keys(), row)) for row in res]
-
-        #cache.set(cache_key, all_rows, expire=CACHE_EXPIRATION_SECONDS)
+        body = stream_intent_result(sql, req_max_clob, req_max_blob)
+        if use_cache:
+            # Tee rows into a compressed cache entry while they stream
+            body = tee(body, TeeCacheWriter(cache, cache_key, cache_ttl, RESULT_CACHE_MAX_BYTES))
+
         # Always log query for audit/debug
         try:
             log_query(intent, sql, user_agent, client_ip, model)
         except Exception:
             pass
 
-        # Return streamed CSV response
-        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        # Return streamed NDJSON response
+        resp = Response(stream_with_context(body), mimetype='application/x-ndjson')
+        resp.headers['X-Result-Cache'] = 'MISS' if use_cache else 'BYPASS'
+        return resp
 
     except Exception as e:
         try:
@@ -236,14 +320,94 @@ def query_db():
             pass
         return jsonify({"error": str(e)}), 500
 
+@app.route("/query_batch", methods=["POST"])
+def query_batch():
+    """Several prompts in one request (dashboards).
+
+    Body: {"queries": [{"id": "w1", "prompt": "..."}, ...]}, plus the optional
+    /query options (maxClobPreview, maxBlobPreview, noCache) for the whole batch.
+    Up to QUERY_BATCH_CONCURRENCY queries run at once; cached results are replayed.
+    Every NDJSON line carries the query "id": first one
+    {"id", "matched", "intent", "cache"} (or "error") line per query, then that
+    query's _base_sql/_column_types and {"id", "row"} lines interleaved with the
+    others, and {"id", "done", "rows", "elapsed_ms"} (or "error") when it ends.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("queries")
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "queries must be a non-empty list of objects"}), 400
+    if len(items) > QUERY_BATCH_MAX:
+        return jsonify({"error": f"At most {QUERY_BATCH_MAX} queries per batch"}), 400
+    ids = [item.get("id", i) for i, item in enumerate(items)]
+    if len(set(map(str, ids))) != len(ids):
+        return jsonify({"error": "query ids must be unique"}), 400
+    try:
+        req_max_clob = int(data.get('maxClobPreview') or data.get('max_clob_preview') or 0) or None
+        req_max_blob = int(data.get('maxBlobPreview') or data.get('max_blob_preview') or 0) or None
+    except Exception:
+        req_max_clob = req_max_blob = None
+    no_cache = bool(data.get('noCache') or data.get('no_cache'))
+    model = data.get("model", "llama3.2:1b")
+    user_agent = request.headers.get('User-Agent', 'unknown')
+    client_ip = request.remote_addr or 'unknown'
+
+    head = []
+    streams = []
+    for rid, item in zip(ids, items):
+        intent, sql = match_intent(item.get("prompt"))
+        if not intent:
+            head.append({"id": rid, "matched": False, "error": "Sorry, I don't understand that query."})
+            continue
+        if not is_safe_sql(sql):
+            head.append({"id": rid, "matched": False, "error": "Unsafe SQL detected."})
+            continue
+        cache_ttl = _intent_cache_ttl.get(intent, CACHE_EXPIRATION_SECONDS)
+        use_cache = cache_ttl > 0 and not no_cache
+        cache_key = result_cache_key(sql, {}, max_clob_preview=req_max_clob, max_blob_preview=req_max_blob)
+        cached = cache.get(cache_key) if use_cache else None
+        try:
+            log_query(intent, sql, user_agent, client_ip, model)
+        except Exception:
+            pass
+        if cached is not None:
+            head.append({"id": rid, "matched": True, "intent": intent, "cache": "HIT"})
+            streams.append((rid, lambda blob=cached: replay(blob)))
+            continue
+        head.append({"id": rid, "matched": True, "intent": intent, "cache": "MISS" if use_cache else "BYPASS"})
+
+        def make_chunks(sql=sql, cache_key=cache_key, cache_ttl=cache_ttl, use_cache=use_cache):
+            body = stream_intent_result(sql, req_max_clob, req_max_blob)
+            if use_cache:
+                body = tee(body, TeeCacheWriter(cache, cache_key, cache_ttl, RESULT_CACHE_MAX_BYTES))
+            return body
+        streams.append((rid, make_chunks))
+
+    def generate():
+        yield "".join(json.dumps(line) + "\n" for line in head)
+        yield from multiplex(streams, max_workers=QUERY_BATCH_CONCURRENCY)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok"}), 200
+    return jsonify({"status": "ok", "lob": lob_stats(), "query_log": query_log.stats()}), 200
 
 @app.route("/clear_cache", methods=["POST"])
 def clear_cache():
     cache.clear()
     return jsonify({"message": "Cache cleared"}), 200
 
+@app.route("/reload_intents", methods=["POST"])
+def reload_intents_endpoint():
+    try:
+        count = reload_intents(force=True)
+    except Exception as e:
+        return jsonify({"error": f"Intent reload failed: {e}"}), 500
+    return jsonify({"intents": count}), 200
+
+if INTENT_RELOAD_SECONDS > 0:
+    # Started per worker under the pre-fork launcher (threads do not survive fork)
+    on_worker_start(lambda: threading.Thread(target=_intent_reload_loop, name="intent-reload", daemon=True).start())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
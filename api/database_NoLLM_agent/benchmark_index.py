@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark template retrieval indexes against the old scipy KD-tree.
+
+Generates clustered unit vectors shaped like MiniLM template embeddings (many
+synonyms per intent), builds each index, and queries it with perturbed copies
+of stored vectors. Reports build time, p50/p95/mean query latency, recall@k
+against the exact index, and peak RSS, as JSON.
+
+Usage:
+  cd api/database_NoLLM_agent
+  python benchmark_index.py --sizes 10000 100000 1000000 --kinds kdtree exact ivf hnsw --out index_bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+from template_index import build_index, normalize_rows
+
+
+def clustered_vectors(n, dim, seed=7, per_intent=25, spread=0.35, chunk=100_000):
+    """n unit vectors in clusters of ~per_intent around random intent centres."""
+    rng = np.random.default_rng(seed)
+    n_intents = max(1, n // per_intent)
+    centres = normalize_rows(rng.standard_normal((n_intents, dim)).astype(np.float32))
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, chunk):
+        stop = min(n, start + chunk)
+        owner = rng.integers(0, n_intents, stop - start)
+        noise = rng.standard_normal((stop - start, dim)).astype(np.float32) * (spread / np.sqrt(dim))
+        out[start:stop] = normalize_rows(centres[owner] + noise)
+    return out
+
+
+def make_queries(vectors, n_queries, seed=11, noise=0.2):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(vectors), n_queries)
+    jitter = rng.standard_normal((n_queries, vectors.shape[1])).astype(np.float32) * (noise / np.sqrt(vectors.shape[1]))
+    return normalize_rows(vectors[picks] + jitter)
+
+
+class KDTreeBaseline:
+    """The previous implementation: Euclidean KD-tree, distances mapped back to cosine."""
+    kind = 'kdtree'
+
+    def __init__(self, vectors):
+        from scipy.spatial import KDTree
+        self._tree = KDTree(vectors)
+
+    def search(self, q, k):
+        distances, rows = self._tree.query(q, k=k)
+        return np.asarray(rows), 1 - (np.asarray(distances) ** 2 / 2)
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _build(kind, vectors):
+    if kind == 'kdtree':
+        return KDTreeBaseline(vectors)
+    return build_index(vectors, kind, normalized=True)
+
+
+def bench_size(n, dim, kinds, n_queries, k, kdtree_queries, seed):
+    vectors = clustered_vectors(n, dim, seed=seed)
+    queries = make_queries(vectors, n_queries, seed=seed + 1)
+    t0 = time.perf_counter()
+    exact = build_index(vectors, 'exact')
+    exact_build_ms = (time.perf_counter() - t0) * 1000.0
+    truth = [set(exact.search(q, k)[0].tolist()) for q in queries]
+
+    results = {}
+    for kind in kinds:
+        try:
+            t0 = time.perf_counter()
+            index = exact if kind == 'exact' else _build(kind, vectors)
+            build_ms = exact_build_ms if kind == 'exact' else (time.perf_counter() - t0) * 1000.0
+        except Exception as e:
+            results[kind] = {'error': str(e)}
+            continue
+        limit = kdtree_queries if kind == 'kdtree' else n_queries
+        latencies = []
+        hits = 0
+        for q, expected in zip(queries[:limit], truth[:limit]):
+            t0 = time.perf_counter()
+            rows, _ = index.search(q, k)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            hits += len(expected.intersection(np.asarray(rows).tolist()))
+        lat = np.array(latencies)
+        results[kind] = {
+            'build_ms': round(build_ms, 1),
+            'queries': len(latencies),
+            'p50_ms': round(float(np.percentile(lat, 50)), 3),
+            'p95_ms': round(float(np.percentile(lat, 95)), 3),
+            'mean_ms': round(float(lat.mean()), 3),
+            f'recall@{k}': round(hits / (k * len(latencies)), 4),
+            'peak_rss_mb': _peak_rss_mb(),
+        }
+        print(f"n={n:>8} {kind:>6}: build {results[kind]['build_ms']:>9.1f} ms  "
+              f"p50 {results[kind]['p50_ms']:>8.3f} ms  p95 {results[kind]['p95_ms']:>8.3f} ms  "
+              f"recall {results[kind][f'recall@{k}']:.3f}", file=sys.stderr)
+        if index is not exact:
+            del index
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--kinds', nargs='+', default=['kdtree', 'exact', 'ivf', 'hnsw'])
+    ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--kdtree-queries', type=int, default=50,
+                    help='KD-tree queries are slow at high dimension; cap how many are timed')
+    ap.add_argument('--k', type=int, default=20)
+    ap.add_argument('--seed', type=int, default=7)
+    ap.add_argument('--out', help='write JSON report here (default: stdout)')
+    args = ap.parse_args(argv)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'dim': args.dim,
+        'k': args.k,
+        'sizes': {},
+    }
+    for n in args.sizes:
+        report['sizes'][str(n)] = bench_size(n, args.dim, args.kinds, args.queries, args.k,
+                                             args.kdtree_queries, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
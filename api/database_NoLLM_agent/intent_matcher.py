@@ -0,0 +1,85 @@
+"""
+Aho-Corasick multi-pattern matcher for intent phrases.
+
+The automaton is compiled once from all intent phrases, so `find()` costs
+O(len(prompt)) regardless of how many intents are loaded. Matching is
+case-insensitive substring matching (same semantics as the old
+`intent in prompt.lower()` scan) with a longest-match policy: the longest
+phrase found anywhere in the prompt wins, ties go to the earliest one.
+"""
+from collections import deque
+
+
+class IntentMatcher:
+    def __init__(self, phrases):
+        """`phrases` maps intent phrase -> payload (e.g. its SQL)."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [-1]  # index into self._patterns of the longest pattern ending at this node
+        self._patterns = []
+        self._lengths = []
+        self._payloads = []
+        for phrase, payload in phrases.items():
+            key = (phrase or '').lower()
+            if not key:
+                continue
+            self._add(key, phrase, payload)
+        self._build()
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def _add(self, key, phrase, payload):
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(-1)
+            node = nxt
+        if self._best[node] == -1:
+            self._best[node] = len(self._patterns)
+            self._patterns.append(phrase)
+            self._lengths.append(len(key))
+            self._payloads.append(payload)
+        else:
+            # Duplicate phrase (e.g. differing only in case): last one wins
+            self._payloads[self._best[node]] = payload
+
+    def _build(self):
+        goto, fail, best = self._goto, self._fail, self._best
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                queue.append(child)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0)
+                # A node's own pattern is always the longest suffix; inherit otherwise
+                if best[child] == -1:
+                    best[child] = best[fail[child]]
+
+    def find(self, text):
+        """Return (phrase, payload) of the longest phrase in `text`, or None."""
+        if not text or not self._patterns:
+            return None
+        goto, fail, best, lengths = self._goto, self._fail, self._best, self._lengths
+        node = 0
+        hit = -1
+        hit_len = 0
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            b = best[node]
+            if b != -1 and lengths[b] > hit_len:
+                hit = b
+                hit_len = lengths[b]
+        if hit == -1:
+            return None
+        return self._patterns[hit], self._payloads[hit]
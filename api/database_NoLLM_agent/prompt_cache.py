@@ -0,0 +1,68 @@
+"""
+Lookup tier in front of the sentence encoder.
+
+- `normalize_prompt()` folds case, punctuation and whitespace and strips
+  `{param=value}` and `{placeholder}` groups, so the prompt
+  "List employees {dept=10}!" and the stored question
+  "list employees {dept}" normalize to the same key.
+- `build_exact_map()` maps the normalized text of every training question and
+  synonym to its index row; a hit skips both encoding and retrieval.
+- `EmbeddingLRU` keeps the embeddings of recent prompts so repeats skip the
+  encoder but still go through retrieval.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+_PARAM_RE = re.compile(r"\{[^{}]*\}")
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(text):
+    text = _PARAM_RE.sub(" ", text or "")
+    text = _PUNCT_RE.sub(" ", text.lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def build_exact_map(templates, deleted=None):
+    """normalized question -> row; the first (lowest id) row wins, deleted rows are skipped."""
+    exact = {}
+    for i, t in enumerate(templates):
+        if deleted is not None and deleted[i]:
+            continue
+        key = normalize_prompt(t.get("intent_text"))
+        if key and key not in exact:
+            exact[key] = i
+    return exact
+
+
+class EmbeddingLRU:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
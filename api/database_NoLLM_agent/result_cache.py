@@ -0,0 +1,90 @@
+"""
+Streaming tee result cache for NDJSON query responses.
+
+While a response generator streams rows to the client, `TeeCacheWriter`
+compresses a copy of every line into memory. Only when the stream finishes
+normally is the compressed blob stored (in a diskcache.Cache) with its TTL.
+If the raw stream grows past `max_bytes` the copy is dropped and caching is
+abandoned for that query, so large results never bloat the cache.
+`replay()` streams a stored entry back as NDJSON without touching the DB.
+"""
+import hashlib
+import json
+import zlib
+
+REPLAY_CHUNK_BYTES = 64 * 1024
+
+
+def result_cache_key(sql, binds=None, **options):
+    """Stable key from SQL text, bind values and any options that change the output."""
+    payload = json.dumps({'sql': sql, 'binds': binds or {}, 'options': options}, sort_keys=True, default=str)
+    return 'result:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TeeCacheWriter:
+    def __init__(self, cache, key, ttl, max_bytes, level=6):
+        self.cache = cache
+        self.key = key
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.raw_bytes = 0
+        self.abandoned = False
+        self._comp = zlib.compressobj(level)
+        self._parts = []
+
+    def write(self, chunk):
+        if self.abandoned:
+            return
+        data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        self.raw_bytes += len(data)
+        if self.raw_bytes > self.max_bytes:
+            self.abandon()
+            return
+        out = self._comp.compress(data)
+        if out:
+            self._parts.append(out)
+
+    def abandon(self):
+        self.abandoned = True
+        self._parts = []
+        self._comp = None
+
+    def commit(self):
+        """Store the entry. Returns the compressed size, or None if caching was abandoned."""
+        if self.abandoned:
+            return None
+        self._parts.append(self._comp.flush())
+        blob = b''.join(self._parts)
+        self._parts = []
+        self.cache.set(self.key, blob, expire=self.ttl)
+        return len(blob)
+
+
+def tee(lines, writer):
+    """Yield `lines` unchanged, copying them into `writer`; commit only on normal completion."""
+    completed = False
+    try:
+        for line in lines:
+            writer.write(line)
+            yield line
+        completed = True
+    finally:
+        if completed:
+            writer.commit()
+        else:
+            writer.abandon()
+
+
+def replay(blob, chunk_bytes=REPLAY_CHUNK_BYTES):
+    """Decompress a cached entry incrementally, yielding whole NDJSON lines in batches."""
+    dec = zlib.decompressobj()
+    pending = b''
+    for i in range(0, len(blob), chunk_bytes):
+        pending += dec.decompress(blob[i:i + chunk_bytes])
+        cut = pending.rfind(b'\n')
+        if cut >= 0:
+            yield pending[:cut + 1].decode('utf-8')
+            pending = pending[cut + 1:]
+    pending += dec.flush()
+    if pending:
+        yield pending.decode('utf-8')
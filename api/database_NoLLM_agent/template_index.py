@@ -0,0 +1,246 @@
+"""
+Vector indexes for template retrieval.
+
+All indexes hold L2-normalized float32 vectors and return true cosine scores
+(`search(q, k) -> (rows, scores)`, best first), so callers can compare scores
+with the similarity threshold directly.
+
+- `ExactIndex` (default): one matrix-vector product over a contiguous float32
+  matrix, top-k picked with `argpartition`. Exact, and at 384 dims faster than
+  a KD-tree, which degenerates to a full scan in high dimensions anyway.
+- `IVFIndex`: inverted lists over a k-means coarse quantizer (numpy only);
+  scans `nprobe` lists. Approximate, for very large template sets.
+- `HNSWIndex`: graph index via the optional `hnswlib` package.
+
+`build_index(vectors, kind)` picks one by name; the default comes from
+`TEMPLATE_INDEX_KIND` (exact | ivf | hnsw).
+"""
+import os
+
+import numpy as np
+
+DEFAULT_KIND = os.getenv('TEMPLATE_INDEX_KIND', 'exact').lower()
+
+
+def normalize_rows(vectors):
+    """Contiguous float32 copy of `vectors` with unit-length rows (zero rows stay zero)."""
+    m = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+    if m.size == 0:
+        return np.zeros((0, m.shape[-1] if m.ndim == 2 else 0), dtype=np.float32)
+    if m.ndim == 1:
+        m = m.reshape(1, -1)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(m / norms, dtype=np.float32)
+
+
+def _normalize_query(q):
+    q = np.asarray(q, dtype=np.float32).reshape(-1)
+    n = float(np.linalg.norm(q))
+    return q / n if n else q
+
+
+def top_k(scores, k):
+    """Indices of the k largest scores, best first."""
+    n = scores.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-scores[part], kind='stable')]
+
+
+class ExactIndex:
+    """Exact cosine index. Instances are immutable; `with_delta()` returns a new one.
+
+    Rows live in the first `n` rows of a buffer with spare capacity, so appends
+    usually write into the unused tail instead of copying the matrix. Readers of
+    an older instance only ever look at its own first `n` rows and its own
+    deletion mask, so they are unaffected.
+    """
+    kind = 'exact'
+
+    def __init__(self, vectors, normalized=False, _buffer=None, _tail=None, _n=None, _deleted=None):
+        if _buffer is None:
+            _buffer = vectors if normalized else normalize_rows(vectors)
+            _tail, _n = [len(_buffer)], len(_buffer)
+        self._buffer = _buffer
+        self._tail = _tail  # shared by every instance over this buffer: rows claimed so far
+        self.n = _n
+        self.deleted = _deleted  # bool mask over rows, None when nothing is deleted
+        self.live = self.n - (int(_deleted.sum()) if _deleted is not None else 0)
+
+    @property
+    def matrix(self):
+        return self._buffer[:self.n]
+
+    def __len__(self):
+        return self.live
+
+    @property
+    def dim(self):
+        return self._buffer.shape[1] if self._buffer.ndim == 2 else 0
+
+    def search(self, q, k):
+        if self.live == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.matrix @ _normalize_query(q)
+        if self.deleted is not None:
+            scores[self.deleted] = -np.inf
+        rows = top_k(scores, min(k, self.live))
+        return rows, scores[rows]
+
+    def with_delta(self, new_vectors=None, drop_rows=()):
+        """New index with `new_vectors` appended as rows n.. and `drop_rows` marked deleted."""
+        new = normalize_rows(new_vectors) if new_vectors is not None and len(new_vectors) else None
+        m = 0 if new is None else len(new)
+        buffer, tail = self._buffer, self._tail
+        if m:
+            # Write in place only into rows nobody has claimed yet
+            if not (buffer.flags.writeable and tail[0] == self.n and self.n + m <= len(buffer)):
+                capacity = max(2 * (self.n + m), 1024)
+                grown = np.empty((capacity, new.shape[1]), dtype=np.float32)
+                grown[:self.n] = self.matrix
+                buffer, tail = grown, [self.n]
+            buffer[self.n:self.n + m] = new
+            tail[0] = self.n + m
+        drop_rows = list(drop_rows)
+        deleted = None
+        if self.deleted is not None or drop_rows:
+            deleted = np.zeros(self.n + m, dtype=bool)
+            if self.deleted is not None:
+                deleted[:self.n] = self.deleted
+            deleted[drop_rows] = True
+        return ExactIndex(None, _buffer=buffer, _tail=tail, _n=self.n + m, _deleted=deleted)
+
+    def compacted(self):
+        """(matrix without deleted rows, kept row numbers)."""
+        if self.deleted is None or not self.deleted.any():
+            return self.matrix, np.arange(self.n)
+        keep = np.flatnonzero(~self.deleted)
+        return self.matrix[keep], keep
+
+
+class IVFIndex:
+    kind = 'ivf'
+
+    def __init__(self, vectors, nlist=None, nprobe=None, iterations=10, seed=0, normalized=False):
+        self.matrix = vectors if normalized else normalize_rows(vectors)
+        n = len(self.matrix)
+        self.nlist = max(1, min(n, nlist or int(np.sqrt(n)) or 1))
+        self.nprobe = max(1, min(self.nlist, nprobe or int(os.getenv('TEMPLATE_INDEX_NPROBE', '8'))))
+        self.centroids = self._train(iterations, seed) if n else np.zeros((0, self.dim), dtype=np.float32)
+        assign = np.argmax(self.matrix @ self.centroids.T, axis=1) if n else np.empty(0, dtype=np.int64)
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def _train(self, iterations, seed):
+        rng = np.random.default_rng(seed)
+        # Spherical k-means on a sample is plenty for a coarse quantizer
+        sample = self.matrix
+        if len(sample) > 64 * self.nlist:
+            sample = sample[rng.choice(len(sample), 64 * self.nlist, replace=False)]
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assign, kind='stable')
+            present, starts = np.unique(assign[order], return_index=True)
+            # Empty clusters keep their previous centroid
+            centroids[present] = np.add.reduceat(sample[order], starts, axis=0)
+            centroids = normalize_rows(centroids)
+        return centroids
+
+    def search(self, q, k):
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = _normalize_query(q)
+        probes = top_k(self.centroids @ q, self.nprobe)
+        candidates = np.concatenate([self.lists[p] for p in probes])
+        if len(candidates) < min(k, len(self)):
+            # Probed lists (near-)empty: scan everything rather than return too few or no rows
+            candidates = np.arange(len(self))
+        scores = self.matrix[candidates] @ q
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+
+class HNSWIndex:
+    kind = 'hnsw'
+
+    def __init__(self, vectors, m=16, ef_construction=200, ef_search=None, normalized=False):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise RuntimeError("TEMPLATE_INDEX_KIND=hnsw requires the 'hnswlib' package") from e
+        self.matrix = vectors if normalized else normalize_rows(vectors)
+        n, dim = self.matrix.shape if self.matrix.ndim == 2 else (0, 0)
+        self._index = hnswlib.Index(space='ip', dim=dim)
+        self._index.init_index(max_elements=max(1, n), M=m, ef_construction=ef_construction)
+        if n:
+            self._index.add_items(self.matrix, np.arange(n))
+        self._index.set_ef(ef_search or int(os.getenv('TEMPLATE_INDEX_EF', '64')))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def search(self, q, k):
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        labels, distances = self._index.knn_query(_normalize_query(q), k=k)
+        # hnswlib 'ip' distance is 1 - dot product
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+
+INDEX_KINDS = {'exact': ExactIndex, 'ivf': IVFIndex, 'hnsw': HNSWIndex}
+
+# Past this fraction of deleted rows a delta compacts the index instead of masking
+COMPACT_DELETED_FRACTION = 0.25
+
+
+def build_index(vectors, kind=None, **options):
+    kind = (kind or DEFAULT_KIND).lower()
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown template index kind: {kind} (expected one of {sorted(INDEX_KINDS)})")
+    return INDEX_KINDS[kind](vectors, **options)
+
+
+def apply_delta(index, items, new_vectors=None, new_items=(), drop_rows=()):
+    """Copy-on-write update of (index, items), where items[i] describes index row i.
+
+    Returns a new (index, items) pair; the inputs are left untouched, so
+    searches running against them are never blocked or disturbed. The exact
+    index appends and masks deletions; other kinds, or a heavily deleted exact
+    index, are rebuilt in memory over the compacted rows.
+    """
+    new_items = list(new_items)
+    if isinstance(index, ExactIndex):
+        updated = index.with_delta(new_vectors, drop_rows)
+        if updated.n - updated.live <= COMPACT_DELETED_FRACTION * updated.n:
+            return updated, list(items) + new_items
+        index, items = updated, list(items) + new_items
+        new_vectors, new_items, drop_rows = None, [], ()
+    dropped = set(drop_rows)
+    if isinstance(index, ExactIndex):
+        matrix, keep = index.compacted()
+    else:
+        keep = np.array([i for i in range(len(items)) if i not in dropped], dtype=np.int64)
+        matrix = index.matrix[keep]
+    kept_items = [items[i] for i in keep]
+    if new_vectors is not None and len(new_vectors):
+        matrix = np.concatenate([matrix, normalize_rows(new_vectors)])
+    return build_index(matrix, index.kind, normalized=True), kept_items + new_items
@@ -0,0 +1,121 @@
+"""
+Compiled template plans.
+
+A template's SQL is analysed once, when the index is built:
+
+- `placeholders`  `{name}` groups in order of first use, as written in the template
+- `sql`           the SQL with each `{name}` rewritten to the bind `:name` (lowercased)
+- `bind_names`    named binds in the rewritten SQL, lowercased, ignoring comments and
+                  string literals (Oracle treats unquoted bind names case-insensitively)
+- `param_types`   per placeholder bind: "text" when it is used as a LIKE pattern or
+                  concatenated with `||`, otherwise "auto" (numeric-looking values are
+                  passed as numbers, as before)
+
+`TemplatePlan.bind()` then only checks and converts the request's parameters;
+no regex runs over the SQL on the query path. Plans are shared by every
+template row (question or synonym) with the same SQL.
+"""
+import re
+
+_PLACEHOLDER_RE = re.compile(r"\{(.*?)\}")
+_NAMED_PARAM_RE = re.compile(r"\{(.*?)=(.*?)\}")
+_BIND_RE = re.compile(r"(?<!:):([A-Za-z_][A-Za-z0-9_$#]*)")
+_TEXT_BIND_RE = re.compile(r"(?:\bLIKE\s+|\|\|\s*):([A-Za-z_][A-Za-z0-9_$#]*)|:([A-Za-z_][A-Za-z0-9_$#]*)\s*\|\|",
+                           re.IGNORECASE)
+
+
+def _strip_comments_and_strings(sql):
+    # Remove block comments
+    sql = re.sub(r"/\*.*?\*/", "", sql, flags=re.DOTALL)
+    # Remove line comments
+    sql = re.sub(r"--.*?$", "", sql, flags=re.MULTILINE)
+    # Remove Oracle q-quoted strings: q'<delim> ... <delim>'
+    # Example: q'[hello:world]' or q'~text:here~'
+    sql = re.sub(r"q'(.).*?\1'", "''", sql, flags=re.IGNORECASE | re.DOTALL)
+    # Remove normal single-quoted strings (handles escaped single quotes '')
+    sql = re.sub(r"'(?:''|[^'])*'", "''", sql)
+    return sql
+
+
+def extract_bind_names_from_sql(sql):
+    """
+    Return a set of named bind identifiers (without the leading colon) present
+    in the SQL, ignoring comments and string literals. Positional binds (:1) are ignored.
+    """
+    return {m.group(1) for m in _BIND_RE.finditer(_strip_comments_and_strings(sql))}
+
+
+def parse_named_parameters(text):
+    """{param=value} groups in a prompt -> {param: raw value string} (both stripped)."""
+    return {name.strip(): value.strip() for name, value in _NAMED_PARAM_RE.findall(text or "")}
+
+
+def coerce_param(value):
+    """Digits -> int, other numbers -> float, anything else unchanged."""
+    if not isinstance(value, str):
+        return value
+    if value.isdigit():
+        return int(value)
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class TemplatePlan:
+    __slots__ = ("template_sql", "sql", "placeholders", "bind_names", "param_types")
+
+    def __init__(self, template_sql):
+        self.template_sql = template_sql
+        placeholders = []
+
+        def _rewrite(m):
+            if m.group(1) not in placeholders:
+                placeholders.append(m.group(1))
+            return ":" + m.group(1).lower()
+
+        self.sql = _PLACEHOLDER_RE.sub(_rewrite, template_sql)
+        self.placeholders = tuple(placeholders)
+        cleaned = _strip_comments_and_strings(self.sql)
+        self.bind_names = frozenset(m.group(1).lower() for m in _BIND_RE.finditer(cleaned))
+        text_binds = {(a or b).lower() for a, b in _TEXT_BIND_RE.findall(cleaned)}
+        self.param_types = {ph.lower(): ("text" if ph.lower() in text_binds else "auto") for ph in placeholders}
+
+    def bind(self, params):
+        """Return (bind_params, missing) for request `params` ({name: raw value}).
+
+        Names are matched case-insensitively against the SQL's binds (a leading ':'
+        is ignored) and returned lowercased; values for "auto" binds are coerced
+        with `coerce_param`. `missing` holds binds in the SQL that no parameter
+        supplies. Raises ValueError for a placeholder without a value.
+        """
+        lowered = {}
+        for k, v in (params or {}).items():
+            k = k[1:] if isinstance(k, str) and k.startswith(":") else k
+            lowered[k.lower() if isinstance(k, str) else k] = v
+        for ph in self.placeholders:
+            if ph.lower() not in lowered:
+                raise ValueError(f"Missing value for parameter: {ph} SQL:{self.template_sql}")
+        types = self.param_types
+        bind_params = {k: (v if types.get(k) == "text" else coerce_param(v))
+                       for k, v in lowered.items() if k in self.bind_names}
+        return bind_params, self.bind_names - bind_params.keys()
+
+    def __repr__(self):
+        return f"TemplatePlan(placeholders={list(self.placeholders)!r}, binds={sorted(self.bind_names)!r})"
+
+
+def compile_template(template_sql):
+    return TemplatePlan(template_sql or "")
+
+
+def attach_plans(templates):
+    """Set templates[i]["plan"], compiling each distinct SQL text once."""
+    plans = {}
+    for t in templates:
+        sql = t.get("sql") or ""
+        plan = plans.get(sql)
+        if plan is None:
+            plan = plans[sql] = compile_template(sql)
+        t["plan"] = plan
+    return templates
@@ -0,0 +1,142 @@
+"""
+On-disk snapshot of the template index.
+
+A snapshot is a directory `<base>/v<version>/` holding
+  vectors.npy     float32 (n, dim) matrix of L2-normalized embeddings
+  templates.json  {"sql": [distinct SQL texts], "rows": [[id, name, intent_text, sql_index], ...]}
+                  rows in matrix order; synonyms of one template share a SQL entry
+  manifest.json   {"version", "watermark", "count", "dim", "model", "created_at"}
+and `<base>/CURRENT` names the live version. A new snapshot is written in full
+and then published by atomically replacing CURRENT, so a reader never sees a
+half-written one. `load_snapshot()` memory-maps vectors.npy, so startup costs
+a few milliseconds regardless of the number of templates. Writers take an
+exclusive lock on `<base>/.lock`, so pre-fork workers refreshing at the same
+time get distinct versions.
+"""
+import contextlib
+import json
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+import numpy as np
+
+FORMAT_VERSION = 1
+KEEP_VERSIONS = 2
+
+
+def _current_path(base_dir):
+    return os.path.join(base_dir, 'CURRENT')
+
+
+def current_version(base_dir):
+    try:
+        with open(_current_path(base_dir), 'r', encoding='utf-8') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+@contextlib.contextmanager
+def _writer_lock(base_dir):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(base_dir, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save_snapshot(base_dir, vectors, templates, watermark, model=None, extra=None):
+    """Write and publish a new snapshot. `templates` are dicts with id/name/intent_text/sql.
+
+    Returns the manifest of the published snapshot.
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    with _writer_lock(base_dir):
+        return _write_snapshot(base_dir, vectors, templates, watermark, model, extra)
+
+
+def _write_snapshot(base_dir, vectors, templates, watermark, model, extra):
+    version = (current_version(base_dir) or 0) + 1
+    final_dir = os.path.join(base_dir, f'v{version}')
+    tmp_dir = final_dir + f'.tmp{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    np.save(os.path.join(tmp_dir, 'vectors.npy'), matrix, allow_pickle=False)
+    sql_index = {}
+    rows = []
+    for t in templates:
+        sql = t.get('sql', '')
+        rows.append([t['id'], t.get('name'), t.get('intent_text', ''), sql_index.setdefault(sql, len(sql_index))])
+    with open(os.path.join(tmp_dir, 'templates.json'), 'w', encoding='utf-8') as f:
+        json.dump({'sql': list(sql_index), 'rows': rows}, f, separators=(',', ':'), ensure_ascii=False, default=str)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'watermark': watermark,
+        'count': int(matrix.shape[0]),
+        'dim': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        'model': model,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if extra:
+        manifest.update(extra)
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+    tmp_current = _current_path(base_dir) + f'.tmp{os.getpid()}'
+    with open(tmp_current, 'w', encoding='utf-8') as f:
+        f.write(str(version))
+    os.replace(tmp_current, _current_path(base_dir))
+    _prune(base_dir, version)
+    return manifest
+
+
+def _prune(base_dir, live_version):
+    # Older versions may still be mapped by another process; keep a couple around
+    for name in os.listdir(base_dir):
+        if not name.startswith('v') or not name[1:].isdigit():
+            continue
+        if int(name[1:]) <= live_version - KEEP_VERSIONS:
+            shutil.rmtree(os.path.join(base_dir, name), ignore_errors=True)
+
+
+def load_snapshot(base_dir, model=None, mmap=True):
+    """Return (vectors, templates, manifest) for the live snapshot, or None.
+
+    The snapshot is ignored if it was built with a different `model`.
+    """
+    version = current_version(base_dir)
+    if version is None:
+        return None
+    snap_dir = os.path.join(base_dir, f'v{version}')
+    try:
+        with open(os.path.join(snap_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_VERSION:
+            return None
+        if model is not None and manifest.get('model') not in (None, model):
+            return None
+        vectors = np.load(os.path.join(snap_dir, 'vectors.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+        with open(os.path.join(snap_dir, 'templates.json'), 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        sqls, rows = payload['sql'], payload['rows']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if len(rows) != vectors.shape[0]:
+        return None
+    templates = [{'id': r[0], 'name': r[1], 'intent_text': r[2], 'sql': sqls[r[3]]} for r in rows]
+    return vectors, templates, manifest
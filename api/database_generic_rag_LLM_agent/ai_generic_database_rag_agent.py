@@ -26,7 +26,12 @@ from flask import Flask, request, Response, jsonify
 from dotenv import load_dotenv
 import oracledb
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.streaming import stream_cursor, tune_cursor
+from agent_common.oracle_tuning import inline_lobs, install_lob_handler, read_lob
+from agent_common.embedding_service import get_encoder
 
 load_dotenv()
 
@@ -54,7 +59,7 @@ ALLOWED_SQL_PREFIXES = ("SELECT", "WITH", "WITH RECURSIVE")
 # -------------------------
 # Initialize models
 # -------------------------
-embedder = SentenceTransformer(LOCAL_EMBED_MODEL)
+embedder = get_encoder(LOCAL_EMBED_MODEL)
 
 # -------------------------
 # Helper: DB connection
@@ -70,7 +75,8 @@ def get_db_conn():
         dsn = f"{ORACLE_HOST}:{ORACLE_PORT}/?service_name={ORACLE_SERVICE}"
         
         print("dsn=", dsn)
-    return oracledb.connect(user=ORACLE_USER, password=ORACLE_PASSWORD, dsn=dsn)
+    # LOB_INLINE=1 fetches every CLOB/BLOB inline; otherwise only statements that opt in
+    return install_lob_handler(oracledb.connect(user=ORACLE_USER, password=ORACLE_PASSWORD, dsn=dsn))
 
 
 # -------------------------
@@ -183,7 +189,8 @@ def retrieve_context(user_input: str, top_k: int = TOP_K) -> List[str]:
                     pass
 
        # Case B: Python-side similarity using EMBEDDING_JSON (or any raw embedding storage)
-       # Stream rows to avoid loading everything
+       # Stream rows to avoid loading everything; chunks and their JSON vectors are small, so inline them
+        inline_lobs(cur)
         if has_json:
             cur.execute("SELECT CONTENT, EMBEDDING_JSON FROM RAG_CHUNKS")
         else:
@@ -194,9 +201,8 @@ def retrieve_context(user_input: str, top_k: int = TOP_K) -> List[str]:
             """Convert Oracle CLOB or string to list of floats."""
             if emb_val is None:
                 return None
-            # If it's a CLOB, convert to string
-            if hasattr(emb_val, "read"):
-                emb_val = emb_val.read()
+            # If it's a CLOB locator, read it
+            emb_val = read_lob(emb_val)
             # Ensure string
             if not isinstance(emb_val, str):
                 emb_val = str(emb_val)
@@ -207,8 +213,7 @@ def retrieve_context(user_input: str, top_k: int = TOP_K) -> List[str]:
         
         def clob_to_str(val):
             """Convert Oracle CLOB to Python string if needed."""
-            if hasattr(val, "read"):
-                return val.read()
+            val = read_lob(val)
             return str(val) if val is not None else ""
         
         def rows_iter():
@@ -327,7 +332,7 @@ def stream_query_results(sql_query: str):
     Errors are yielded as JSON objects with 'error'.
     """
     conn = get_db_conn()
-    cur = conn.cursor()
+    cur = tune_cursor(conn.cursor())
     try:
         cur.execute(sql_query)
     except Exception as e:
@@ -339,10 +344,8 @@ def stream_query_results(sql_query: str):
 
     cols = [d[0] for d in cur.description] if cur.description else []
     try:
-        # Fetch rows in a streaming manner (iterator)
-        for row in cur:
-            obj = dict(zip(cols, row))
-            yield json.dumps(obj, default=str) + "\n"
+        # Fetch rows with fetchmany and emit each batch as one buffered NDJSON chunk
+        yield from stream_cursor(cur, lambda row: json.dumps(dict(zip(cols, row)), default=str))
     except Exception as e:
         yield json.dumps({"error": f"Error while streaming results: {str(e)}"}) + "\n"
     finally:
@@ -23,6 +23,7 @@ Requires Oracle user with metadata read + DDL on target RAG tables. Tested with
 from __future__ import annotations
 
 import os
+import sys
 import math
 import json
 import hashlib
@@ -38,6 +39,9 @@ from dotenv import load_dotenv
 from tqdm import tqdm
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.embedding_cache import open_cache
+
 load_dotenv()  # This will look for .env in the current working directory
 
 # ---------------------------
@@ -190,14 +194,38 @@ class SbertEmbedder(Embedder):
         return [v.tolist() for v in vecs]
 
 
+class CachedEmbedder(Embedder):
+    """Serves chunks already embedded by this model from the shared on-disk cache
+    (agent_common/embedding_cache.py); only new chunk text reaches `inner`."""
+
+    def __init__(self, inner: Embedder, cache):
+        self.inner = inner
+        self.cache = cache
+        self.dim = inner.dim
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.get_or_compute(texts, self.inner.embed_batch).tolist()
+
+
+_embedder: Optional[Embedder] = None
+
+
 def get_embedder() -> Embedder:
-    if settings.EMBED_BACKEND.lower() == "openai":
-        return OpenAIEmbedder(settings.OPENAI_MODEL)
-    elif settings.EMBED_BACKEND.lower() == "sbert":
-        return SbertEmbedder(settings.LOCAL_MODEL_PATH)
+    """The process-wide embedder (loaded once), behind the embedding cache unless EMBEDDING_CACHE=0."""
+    global _embedder
+    if _embedder is not None:
+        return _embedder
+    backend = settings.EMBED_BACKEND.lower()
+    if backend == "openai":
+        embedder, model_id, variant = OpenAIEmbedder(settings.OPENAI_MODEL), settings.OPENAI_MODEL, "openai"
+    elif backend == "sbert":
+        embedder, model_id, variant = SbertEmbedder(settings.LOCAL_MODEL_PATH), settings.LOCAL_MODEL_PATH, "torch"
         # return SentenceTransformer(settings.LOCAL_MODEL_PATH)
     else:
         raise ValueError("Unsupported EMBED_BACKEND. Use 'openai' or 'sbert'.")
+    cache = open_cache(model_id, variant)
+    _embedder = embedder if cache is None else CachedEmbedder(embedder, cache)
+    return _embedder
 
 
 # ---------------------------
@@ -565,7 +593,7 @@ def build_and_store_embeddings(conn: oracledb.Connection, meta: Dict[str, Any],
     for i in tqdm(range(0, len(all_chunks), B), desc="Embedding batches"):
         batch = all_chunks[i:i+B]
         texts = [c[2] for c in batch]
-        vecs = get_embedder().embed_batch(texts)
+        vecs = embedder.embed_batch(texts)
         for (doc_id, ix, content), vec in zip(batch, vecs):
             insert_chunk(cur, doc_id, ix, content, tokens=len(content)//4, embedding=vec, has_vector=has_vector)
         conn.commit()
@@ -1,9 +1,13 @@
 import os
+import sys
 import oracledb
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 import json
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.embedding_cache import cached_encoder
+
 # Config
 ORACLE_DSN = os.getenv("ORACLE_DSN")
 ORACLE_USER = os.getenv("ORACLE_USER")
@@ -15,7 +19,8 @@ LOCAL_MODEL_PATH = os.getenv('LOCAL_EMBED_MODEL')
 # Embedding loader
 def get_embedder():
     if EMBED_BACKEND == "sbert":
-        return SentenceTransformer(LOCAL_MODEL_PATH)
+        # Column docs seen before (same text, same model) come from the shared on-disk cache
+        return cached_encoder(SentenceTransformer(LOCAL_MODEL_PATH), LOCAL_MODEL_PATH)
     else:
         raise ValueError("Unsupported EMBED_BACKEND. Only 'sbert' is configured for local use.")
 
@@ -35,9 +40,6 @@ def fetch_schema_metadata():
     """)
     return cursor.fetchall()
 
-def create_embedding(text):
-    return embed_model.encode(text).tolist()
-
 def store_embeddings(table_name, column_name, embedding):
     cursor = conn.cursor()
     cursor.execute("""
@@ -46,12 +48,13 @@ def store_embeddings(table_name, column_name, embedding):
     """, (table_name, column_name, json.dumps(embedding)))
     conn.commit()
 
-# Main process
+# Main process: encode all column docs in one call, then store them
 metadata = fetch_schema_metadata()
-for table_name, column_name, data_type, data_length, nullable in tqdm(metadata):
-    doc_text = f"Table: {table_name}, Column: {column_name}, Type: {data_type}({data_length}), Nullable: {nullable}"
-    embedding = create_embedding(doc_text)
-    store_embeddings(table_name, column_name, embedding)
+doc_texts = [f"Table: {table_name}, Column: {column_name}, Type: {data_type}({data_length}), Nullable: {nullable}"
+             for table_name, column_name, data_type, data_length, nullable in metadata]
+embeddings = embed_model.encode(doc_texts, convert_to_numpy=True) if doc_texts else []
+for (table_name, column_name, *_), embedding in tqdm(zip(metadata, embeddings), total=len(metadata)):
+    store_embeddings(table_name, column_name, embedding.tolist())
 
 conn.close()
 print("✅ Embeddings generated and stored in Oracle.")
@@ -0,0 +1,46 @@
+"""
+Production (pre-fork) launcher for the Flask agents.
+
+The master imports the agent once (`preload_app`): embedding models and the
+memory-mapped template index are loaded before forking, and every worker shares
+them copy-on-write. Just before each fork, agent_common.prefork closes any
+Oracle pool the master opened and calls `gc.freeze()`. After the fork it starts
+each worker's own pool, refresh and batching threads.
+
+Usage (from the repository root):
+  gunicorn -c api/gunicorn.conf.py --chdir api/database_NoLLM_agent \
+      ai_db_intent_embeded_nomodel_interface:app
+
+Environment:
+  AGENT_PORT          listen port (5000)
+  AGENT_WORKERS       worker processes (2)
+  AGENT_THREADS       threads per worker; NDJSON streams hold one each (8)
+  AGENT_TIMEOUT       seconds before a silent worker is restarted (120)
+  AGENT_MAX_REQUESTS  recycle a worker after this many requests (0 = never)
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ['AGENT_PREFORK'] = '1'
+
+from agent_common import prefork  # noqa: E402
+
+bind = f"0.0.0.0:{os.getenv('AGENT_PORT', '5000')}"
+workers = int(os.getenv('AGENT_WORKERS', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('AGENT_THREADS', '8'))
+timeout = int(os.getenv('AGENT_TIMEOUT', '120'))
+max_requests = int(os.getenv('AGENT_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+preload_app = True
+accesslog = '-'
+
+
+def pre_fork(server, worker):
+    prefork.prepare_fork()
+
+
+def post_fork(server, worker):
+    prefork.after_fork()
+    server.log.info("worker %s: per-process pools and threads started", worker.pid)
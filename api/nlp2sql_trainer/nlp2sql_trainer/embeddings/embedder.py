@@ -1,7 +1,18 @@
 from __future__ import annotations
+from pathlib import Path
 from typing import Sequence, Dict, Any, List
+import sys
 import numpy as np
 
+def _agent_common(module: str):
+    """Import api/agent_common.<module>, shared with the agents."""
+    import importlib
+    try:
+        return importlib.import_module(f"agent_common.{module}")
+    except ImportError:
+        sys.path.append(str(Path(__file__).resolve().parents[3]))
+        return importlib.import_module(f"agent_common.{module}")
+
 class BaseEmbedder:
     def embed_texts(self, texts: Sequence[str]) -> np.ndarray:
         raise NotImplementedError
@@ -15,10 +26,44 @@ class SentenceTransformerEmbedder(BaseEmbedder):
     def embed_texts(self, texts: Sequence[str]) -> np.ndarray:
         return np.asarray(self.model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True, normalize_embeddings=True))
 
+class OnnxEmbedder(BaseEmbedder):
+    """int8-quantized ONNX Runtime model exported from a local sentence-transformers directory."""
+    def __init__(self, model_name: str, batch_size: int = 64, quantize: bool = True, threads: int = 0):
+        self.model = _agent_common("onnx_embedding").OnnxEncoder(model_name, quantized=quantize, threads=threads)
+        self.batch_size = batch_size
+
+    def embed_texts(self, texts: Sequence[str]) -> np.ndarray:
+        return self.model.encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True)
+
 def build_embedder(cfg: dict) -> BaseEmbedder:
+    """Embedder for the `embeddings` config section.
+
+    Unless `cache: false` is set, `model.encode` goes through the on-disk embedding
+    cache shared with the Training tools and the RAG indexers
+    (agent_common/embedding_cache.py, stored under `cache_dir` or $EMBEDDING_CACHE_DIR).
+    Only texts it has not seen for this exact model are encoded.
+    """
+    embedder = _build_embedder(cfg)
+    if cfg.get("cache", True):
+        if isinstance(embedder, OnnxEmbedder):
+            variant = "onnx-int8" if cfg.get("quantize", True) else "onnx"
+        else:
+            variant = "torch"
+        cache = _agent_common("embedding_cache")
+        embedder.model = cache.cached_encoder(embedder.model,
+                                              cfg.get("model_name", "sentence-transformers/all-MiniLM-L6-v2"),
+                                              variant=variant, root=cfg.get("cache_dir"))
+    return embedder
+
+def _build_embedder(cfg: dict) -> BaseEmbedder:
     backend = cfg.get("backend", "sentence-transformers")
     if backend == "sentence-transformers":
         return SentenceTransformerEmbedder(model_name=cfg.get("model_name", "sentence-transformers/all-MiniLM-L6-v2"),
                                            batch_size=cfg.get("batch_size", 64))
+    elif backend == "onnx":
+        return OnnxEmbedder(model_name=cfg.get("model_name", "sentence-transformers/all-MiniLM-L6-v2"),
+                            batch_size=cfg.get("batch_size", 64),
+                            quantize=cfg.get("quantize", True),
+                            threads=cfg.get("onnx_threads", 0))
     else:
         raise ValueError(f"Unknown embeddings backend: {backend}")
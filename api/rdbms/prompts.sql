@@ -191,3 +191,20 @@ CREATE TABLE query_templates (
     parameters CLOB                      -- JSON array of parameter definitions (optional)
 );
 
+
+
+-- Intent phrases for the intent agent (ai_db_intent_interface); rows override
+-- the built-in INTENT_SQL_MAP and are hot-reloaded when the enabled rows change
+-- (row count, MAX(updated_at), or a hash of intent, sql_text length and its first 1000 chars)
+
+CREATE TABLE intent_sql_map (
+    intent      VARCHAR2(400) PRIMARY KEY,   -- phrase matched (case-insensitive substring) in the prompt
+    sql_text    CLOB NOT NULL,               -- SELECT executed for the intent
+    enabled     NUMBER(1) DEFAULT 1 NOT NULL,
+    cache_ttl_seconds NUMBER,                -- result cache TTL; NULL = agent default, 0 = never cache
+    updated_at  TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+);
+
+-- Migration for tables created before cache_ttl_seconds. Until it runs the agent
+-- reads every TTL as NULL; POST /reload_intents (or a restart) picks up the column:
+-- ALTER TABLE intent_sql_map ADD (cache_ttl_seconds NUMBER);
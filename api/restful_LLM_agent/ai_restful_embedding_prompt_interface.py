@@ -1,5 +1,4 @@
 from flask import Flask, request, Response, jsonify, stream_with_context
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 from langchain_community.llms import Ollama
 import requests
@@ -7,6 +6,10 @@ import numpy as np
 import json
 import os
 from sqlalchemy import create_engine, text
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.embedding_service import get_encoder
+from agent_common.prefork import ProcessLocal
 
 app = Flask(__name__)
 
@@ -20,10 +23,11 @@ db_service = os.getenv("DB_SERVICE", "orclpdb1")
 db_uri = f"oracle+oracledb://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT', '1521')}/?service_name={os.getenv('DB_SERVICE')}"
 print("db_uri====", db_uri)
 
-engine = create_engine(db_uri)
+# One engine (and connection pool) per process: a pre-fork master's pool is disposed before the fork
+engine = ProcessLocal(lambda: create_engine(db_uri), close=lambda e: e.dispose())
 
 # Embedding and LLM
-embedder = SentenceTransformer(os.getenv('LOCAL_EMBED_MODEL'))
+embedder = get_encoder(os.getenv('LOCAL_EMBED_MODEL'))
 llm = Ollama(model="llama3.2:1b", temperature=0.0)
 
 # Cache mapping in memory
@@ -31,16 +35,17 @@ intent_cache = []
 
 def load_intents_from_db():
     global intent_cache
-    with engine.connect() as conn:
+    with engine.get().connect() as conn:
         result = conn.execute(text("SELECT intent, endpoint, expected_params FROM api_mappings"))
-        intent_cache = []
-        for row in result:
-            intent_cache.append({
-                "intent": row[0],
-                "endpoint": row[1],
-                "expected_params": json.loads(row[2]),
-                "embedding": embedder.encode(row[0])
-            })
+        rows = result.fetchall()
+    # One batched encode for all intents instead of one model call per row
+    embeddings = embedder.encode([row[0] for row in rows]) if rows else []
+    intent_cache = [{
+        "intent": row[0],
+        "endpoint": row[1],
+        "expected_params": json.loads(row[2]),
+        "embedding": emb
+    } for row, emb in zip(rows, embeddings)]
 
 # Reload mappings at startup
 load_intents_from_db()
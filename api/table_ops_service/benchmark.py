@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the table ops service (smart_cache).
+
+Generates synthetic datasets shaped like the risk tables (wide, mixed types,
+skewed categorical columns), serves them as NDJSON from a local stub agent
+running in a separate process, and replays scripted grid sessions against the
+Flask app in-process: paging, single/multi sort, column/value/advanced
+filters, global search and distinct lists.
+
+For every operation it reports p50/p95/mean latency, throughput (ops/s and
+rows/s over the upstream dataset), peak RSS, and the mean Server-Timing stage
+breakdown, as JSON so successive builds can be diffed.
+
+Usage:
+  cd api/table_ops_service
+  python benchmark.py --rows 10000 100000 1000000 --cols 60 --repeat 5 --out bench.json
+  python benchmark.py --rows 10000 --compare bench.json      # print deltas vs a previous run
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import socket
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+###############################################################################
+# Synthetic risk-shaped datasets
+###############################################################################
+
+CATEGORICAL_DOMAINS = {
+    'BOOK': [f'BOOK_{i:03d}' for i in range(400)],
+    'DESK': ['RATES', 'CREDIT', 'FX', 'EQUITY', 'COMMODITIES', 'XVA', 'TREASURY', 'EM'],
+    'CCY': ['USD', 'EUR', 'GBP', 'JPY', 'CHF', 'AUD', 'CAD', 'SEK', 'NOK', 'CNH', 'HKD', 'SGD'],
+    'COUNTERPARTY': [f'CPTY_{i:05d}' for i in range(20000)],
+    'PRODUCT_TYPE': ['IRS', 'XCCY', 'FRA', 'SWAPTION', 'CAP', 'FLOOR', 'CDS', 'BOND', 'FXFWD', 'FXOPT', 'TRS', 'REPO'],
+    'RISK_FACTOR': [f'RF_{i:04d}' for i in range(2500)],
+    'TENOR': ['ON', '1W', '1M', '3M', '6M', '1Y', '2Y', '3Y', '5Y', '7Y', '10Y', '15Y', '20Y', '30Y'],
+    'REGION': ['EMEA', 'AMER', 'APAC'],
+    'LEGAL_ENTITY': [f'LE_{i:02d}' for i in range(40)],
+}
+
+
+def build_schema(n_cols):
+    """Column list of (name, kind). Core risk columns first, padded with measures/attributes."""
+    schema = [('TRADE_ID', 'id'), ('AS_OF_DATE', 'date'), ('MATURITY_DATE', 'date')]
+    schema += [(name, 'cat') for name in CATEGORICAL_DOMAINS]
+    schema += [('NOTIONAL', 'amount'), ('PV', 'float'), ('DELTA', 'float'), ('GAMMA', 'float'),
+               ('VEGA', 'float'), ('THETA', 'float'), ('QUANTITY', 'int'), ('COMMENT', 'text')]
+    i = 0
+    while len(schema) < n_cols:
+        if i % 3 == 2:
+            schema.append((f'ATTR_{i:03d}', 'cat_small'))
+        else:
+            schema.append((f'MEASURE_{i:03d}', 'float'))
+        i += 1
+    return schema[:max(n_cols, 1)]
+
+
+def _zipf_weights(n, s=1.2):
+    return [1.0 / ((k + 1) ** s) for k in range(n)]
+
+
+def column_types(schema):
+    kinds = {'date': 'date', 'amount': 'number', 'float': 'number', 'int': 'number'}
+    return {name: kinds.get(kind, 'string') for name, kind in schema}
+
+
+def iter_rows(n_rows, schema, seed=7):
+    """Deterministic row stream; categorical columns follow a Zipf-like skew."""
+    rng = random.Random(seed)
+    base = date(2025, 1, 1)
+    cats = {}
+    for name, kind in schema:
+        if kind == 'cat':
+            domain = CATEGORICAL_DOMAINS[name]
+        elif kind == 'cat_small':
+            domain = [f'{name}_V{j}' for j in range(12)]
+        else:
+            continue
+        # Pre-draw a pool so per-row sampling is a cheap index lookup
+        cats[name] = rng.choices(domain, weights=_zipf_weights(len(domain)), k=4096)
+    for i in range(n_rows):
+        row = {}
+        for name, kind in schema:
+            if kind == 'id':
+                row[name] = f'T{i:09d}'
+            elif kind == 'date':
+                row[name] = (base + timedelta(days=rng.randrange(3650))).isoformat()
+            elif kind in ('cat', 'cat_small'):
+                row[name] = cats[name][rng.randrange(4096)]
+            elif kind == 'amount':
+                row[name] = round(rng.lognormvariate(13, 1.5), 2)
+            elif kind == 'float':
+                row[name] = None if rng.random() < 0.02 else round(rng.gauss(0, 1000), 4)
+            elif kind == 'int':
+                row[name] = rng.randrange(-5000, 5000)
+            else:
+                row[name] = None if rng.random() < 0.5 else f'note {rng.randrange(100000)}'
+        yield row
+
+
+###############################################################################
+# Stub upstream agent (separate process so it does not compete for the GIL)
+###############################################################################
+
+def _serve_stub(port, path, n_rows, n_cols, seed, ready):
+    schema = build_schema(n_cols)
+    header = (json.dumps({'_base_sql': 'SELECT * FROM BENCH_RISK'}) + '\n'
+              + json.dumps({'_column_types': column_types(schema), '_search_columns': [c for c, _ in schema]}) + '\n').encode('utf-8')
+
+    # Encode once to a file; every /query replays it from the page cache
+    with open(path, 'wb') as f:
+        f.write(header)
+        buf = []
+        for row in iter_rows(n_rows, schema, seed):
+            buf.append(json.dumps(row))
+            if len(buf) >= 2000:
+                f.write(('\n'.join(buf) + '\n').encode('utf-8'))
+                buf = []
+        if buf:
+            f.write(('\n'.join(buf) + '\n').encode('utf-8'))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            with open(path, 'rb') as f:
+                while True:
+                    part = f.read(1 << 20)
+                    if not part:
+                        break
+                    self.wfile.write(f'{len(part):X}\r\n'.encode('ascii') + part + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    ready.set()
+    server.serve_forever()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class StubAgent:
+    def __init__(self, n_rows, n_cols, seed=7):
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}/query'
+        fd, self.path = tempfile.mkstemp(prefix='table_ops_bench_', suffix='.ndjson')
+        os.close(fd)
+        ready = multiprocessing.Event()
+        self.proc = multiprocessing.Process(target=_serve_stub, args=(self.port, self.path, n_rows, n_cols, seed, ready), daemon=True)
+        self.proc.start()
+        if not ready.wait(timeout=3600):
+            raise RuntimeError('Stub agent failed to start')
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.join(5)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+###############################################################################
+# Scripted grid sessions
+###############################################################################
+
+def grid_session(schema):
+    """Ordered (op_name, endpoint, body_overrides) mimicking a user working the grid."""
+    names = [c for c, _ in schema]
+    num_col = 'PV' if 'PV' in names else names[-1]
+    cat_col = 'DESK' if 'DESK' in names else names[0]
+    ccy_col = 'CCY' if 'CCY' in names else names[0]
+    tenor_col = 'TENOR' if 'TENOR' in names else names[0]
+    return [
+        ('page_first', '/table/query', {'page': 1, 'pageSize': 100}),
+        ('page_deep', '/table/query', {'page': 500, 'pageSize': 100}),
+        ('sort_single', '/table/query', {'sort': [{'key': num_col, 'direction': 'desc'}]}),
+        ('sort_multi', '/table/query', {'sort': [{'key': cat_col, 'direction': 'asc'}, {'key': num_col, 'direction': 'asc'}]}),
+        ('filter_column', '/table/query', {'columnFilters': {num_col: {'op': '>', 'value': 0}}}),
+        ('filter_value', '/table/query', {'valueFilters': {ccy_col: ['USD', 'EUR', 'GBP']}}),
+        ('filter_advanced', '/table/query', {'advancedFilters': {'combine': 'OR', 'rules': [
+            {'column': num_col, 'op': 'between', 'value': -100, 'value2': 100},
+            {'column': tenor_col, 'op': 'equals', 'value': '10Y'}]}}),
+        ('search_substring', '/table/query', {'search': {'query': 'BOOK_01', 'mode': 'substring'}}),
+        ('search_regex', '/table/query', {'search': {'query': r'CPTY_0+1\d', 'mode': 'regex'}}),
+        ('distinct', '/table/distinct', {'column': cat_col, 'limit': 500}),
+        ('distinct_filtered', '/table/distinct', {'column': ccy_col, 'limit': 500, 'searchTerm': 'u',
+                                                  'columnFilters': {num_col: {'op': '<', 'value': 0}}}),
+        ('all_rows_filtered', '/table/query', {'all': True, 'valueFilters': {cat_col: ['FX']}}),
+    ]
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0)
+    except Exception:
+        return None
+
+
+def _parse_server_timing(header):
+    out = {}
+    for part in (header or '').split(','):
+        bits = part.strip().split(';')
+        if len(bits) < 2:
+            continue
+        for b in bits[1:]:
+            if b.startswith('dur='):
+                try:
+                    out[bits[0]] = out.get(bits[0], 0.0) + float(b[4:])
+                except ValueError:
+                    pass
+    return out
+
+
+def _run_op(client, endpoint, body, repeat, before=None):
+    latencies = []
+    stages = {}
+    status = None
+    size = 0
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        t0 = time.perf_counter()
+        resp = client.post(endpoint, json=body)
+        data = resp.get_data()
+        latencies.append(time.perf_counter() - t0)
+        status = resp.status_code
+        size = len(data)
+        for k, v in _parse_server_timing(resp.headers.get('Server-Timing')).items():
+            stages[k] = stages.get(k, 0.0) + v
+    lat = sorted(latencies)
+    mean = sum(lat) / len(lat)
+    return {
+        'status': status,
+        'repeat': repeat,
+        'p50Ms': _percentile(lat, 0.50) * 1000.0,
+        'p95Ms': _percentile(lat, 0.95) * 1000.0,
+        'meanMs': mean * 1000.0,
+        'opsPerSec': (1.0 / mean) if mean > 0 else None,
+        'responseBytes': size,
+        'stagesMeanMs': {k: v / repeat for k, v in stages.items()},
+    }
+
+
+def run_dataset(sc, n_rows, n_cols, repeat, seed):
+    schema = build_schema(n_cols)
+    stub = StubAgent(n_rows, n_cols, seed)
+    try:
+        sc.mode_to_endpoint = lambda mode: stub.url
+        client = sc.app.test_client()
+        base = {'model': 'bench', 'mode': 'database', 'prompt': f'bench {n_rows}x{n_cols}'}
+        results = {}
+
+        def drop_cache():
+            sc._cache.clear()
+
+        res = _run_op(client, '/table/query', {**base, 'page': 1, 'pageSize': 100}, max(1, min(repeat, 3)), before=drop_cache)
+        res['rowsPerSec'] = n_rows / (res['meanMs'] / 1000.0) if res['meanMs'] else None
+        res['peakRssMb'] = _peak_rss_mb()
+        res['rssMb'] = _current_rss_mb()
+        results['materialize_cold'] = res
+
+        # Warm the cache once for the session
+        client.post('/table/query', json={**base, 'page': 1, 'pageSize': 1})
+        for name, endpoint, overrides in grid_session(schema):
+            res = _run_op(client, endpoint, {**base, **overrides}, repeat)
+            res['rowsPerSec'] = n_rows / (res['meanMs'] / 1000.0) if res['meanMs'] else None
+            res['peakRssMb'] = _peak_rss_mb()
+            res['rssMb'] = _current_rss_mb()
+            results[name] = res
+        sc._cache.clear()
+        return {'rows': n_rows, 'cols': n_cols, 'operations': results}
+    finally:
+        stub.close()
+
+
+def compare(current, baseline):
+    """Print p50/p95 ratios for operations present in both runs."""
+    base_sets = {(d['rows'], d['cols']): d for d in baseline.get('datasets', [])}
+    for d in current.get('datasets', []):
+        b = base_sets.get((d['rows'], d['cols']))
+        if not b:
+            continue
+        print(f"== {d['rows']} rows x {d['cols']} cols ==")
+        for op, r in d['operations'].items():
+            br = b['operations'].get(op)
+            if not br:
+                continue
+            p50 = r['p50Ms'] / br['p50Ms'] if br['p50Ms'] else float('nan')
+            p95 = r['p95Ms'] / br['p95Ms'] if br['p95Ms'] else float('nan')
+            flag = '  <-- regression' if p50 > 1.10 else ''
+            print(f"  {op:<20} p50 {r['p50Ms']:9.2f}ms (x{p50:.2f})  p95 {r['p95Ms']:9.2f}ms (x{p95:.2f}){flag}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description='Benchmark table_ops_service on synthetic risk-shaped datasets')
+    p.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help='Dataset sizes (10k..5M)')
+    p.add_argument('--cols', type=int, default=60)
+    p.add_argument('--repeat', type=int, default=5, help='Repetitions per operation')
+    p.add_argument('--seed', type=int, default=7)
+    p.add_argument('--out', default='', help='Write JSON results here (default: stdout)')
+    p.add_argument('--compare', default='', help='Previous results JSON to diff against')
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Keep housekeeping threads and slow-request logging out of the measurements
+    os.environ.setdefault('TABLE_OPS_SCHEDULER', '0')
+    os.environ.setdefault('TABLE_OPS_SLOW_REQUEST_MS', '1e12')
+    import smart_cache as sc
+
+    report = {
+        'startedAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'datasets': [],
+    }
+    for n in args.rows:
+        print(f'Benchmarking {n} rows x {args.cols} cols ...', file=sys.stderr)
+        report['datasets'].append(run_dataset(sc, n, args.cols, args.repeat, args.seed))
+    report['finishedAt'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Per-request stage timing and Prometheus-format metrics for table_ops_service.
+
+A `RequestTrace` is bound to the current request (via a context variable) and
+collects stage durations (materialize, filter, sort, oracle_count, ...) plus
+counters such as rows and bytes. When the request finishes the trace is folded
+into process-wide histograms, rendered as Prometheus text on /metrics and as a
+`Server-Timing` header on the response.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Labelled histograms keyed by (metric name, sorted label tuple)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._series = {}
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS):
+        with self._lock:
+            self._meta.setdefault(name, (help_text, tuple(buckets)))
+
+    def observe(self, name, value, **labels):
+        _, buckets = self._meta[name]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                hist = self._series[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda kv: kv[0])
+            snap = [(name, labels, list(h.counts), h.sum, h.count, h.buckets) for (name, labels), h in series]
+            meta = dict(self._meta)
+        lines = []
+        seen = set()
+        for name, labels, counts, total, count, buckets in snap:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {meta[name][0]}")
+                lines.append(f"# TYPE {name} histogram")
+            base = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+            sep = ',' if base else ''
+            cumulative = 0
+            for le, c in zip(buckets, counts):
+                cumulative += c
+                lines.append(f'{name}_bucket{{{base}{sep}le="{_fmt(le)}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{name}_bucket{{{base}{sep}le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{{base}}} {_fmt(total)}')
+            lines.append(f'{name}_count{{{base}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt(v):
+    return repr(float(v))
+
+
+class RequestTrace:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = []  # (name, seconds) in execution order
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.stages.append((name, time.perf_counter() - t0))
+
+    def add(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total=None):
+        parts = [f"{_token(n)};dur={s * 1000.0:.2f}" for n, s in self.stages]
+        parts.append(f"total;dur={(self.elapsed() if total is None else total) * 1000.0:.2f}")
+        return ', '.join(parts)
+
+    def breakdown(self):
+        return {
+            'endpoint': self.endpoint,
+            'stagesMs': [{'stage': n, 'ms': round(s * 1000.0, 2)} for n, s in self.stages],
+            'counters': dict(self.counters),
+        }
+
+
+def _token(name):
+    return ''.join(ch if ch.isalnum() or ch in '_-' else '_' for ch in str(name))
+
+
+class _NullTrace:
+    """Stand-in used when code runs outside a traced request (scheduler jobs, scripts)."""
+
+    @contextmanager
+    def stage(self, name):
+        yield self
+
+    def add(self, name, value):
+        pass
+
+
+_current = contextvars.ContextVar('table_ops_trace', default=None)
+_NULL = _NullTrace()
+
+
+def start_trace(endpoint):
+    trace = RequestTrace(endpoint)
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get() or _NULL
+
+
+def end_trace():
+    trace = _current.get()
+    _current.set(None)
+    return trace
+
+
+registry = MetricsRegistry()
+registry.histogram('table_ops_request_duration_seconds', 'End-to-end table_ops request latency.')
+registry.histogram('table_ops_stage_duration_seconds', 'Time spent per processing stage of a table_ops request.')
+registry.histogram('table_ops_rows', 'Row counts seen per request (upstream, filtered, returned).', SIZE_BUCKETS)
+registry.histogram('table_ops_bytes', 'Bytes read from upstream agents and written to clients.', SIZE_BUCKETS)
+
+
+def record(trace, status, response_bytes):
+    """Fold a finished trace into the process-wide histograms. Returns total seconds."""
+    total = trace.elapsed()
+    ep = trace.endpoint
+    registry.observe('table_ops_request_duration_seconds', total, endpoint=ep, status=str(status))
+    for name, secs in trace.stages:
+        registry.observe('table_ops_stage_duration_seconds', secs, endpoint=ep, stage=name)
+    for name, value in trace.counters.items():
+        if name.endswith('_bytes'):
+            registry.observe('table_ops_bytes', value, endpoint=ep, kind=name[:-len('_bytes')])
+        elif name.startswith('rows_'):
+            registry.observe('table_ops_rows', value, endpoint=ep, kind=name[len('rows_'):])
+    if response_bytes is not None:
+        registry.observe('table_ops_bytes', response_bytes, endpoint=ep, kind='response')
+    return total
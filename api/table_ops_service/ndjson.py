@@ -0,0 +1,111 @@
+"""
+Streaming NDJSON decoder for agent responses.
+
+Parses the body in large byte chunks (uses orjson when installed, stdlib json
+otherwise), peels off metadata lines (`_base_sql`, `_column_types`, ...) and
+drops all-blank rows in the same pass, appending straight into the row list.
+"""
+import json
+
+try:
+    import orjson as _orjson
+except Exception:  # pragma: no cover - optional dependency
+    _orjson = None
+
+
+META_KEYS = ('_narration', '_base_sql', '_column_types', '_search_columns')
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+if _orjson is not None:
+    def loads(raw):
+        return _orjson.loads(raw)
+else:
+    def loads(raw):
+        return json.loads(raw.decode('utf-8') if isinstance(raw, (bytes, bytearray, memoryview)) else raw)
+
+
+def _is_blank_row(obj):
+    for v in obj.values():
+        if v is None:
+            continue
+        if isinstance(v, str) and v.strip() == '':
+            continue
+        return False
+    return True
+
+
+class NDJSONDecoder:
+    """Incremental decoder: feed byte chunks, read `rows` and `meta` when done."""
+
+    def __init__(self):
+        self.rows = []
+        self.meta = {}
+        self.lines = 0
+        self.bytes = 0
+        self.bad_lines = 0
+        self._tail = b''
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self.bytes += len(chunk)
+        buf = self._tail + chunk if self._tail else chunk
+        start = 0
+        find = buf.find
+        while True:
+            nl = find(b'\n', start)
+            if nl < 0:
+                break
+            if nl > start:
+                self._line(buf[start:nl])
+            start = nl + 1
+        self._tail = buf[start:]
+
+    def close(self):
+        if self._tail.strip():
+            self._line(self._tail)
+        self._tail = b''
+        return self.rows, self.meta
+
+    def _line(self, line):
+        self.lines += 1
+        try:
+            obj = loads(line)
+        except Exception:
+            if line.strip():
+                self.bad_lines += 1
+            return
+        if isinstance(obj, dict):
+            # Metadata objects always lead with an underscore key; only pay for
+            # the key lookup when the raw line looks like one.
+            if line.lstrip()[:3] == b'{"_':
+                is_meta = False
+                for k in META_KEYS:
+                    if obj.get(k):
+                        is_meta = True
+                        break
+                if is_meta:
+                    for k in META_KEYS:
+                        if k in obj and k != '_narration':
+                            self.meta[k] = obj[k]
+                    return
+            if obj and _is_blank_row(obj):
+                return
+            self.rows.append(obj)
+        elif isinstance(obj, list):
+            for item in obj:
+                if isinstance(item, dict) and item and _is_blank_row(item):
+                    continue
+                self.rows.append(item)
+        else:
+            self.rows.append({'data': obj})
+
+
+def decode_ndjson(chunks):
+    """Decode an iterable of byte chunks. Returns (rows, meta)."""
+    dec = NDJSONDecoder()
+    for chunk in chunks:
+        dec.feed(chunk)
+    return dec.close()
@@ -0,0 +1,168 @@
+"""
+Background scheduler for table_ops_service housekeeping.
+
+One daemon thread owns every periodic job (pin expiry purges, cache TTL
+sweeps, ...) so request handlers never pay for housekeeping. Each job keeps
+its own timing and last-run status, exposed through `status()` for the
+admin endpoint.
+"""
+import threading
+import time
+import traceback
+
+
+class JobAlreadyRunning(RuntimeError):
+    """Raised by `run_now()` when the job is already running (scheduled or manual)."""
+
+
+class _Job:
+    def __init__(self, name, fn, interval, run_at_start=False):
+        self.name = name
+        self.fn = fn
+        self.interval = float(interval)
+        self.next_run = time.time() if run_at_start else time.time() + self.interval
+        self.runs = 0
+        self.failures = 0
+        self.running = False
+        self.last_started = None
+        self.last_finished = None
+        self.last_duration_ms = None
+        self.total_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.last_status = 'pending'
+        self.last_result = None
+        self.last_error = None
+
+    def snapshot(self):
+        avg = (self.total_duration_ms / self.runs) if self.runs else None
+        return {
+            'name': self.name,
+            'intervalSeconds': self.interval,
+            'running': self.running,
+            'runs': self.runs,
+            'failures': self.failures,
+            'lastStatus': self.last_status,
+            'lastStarted': self.last_started,
+            'lastFinished': self.last_finished,
+            'lastDurationMs': self.last_duration_ms,
+            'avgDurationMs': avg,
+            'maxDurationMs': self.max_duration_ms,
+            'lastResult': self.last_result,
+            'lastError': self.last_error,
+            'nextRun': self.next_run,
+        }
+
+
+class JobScheduler:
+    """Run registered callables at fixed intervals on a single daemon thread.
+
+    Jobs run sequentially; a slow job delays the others but never overlaps
+    itself. A job's return value (if JSON-friendly) is kept as `lastResult`.
+    """
+
+    def __init__(self, tick_seconds=1.0, logger=None):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._tick = float(tick_seconds)
+        self._logger = logger
+
+    def register(self, name, fn, interval, run_at_start=False):
+        with self._lock:
+            self._jobs[name] = _Job(name, fn, interval, run_at_start=run_at_start)
+        self._wakeup.set()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name='table-ops-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run_now(self, name):
+        """Run a job synchronously on the caller's thread. Returns its snapshot.
+
+        Raises KeyError for an unknown job and JobAlreadyRunning if it is running.
+        """
+        with self._lock:
+            job = self._jobs.get(name)
+            if job is None:
+                raise KeyError(name)
+            if job.running:
+                raise JobAlreadyRunning(name)
+            job.running = True
+        self._run_job(job)
+        return job.snapshot()
+
+    def status(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            'running': self.is_running(),
+            'jobs': [j.snapshot() for j in jobs],
+        }
+
+    def _due_jobs(self, now):
+        """Due jobs that are not running, each marked running (claimed) under the lock."""
+        with self._lock:
+            due = [j for j in self._jobs.values() if j.next_run <= now and not j.running]
+            for job in due:
+                job.running = True
+            return due
+
+    def _seconds_until_next(self, now):
+        with self._lock:
+            if not self._jobs:
+                return self._tick
+            nxt = min(j.next_run for j in self._jobs.values())
+        return max(0.0, min(self._tick, nxt - now))
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            due = self._due_jobs(time.time())
+            for i, job in enumerate(due):
+                if self._stopped.is_set():
+                    with self._lock:
+                        for unrun in due[i:]:
+                            unrun.running = False
+                    break
+                self._run_job(job)
+            self._wakeup.wait(self._seconds_until_next(time.time()))
+            self._wakeup.clear()
+
+    def _run_job(self, job):
+        """Run a job already claimed (`running` set under the lock) by the caller."""
+        job.last_started = time.time()
+        t0 = time.perf_counter()
+        try:
+            job.last_result = job.fn()
+            job.last_status = 'ok'
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_status = 'error'
+            job.last_error = str(e)
+            if self._logger is not None:
+                self._logger.warning(f"Scheduled job {job.name} failed: {e}\n{traceback.format_exc()}")
+        finally:
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            job.runs += 1
+            job.last_duration_ms = elapsed_ms
+            job.total_duration_ms += elapsed_ms
+            job.max_duration_ms = max(job.max_duration_ms, elapsed_ms)
+            job.last_finished = time.time()
+            job.next_run = job.last_finished + job.interval
+            with self._lock:
+                job.running = False
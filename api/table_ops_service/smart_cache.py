@@ -9,18 +9,35 @@ It proxies to existing Flask agents based on `mode` and reuses their NDJSON outp
 to build pages and distinct values. This avoids materializing full results in Node
 and shares cache across Node instances.
 """
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from functools import lru_cache
 import time
 import json
 import os
+import sys
 import uuid
+import hashlib
+import threading
+import itertools
 import requests
+from requests.adapters import HTTPAdapter
 import oracledb
 from dotenv import load_dotenv
 from datetime import datetime, date
 from decimal import Decimal
 
+try:
+    from .scheduler import JobAlreadyRunning, JobScheduler
+    from .ndjson import NDJSONDecoder, DEFAULT_CHUNK_SIZE
+    from . import metrics
+except ImportError:
+    from scheduler import JobAlreadyRunning, JobScheduler
+    from ndjson import NDJSONDecoder, DEFAULT_CHUNK_SIZE
+    import metrics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.prefork import on_worker_start
+
 
 def _read_lob(val):
     if hasattr(val, 'read'):
@@ -321,21 +338,86 @@ def mode_to_endpoint(mode: str) -> str:
 
 # Simple in-process cache with TTL
 _cache = {}
+_cache_lock = threading.Lock()
+_cache_generation = itertools.count(1)
+# Generations are only unique within one process; the boot id (re-drawn after a fork) makes them
+# unique across restarts and workers, so an ETag never names two different payloads
+_boot = (None, None)
 CACHE_TTL = 30 * 60  # 30 minutes
 
 
+def _boot_id():
+    global _boot
+    pid, boot_id = _boot
+    if pid != os.getpid():
+        _boot = pid, boot_id = os.getpid(), uuid.uuid4().hex
+    return boot_id
+
+
 def get_cache(key):
     ent = _cache.get(key)
     if not ent:
         return None
     if ent['expires'] < time.time():
-        _cache.pop(key, None)
+        with _cache_lock:
+            _cache.pop(key, None)
         return None
     return ent['data']
 
 
 def set_cache(key, data):
-    _cache[key] = { 'data': data, 'expires': time.time() + CACHE_TTL }
+    with _cache_lock:
+        _cache[key] = { 'data': data, 'expires': time.time() + CACHE_TTL, 'gen': f"{_boot_id()}:{next(_cache_generation)}" }
+
+
+def cache_generation(key):
+    """Generation of the live cache entry: "<boot id>:<n>", new every time the entry is (re)built."""
+    ent = _cache.get(key)
+    return ent.get('gen') if ent else None
+
+
+def sweep_cache():
+    """Drop expired cache entries nobody has touched since they expired."""
+    now = time.time()
+    with _cache_lock:
+        expired = [k for k, ent in _cache.items() if ent['expires'] < now]
+        for k in expired:
+            _cache.pop(k, None)
+        remaining = len(_cache)
+    return { 'evicted': len(expired), 'remaining': remaining }
+
+
+# ---------------- Conditional responses (ETag / 304) -----------------
+
+def make_etag(*parts):
+    """Strong validator derived from the canonical form of `parts`."""
+    return hashlib.sha256(stable_stringify(list(parts)).encode('utf-8')).hexdigest()[:40]
+
+
+def _client_has(etag):
+    return bool(etag) and request.if_none_match.contains(etag)
+
+
+def _not_modified(etag):
+    resp = app.response_class(status=304)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+def _json_with_etag(payload, etag=None):
+    """jsonify `payload` tagged with `etag`, or with a hash of the body when no tag is known up front."""
+    with metrics.current_trace().stage('encode'):
+        resp = jsonify(payload)
+        if etag:
+            resp.set_etag(etag)
+        else:
+            resp.add_etag()
+    resp.headers['Cache-Control'] = 'no-cache'
+    tag, _ = resp.get_etag()
+    if _client_has(tag):
+        return _not_modified(tag)
+    return resp
 
 
 def matches_col_filter(row, col, f):
@@ -473,49 +555,44 @@ def sort_rows(rows, sort):
     return sorted(rows, key=key_fn, reverse=reverse)
 
 
+# Keep-alive connection pool shared by all calls to the upstream agents
+AGENT_POOL_SIZE = int(os.environ.get('AGENT_HTTP_POOL_SIZE', '16'))
+AGENT_TIMEOUT = float(os.environ.get('AGENT_HTTP_TIMEOUT', '60'))
+_agent_session = None
+_agent_session_lock = threading.Lock()
+
+
+def agent_session():
+    global _agent_session
+    if _agent_session is None:
+        with _agent_session_lock:
+            if _agent_session is None:
+                sess = requests.Session()
+                adapter = HTTPAdapter(pool_connections=AGENT_POOL_SIZE, pool_maxsize=AGENT_POOL_SIZE)
+                sess.mount('http://', adapter)
+                sess.mount('https://', adapter)
+                _agent_session = sess
+    return _agent_session
+
+
 def materialize_rows(body):
-    """Fetch NDJSON from the underlying Flask agent and materialize into a list of dicts."""
+    """Fetch NDJSON from the underlying Flask agent and materialize into a list of dicts.
+
+    Metadata lines (`_base_sql`, `_column_types`, `_search_columns`) are not rows and are skipped.
+    """
     mode = body.get('mode')
     endpoint = mode_to_endpoint(mode)
     if not endpoint:
         return []
     try:
-        resp = requests.post(endpoint, json=body, stream=True, timeout=60)
-        resp.raise_for_status()
-        rows = []
-        for line in resp.iter_lines():
-            if not line:
-                continue
-            try:
-                obj = json.loads(line.decode('utf-8'))
-                if isinstance(obj, dict) and (obj.get('_narration') or obj.get('_base_sql') or obj.get('_column_types') or obj.get('_search_columns')):
-                    continue
-                if isinstance(obj, dict):
-                    rows.append(obj)
-                elif isinstance(obj, list):
-                    rows.extend(obj)
-                else:
-                    rows.append({'data': obj})
-            except Exception:
-                continue
-        # Filter out accidental empty rows
-        cleaned = []
-        for r in rows:
-            if not isinstance(r, dict) or not r:
-                cleaned.append(r)
-                continue
-            # if every value is null/blank string, skip
-            all_blank = True
-            for v in r.values():
-                if v is None:
-                    continue
-                if isinstance(v, str) and v.strip() == '':
-                    continue
-                all_blank = False
-                break
-            if not all_blank:
-                cleaned.append(r)
-        return cleaned
+        with agent_session().post(endpoint, json=body, stream=True, timeout=AGENT_TIMEOUT) as resp:
+            resp.raise_for_status()
+            decoder = NDJSONDecoder()
+            for chunk in resp.iter_content(chunk_size=DEFAULT_CHUNK_SIZE):
+                decoder.feed(chunk)
+            rows, _ = decoder.close()
+        metrics.current_trace().add('upstream_bytes', decoder.bytes)
+        return rows
     except Exception:
         return []
 
@@ -566,21 +643,29 @@ def table_query():
                     advanced_filters=advanced_filters,
                     search_columns=body.get('searchColumns')
                 )
-                return jsonify({ 'rows': data, 'total': total, 'page': 1, 'pageSize': total, 'cached': False, 'all': True })
-            return jsonify({ 'rows': data, 'total': total, 'page': page, 'pageSize': page_size, 'cached': False })
+                return _json_with_etag({ 'rows': data, 'total': total, 'page': 1, 'pageSize': total, 'cached': False, 'all': True })
+            return _json_with_etag({ 'rows': data, 'total': total, 'page': page, 'pageSize': page_size, 'cached': False })
         except Exception as e:
             # Fall through to cached/materialized path if pushdown fails
             app.logger.warning(f"Oracle pushdown failed: {e}")
 
     sig = stable_stringify({ 'model': model, 'mode': mode, 'prompt': prompt })
+    trace = metrics.current_trace()
     rows = get_cache(sig)
     if rows is None:
-        rows = materialize_rows(body)
+        with trace.stage('materialize'):
+            rows = materialize_rows(body)
         set_cache(sig, rows)
+    trace.add('rows_upstream', len(rows))
+    etag = make_etag('table/query', sig, cache_generation(sig), body)
+    if _client_has(etag):
+        return _not_modified(etag)
 
     # Apply global search + filters + sort
-    effective = global_search(rows, search)
-    effective = apply_context_filters(effective, column_filters, value_filters, advanced_filters)
+    with trace.stage('search'):
+        effective = global_search(rows, search)
+    with trace.stage('filter'):
+        effective = apply_context_filters(effective, column_filters, value_filters, advanced_filters)
     # NOTE: Sorting on the full dataset; can be pushed to DB later by rewriting SQL
     if sort:
         # Basic multi-sort using Python sort with tuple keys
@@ -595,14 +680,18 @@ def table_query():
                     out.append(str(v))
             return tuple(out)
         reverse = len(sort) == 1 and (sort[0].get('direction') == 'desc')
-        effective = sorted(effective, key=key_fn, reverse=reverse)
+        with trace.stage('sort'):
+            effective = sorted(effective, key=key_fn, reverse=reverse)
 
     total = len(effective)
+    trace.add('rows_filtered', total)
     if all_flag:
-        return jsonify({ 'rows': effective, 'total': total, 'page': 1, 'pageSize': total, 'cached': True, 'all': True })
+        trace.add('rows_returned', total)
+        return _json_with_etag({ 'rows': effective, 'total': total, 'page': 1, 'pageSize': total, 'cached': True, 'all': True }, etag)
     start = (page - 1) * page_size
     page_rows = effective[start:start + page_size]
-    return jsonify({ 'rows': page_rows, 'total': total, 'page': page, 'pageSize': page_size, 'cached': True })
+    trace.add('rows_returned', len(page_rows))
+    return _json_with_etag({ 'rows': page_rows, 'total': total, 'page': page, 'pageSize': page_size, 'cached': True }, etag)
 
 
 @app.post('/table/distinct')
@@ -640,32 +729,42 @@ def table_distinct():
                 advanced_filters=advanced_filters,
                 search_columns=body.get('searchColumns')
             )
-            return jsonify({ 'distinct': values, 'column': column, 'count': len(values) })
+            return _json_with_etag({ 'distinct': values, 'column': column, 'count': len(values) })
         except Exception as e:
             app.logger.warning(f"Oracle distinct pushdown failed: {e}")
     sig = stable_stringify({ 'model': model, 'mode': mode, 'prompt': prompt })
+    trace = metrics.current_trace()
     rows = get_cache(sig)
     if rows is None:
-        rows = materialize_rows(body)
+        with trace.stage('materialize'):
+            rows = materialize_rows(body)
         set_cache(sig, rows)
-
-    effective = apply_context_filters(rows, column_filters, value_filters, advanced_filters)
+    trace.add('rows_upstream', len(rows))
+    etag = make_etag('table/distinct', sig, cache_generation(sig), body)
+    if _client_has(etag):
+        return _not_modified(etag)
+
+    with trace.stage('filter'):
+        effective = apply_context_filters(rows, column_filters, value_filters, advanced_filters)
+    trace.add('rows_filtered', len(effective))
     values = []
     st = str(search_term or '').lower()
     seen = set()
-    for r in effective:
-        raw = r.get(column)
-        s = '' if raw is None else str(raw)
-        if st and st not in s.lower():
-            continue
-        if s in seen:
-            continue
-        seen.add(s)
-        values.append(s)
-        if len(values) >= limit:
-            break
-    values.sort()
-    return jsonify({ 'distinct': values, 'column': column, 'count': len(values) })
+    with trace.stage('distinct'):
+        for r in effective:
+            raw = r.get(column)
+            s = '' if raw is None else str(raw)
+            if st and st not in s.lower():
+                continue
+            if s in seen:
+                continue
+            seen.add(s)
+            values.append(s)
+            if len(values) >= limit:
+                break
+        values.sort()
+    trace.add('rows_returned', len(values))
+    return _json_with_etag({ 'distinct': values, 'column': column, 'count': len(values) }, etag)
 
 
 # ---------------- Save view to Oracle -----------------
@@ -747,14 +846,41 @@ def _ensure_pins_table(conn):
         app.logger.warning(f"Ensure pinned table failed: {e}")
 
 
-def _cleanup_expired_pins(cur):
-    try:
-        cur.execute("DELETE FROM VEDA_PINNED_VIEWS WHERE EXPIRES_AT IS NOT NULL AND EXPIRES_AT < SYSTIMESTAMP")
-    except Exception as e:
-        app.logger.warning(f"Cleanup pinned views failed: {e}")
+DEFAULT_PIN_TTL_MINUTES = 120
+PIN_PURGE_BATCH_SIZE = int(os.environ.get('PIN_PURGE_BATCH_SIZE', '500'))
 
 
-DEFAULT_PIN_TTL_MINUTES = 120
+def purge_expired_pins(batch_size=None):
+    """Delete expired pins in small committed batches so the table is never locked for long."""
+    batch_size = max(1, int(batch_size or PIN_PURGE_BATCH_SIZE))
+    deleted = 0
+    batches = 0
+    conn = _oracle_connect()
+    try:
+        cur = conn.cursor()
+        while True:
+            try:
+                cur.execute(
+                    "DELETE FROM VEDA_PINNED_VIEWS WHERE EXPIRES_AT IS NOT NULL AND EXPIRES_AT < SYSTIMESTAMP AND ROWNUM <= :batch",
+                    batch=batch_size,
+                )
+            except oracledb.DatabaseError as db_err:
+                err_obj = db_err.args[0] if db_err.args else None
+                if getattr(err_obj, 'code', None) == 942:
+                    break
+                raise
+            n = cur.rowcount or 0
+            conn.commit()
+            deleted += n
+            batches += 1
+            if n < batch_size:
+                break
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    return { 'deleted': deleted, 'batches': batches }
 
 
 @app.post('/table/save_view')
@@ -824,7 +950,6 @@ def table_pin_view():
     try:
         _ensure_pins_table(conn)
         cur = conn.cursor()
-        _cleanup_expired_pins(cur)
         cur.setinputsizes(content=oracledb.CLOB, view_state=oracledb.CLOB, options=oracledb.CLOB)
         cur.execute("""
             INSERT INTO VEDA_PINNED_VIEWS
@@ -967,7 +1092,7 @@ def table_saved_views():
                 'createdAt': str(created_at),
                 'content': parsed,
             })
-        return jsonify({ 'views': rows })
+        return _json_with_etag({ 'views': rows })
     except Exception as e:
         return jsonify({ 'error': f'Oracle select failed: {e}' }), 500
     finally:
@@ -1246,11 +1371,12 @@ def dashboard_get():
 
         view_snapshots = {}
         try:
-            view_snapshots = _load_dashboard_view_snapshots(conn, parsed)
+            with metrics.current_trace().stage('view_snapshots'):
+                view_snapshots = _load_dashboard_view_snapshots(conn, parsed)
         except Exception as e:
             view_snapshots = { '_error': f'Failed to load view snapshots: {e}' }
 
-        return jsonify({ 'name': name, 'layout': parsed, 'viewSnapshots': view_snapshots })
+        return _json_with_etag({ 'name': name, 'layout': parsed, 'viewSnapshots': view_snapshots })
     except Exception as e:
         return jsonify({ 'error': f'Oracle select failed: {e}' }), 500
     finally:
@@ -1336,7 +1462,8 @@ def _oracle_connect():
     port = int(os.environ.get('DB_PORT', '1521'))
     service = os.environ.get('DB_SERVICE')
     dsn = oracledb.makedsn(host, port, service_name=service)
-    conn = oracledb.connect(user=user, password=password, dsn=dsn)
+    with metrics.current_trace().stage('oracle_connect'):
+        conn = oracledb.connect(user=user, password=password, dsn=dsn)
     return conn
 
 
@@ -1493,15 +1620,20 @@ def oracle_pushdown_query(base_sql, page, page_size, sort, search, column_filter
     binds_q['off'] = off
     binds_q['lim'] = page_size
 
+    trace = metrics.current_trace()
     with _oracle_connect() as conn:
         with conn.cursor() as cur:
             app.logger.info(f"[oracle-pushdown] COUNT SQL: {count_sql} binds={binds}")
-            cur.execute(count_sql, binds)
-            total = int(cur.fetchone()[0])
+            with trace.stage('oracle_count'):
+                cur.execute(count_sql, binds)
+                total = int(cur.fetchone()[0])
             app.logger.info(f"[oracle-pushdown] DATA SQL: {data_sql} binds={binds_q}")
-            cur.execute(data_sql, binds_q)
-            rows = cur.fetchall()
-            data = _rows_to_dicts(cur, rows)
+            with trace.stage('oracle_data'):
+                cur.execute(data_sql, binds_q)
+                rows = cur.fetchall()
+                data = _rows_to_dicts(cur, rows)
+    trace.add('rows_filtered', total)
+    trace.add('rows_returned', len(data))
     return data, total
 
 
@@ -1515,11 +1647,80 @@ def oracle_pushdown_distinct(base_sql, column, limit, search, column_filters, va
     with _oracle_connect() as conn:
         with conn.cursor() as cur:
             app.logger.info(f"[oracle-pushdown] DISTINCT SQL: {sql} binds={binds_q}")
-            cur.execute(sql, binds_q)
-            vals = [ (row[0] if row and len(row)>0 else None) for row in cur.fetchall() ]
+            with metrics.current_trace().stage('oracle_distinct'):
+                cur.execute(sql, binds_q)
+                vals = [ (row[0] if row and len(row)>0 else None) for row in cur.fetchall() ]
+    metrics.current_trace().add('rows_returned', len(vals))
     return [ '' if v is None else str(v) for v in vals ]
 
 
+# ---------------- Request instrumentation -----------------
+
+SLOW_REQUEST_MS = float(os.environ.get('TABLE_OPS_SLOW_REQUEST_MS', '1000'))
+
+
+@app.before_request
+def _start_request_trace():
+    if request.path == '/metrics':
+        return
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    metrics.start_trace(rule)
+
+
+@app.after_request
+def _finish_request_trace(resp):
+    trace = metrics.end_trace()
+    if trace is None:
+        return resp
+    try:
+        size = None if resp.is_streamed else resp.calculate_content_length()
+        total = metrics.record(trace, resp.status_code, size)
+        resp.headers['Server-Timing'] = trace.server_timing(total)
+        if total * 1000.0 >= SLOW_REQUEST_MS:
+            breakdown = trace.breakdown()
+            breakdown['status'] = resp.status_code
+            breakdown['totalMs'] = round(total * 1000.0, 2)
+            breakdown['responseBytes'] = size
+            app.logger.warning(f"[slow-request] {json.dumps(breakdown)}")
+    except Exception as e:
+        app.logger.warning(f"Request metrics failed: {e}")
+    return resp
+
+
+@app.get('/metrics')
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# ---------------- Background housekeeping -----------------
+
+CACHE_SWEEP_INTERVAL = int(os.environ.get('CACHE_SWEEP_INTERVAL_SECONDS', '60'))
+PIN_PURGE_INTERVAL = int(os.environ.get('PIN_PURGE_INTERVAL_SECONDS', '300'))
+
+scheduler = JobScheduler(logger=app.logger)
+scheduler.register('cache_ttl_sweep', sweep_cache, CACHE_SWEEP_INTERVAL)
+scheduler.register('pin_expiry_purge', purge_expired_pins, PIN_PURGE_INTERVAL, run_at_start=True)
+
+if os.environ.get('TABLE_OPS_SCHEDULER', '1').lower() not in ('0', 'false', 'no', 'off'):
+    # Threads do not survive fork(): under the pre-fork launcher every worker starts its own
+    on_worker_start(scheduler.start)
+
+
+@app.get('/admin/jobs')
+def admin_jobs():
+    return jsonify(scheduler.status())
+
+
+@app.post('/admin/jobs/<name>/run')
+def admin_job_run(name):
+    try:
+        return jsonify(scheduler.run_now(name))
+    except KeyError:
+        return jsonify({ 'error': f'Unknown job: {name}' }), 404
+    except JobAlreadyRunning:
+        return jsonify({ 'error': f'Job already running: {name}' }), 409
+
+
 if __name__ == '__main__':
     # For quick local run: python api/table_ops_service/app.py
     app.run(host='0.0.0.0', port=5015)
@@ -18,8 +18,10 @@ from llama_index.embeddings import HuggingFaceEmbedding
 from llama_index.vector_stores.sql_vector_store import SQLVectorStore
 
 from langchain.llms import Ollama
-from sentence_transformers import SentenceTransformer
 from llama_index import LangchainEmbedding
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_common.embedding_service import get_encoder
 
 
 # Flask app
@@ -33,8 +35,8 @@ if not DATABASE_URL:
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
 
-# Load your local sentence transformer model directly
-embedder = SentenceTransformer(os.getenv('LOCAL_EMBED_MODEL'))
+# Load your local sentence transformer model once (shared encoder, also provides embed_query/embed_documents)
+embedder = get_encoder(os.getenv('LOCAL_EMBED_MODEL'))
 
 # Wrap it for LlamaIndex / Langchain compatibility
 embedding_model = LangchainEmbedding(embedder)
@@ -0,0 +1,21 @@
+import { vi, expect, test, afterEach } from 'vitest';
+import { clearConditionalPosts, postJsonConditional } from '../utils/conditionalPost';
+
+afterEach(() => {
+  clearConditionalPosts();
+  vi.unstubAllGlobals();
+});
+
+test('revalidates a repeated POST with its ETag and reuses the body on 304', async () => {
+  const fetchMock = vi.fn()
+    .mockResolvedValueOnce(new Response(JSON.stringify({ rows: [1, 2] }), { status: 200, headers: { ETag: 'W/"a"' } }))
+    .mockResolvedValueOnce(new Response(null, { status: 304 }));
+  vi.stubGlobal('fetch', fetchMock);
+
+  const body = { prompt: 'p', page: 1 };
+  expect(await postJsonConditional('/api/table/query', body)).toEqual({ rows: [1, 2] });
+  expect(fetchMock.mock.calls[0][1].headers['If-None-Match']).toBeUndefined();
+
+  expect(await postJsonConditional('/api/table/query', body)).toEqual({ rows: [1, 2] });
+  expect(fetchMock.mock.calls[1][1].headers['If-None-Match']).toBe('W/"a"');
+});
@@ -1,5 +1,6 @@
 import React, { useState, useRef, useEffect, Suspense } from "react";
 import { FixedSizeList as VList } from 'react-window';
+import { postJsonConditional } from '../utils/conditionalPost';
 const ChartPanel = React.lazy(() => import('./ChartPanel'));
 import IconColumns from '../icons/column.svg';
 import IconFilter from '../icons/column_filter.svg';
@@ -723,30 +724,23 @@ const TableComponent = React.memo(({ data, initialPageSize = TABLE_COMPONENT_DEF
     const fetchDistinct = async () => {
       try {
         setHeaderDistinctLoading(true);
-        const res = await fetch('/api/table/distinct', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            model: exportContext.model,
-            mode: exportContext.mode,
-            prompt: exportContext.prompt,
-            column: col,
-            limit,
-            searchTerm: debouncedHeaderDistinctTerm || undefined,
-            // include current context filters for server-side filtering
-            columnFilters: colFilters,
-            valueFilters,
-            advancedFilters: { rules: advFilters, combine: advCombine },
-            tableOpsMode,
-            pushDownDb,
-            baseSql: exportContext.baseSql,
-            columnTypes: exportContext.columnTypes,
-            searchColumns: headers,
-          }),
-          signal: ctrl.signal,
-        });
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        const json = await res.json();
+        const json = await postJsonConditional('/api/table/distinct', {
+          model: exportContext.model,
+          mode: exportContext.mode,
+          prompt: exportContext.prompt,
+          column: col,
+          limit,
+          searchTerm: debouncedHeaderDistinctTerm || undefined,
+          // include current context filters for server-side filtering
+          columnFilters: colFilters,
+          valueFilters,
+          advancedFilters: { rules: advFilters, combine: advCombine },
+          tableOpsMode,
+          pushDownDb,
+          baseSql: exportContext.baseSql,
+          columnTypes: exportContext.columnTypes,
+          searchColumns: headers,
+        }, { signal: ctrl.signal });
         const distinct = Array.isArray(json.distinct) ? json.distinct : [];
         setHeaderDistincts(prev => ({ ...prev, [col]: distinct }));
       } catch (e) {
@@ -1851,9 +1845,7 @@ const TableComponent = React.memo(({ data, initialPageSize = TABLE_COMPONENT_DEF
           columnTypes: exportContext.columnTypes,
           searchColumns: headers,
         };
-        const res = await fetch('/api/table/query', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body), signal: ctrl.signal });
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        const json = await res.json();
+        const json = await postJsonConditional('/api/table/query', body, { signal: ctrl.signal });
         setServerRows(Array.isArray(json.rows) ? json.rows : []);
         setServerTotal(Number(json.total) || 0);
         setServerCached(typeof json.cached === 'boolean' ? json.cached : null);
@@ -1896,9 +1888,7 @@ const TableComponent = React.memo(({ data, initialPageSize = TABLE_COMPONENT_DEF
           columnTypes: exportContext.columnTypes,
           searchColumns: headers,
         };
-        const res = await fetch('/api/table/query', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body), signal: ctrl.signal });
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        const json = await res.json();
+        const json = await postJsonConditional('/api/table/query', body, { signal: ctrl.signal });
         setServerAllRows(Array.isArray(json.rows) ? json.rows : []);
       } catch (e) {
         if (e.name !== 'AbortError') console.error('serverMode full fetch failed', e);
@@ -1935,9 +1925,7 @@ const TableComponent = React.memo(({ data, initialPageSize = TABLE_COMPONENT_DEF
           columnTypes: exportContext.columnTypes,
           searchColumns: headers,
         };
-        const res = await fetch('/api/table/query', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body), signal: ctrl.signal });
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        const json = await res.json();
+        const json = await postJsonConditional('/api/table/query', body, { signal: ctrl.signal });
         setServerAllRows(Array.isArray(json.rows) ? json.rows : []);
       } catch (e) {
         if (e.name !== 'AbortError') console.error('serverMode full fetch (virtual) failed', e);
@@ -0,0 +1,38 @@
+// POST helper for the table-ops routes (/api/table/query, /api/table/distinct).
+// Browsers never attach If-None-Match to POST requests, so the last ETag and
+// JSON response are kept per request spec (URL + serialized body) and sent
+// back explicitly. A 304 Not Modified then reuses the stored JSON instead of
+// re-downloading and re-serializing the same grid page.
+
+const MAX_ENTRIES = 50;
+const entries = new Map(); // key -> { etag, json }, oldest first
+
+const remember = (key, value) => {
+  entries.delete(key);
+  entries.set(key, value);
+  while (entries.size > MAX_ENTRIES) {
+    entries.delete(entries.keys().next().value);
+  }
+};
+
+export const postJsonConditional = async (url, body, { signal } = {}) => {
+  const payload = JSON.stringify(body);
+  const key = `${url}\n${payload}`;
+  const cached = entries.get(key);
+  const headers = { 'Content-Type': 'application/json' };
+  if (cached) headers['If-None-Match'] = cached.etag;
+
+  const res = await fetch(url, { method: 'POST', headers, body: payload, signal });
+  if (res.status === 304 && cached) {
+    remember(key, cached);
+    return cached.json;
+  }
+  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+  const json = await res.json();
+  const etag = res.headers.get('ETag');
+  if (etag) remember(key, { etag, json });
+  else entries.delete(key);
+  return json;
+};
+
+export const clearConditionalPosts = () => entries.clear();
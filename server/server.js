@@ -200,6 +200,28 @@ function stableStringify(obj) {
   return '{' + parts.join(',') + '}';
 }
 
+// Forward the browser's validator so table-ops can answer 304 Not Modified
+function conditionalHeaders(req, extra = {}) {
+  const headers = { ...extra };
+  const inm = req.headers['if-none-match'];
+  if (inm) headers['If-None-Match'] = inm;
+  return headers;
+}
+
+// Relay a 304 (or copy the ETag of a 200) from table-ops; returns true when the response was sent
+function relayConditional(flaskRes, res) {
+  const etag = flaskRes.headers.get('etag');
+  if (etag) {
+    res.setHeader('ETag', etag);
+    res.setHeader('Cache-Control', flaskRes.headers.get('cache-control') || 'no-cache');
+  }
+  if (flaskRes.status === 304) {
+    res.status(304).end();
+    return true;
+  }
+  return false;
+}
+
 // Helpers to apply filters on server
 function matchesColFilter(row, col, f) {
   if (!f || !f.op) return true;
@@ -918,7 +940,8 @@ app.get('/api/table/saved_views', async (req, res) => {
     if (req.query.owner) qs.set('owner', req.query.owner);
     if (req.query.viewName) qs.set('viewName', req.query.viewName);
     const url = `${FLASK_TABLE_OPS_URL}/table/saved_views?${qs.toString()}`;
-    const flaskRes = await undiciFetch(url, { method: 'GET' });
+    const flaskRes = await undiciFetch(url, { method: 'GET', headers: conditionalHeaders(req) });
+    if (relayConditional(flaskRes, res)) return;
     const ct = flaskRes.headers.get('content-type') || '';
     if (ct.includes('application/json')) {
       const json = await flaskRes.json();
@@ -1237,7 +1260,8 @@ app.get('/api/dashboard/get', async (req, res) => {
   try {
     const qs = new URLSearchParams(); if (req.query.name) qs.set('name', req.query.name); if (req.query.owner) qs.set('owner', req.query.owner);
     const url = `${FLASK_TABLE_OPS_URL}/dashboard/get?${qs.toString()}`;
-    const flaskRes = await undiciFetch(url, { method: 'GET' });
+    const flaskRes = await undiciFetch(url, { method: 'GET', headers: conditionalHeaders(req) });
+    if (relayConditional(flaskRes, res)) return;
     const ct = flaskRes.headers.get('content-type') || '';
     if (ct.includes('application/json')) { const json = await flaskRes.json(); return res.status(flaskRes.status).json(json); }
     const text = await flaskRes.text(); return res.status(flaskRes.status).send(text);
@@ -1440,9 +1464,10 @@ app.post('/api/table/query', async (req, res) => {
       try {
         const resp = await undiciFetch(`${FLASK_TABLE_OPS_URL}/table/query`, {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
+          headers: conditionalHeaders(req, { 'Content-Type': 'application/json' }),
           body: JSON.stringify(req.body),
         });
+        if (relayConditional(resp, res)) return;
         if (resp.ok) {
           res.setHeader('Content-Type', 'application/json');
           const text = await resp.text();
@@ -1586,8 +1611,9 @@ app.post('/api/table/distinct', async (req, res) => {
     if (tableOpsModeD === 'flask') {
       try {
         const resp = await undiciFetch(`${FLASK_TABLE_OPS_URL}/table/distinct`, {
-          method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(req.body)
+          method: 'POST', headers: conditionalHeaders(req, { 'Content-Type': 'application/json' }), body: JSON.stringify(req.body)
         });
+        if (relayConditional(resp, res)) return;
         if (resp.ok) {
           res.setHeader('Content-Type', 'application/json');
           const text = await resp.text();
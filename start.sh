@@ -41,6 +41,19 @@ log_and_pid() {
   echo "$name $pid $log" >> "$PIDS_FILE"
 }
 
+# Flask agents: `flask run` by default; with AGENT_WORKERS>0, the pre-fork gunicorn
+# launcher (models and indexes loaded once, shared copy-on-write by the workers)
+AGENT_WORKERS="${AGENT_WORKERS:-0}"
+start_flask_agent() {
+  local name="$1" dir="$2" module="$3" port="$4"
+  if [ "$AGENT_WORKERS" -gt 0 ]; then
+    log_and_pid "$name" "$dir" env AGENT_PORT="$port" AGENT_WORKERS="$AGENT_WORKERS" \
+      gunicorn -c "$ROOT_DIR/api/gunicorn.conf.py" "$module:app"
+  else
+    log_and_pid "$name" "$dir" env FLASK_APP="$module.py" FLASK_RUN_PORT="$port" FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
+  fi
+}
+
 # Start Flask API
 echo "🔌 Starting Flask APIs..."
 
@@ -50,20 +63,20 @@ if [ -d "$ROOT_DIR/api/venv" ]; then
   source "$ROOT_DIR/api/venv/bin/activate"
 fi
 
-log_and_pid "flask-db-intent-5012" "$ROOT_DIR/api/database_NoLLM_agent" env FLASK_APP=ai_db_intent_interface.py FLASK_RUN_PORT=5012 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
-log_and_pid "flask-db-intent-nomodel-5011" "$ROOT_DIR/api/database_NoLLM_agent" env FLASK_APP=ai_db_intent_embeded_nomodel_interface.py FLASK_RUN_PORT=5011 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
+start_flask_agent "flask-db-intent-5012" "$ROOT_DIR/api/database_NoLLM_agent" ai_db_intent_interface 5012
+start_flask_agent "flask-db-intent-nomodel-5011" "$ROOT_DIR/api/database_NoLLM_agent" ai_db_intent_embeded_nomodel_interface 5011
 
-log_and_pid "flask-db-langchain-5013" "$ROOT_DIR/api/database_LLM_agent" env FLASK_APP=ai_db_langchain_interface.py FLASK_RUN_PORT=5013 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
-log_and_pid "flask-db-langchain-prompt-5014" "$ROOT_DIR/api/database_LLM_agent" env FLASK_APP=ai_db_langchain_prompt_interface.py FLASK_RUN_PORT=5014 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
-log_and_pid "flask-db-langchain-embed-5004" "$ROOT_DIR/api/database_LLM_agent" env FLASK_APP=ai_db_langchain_embedding_prompt_interface.py FLASK_RUN_PORT=5004 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
-log_and_pid "flask-db-langchain-embed-narr-5009" "$ROOT_DIR/api/database_LLM_agent" env FLASK_APP=ai_db_langchain_embedding_prompt_narrated_interface.py FLASK_RUN_PORT=5009 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
+start_flask_agent "flask-db-langchain-5013" "$ROOT_DIR/api/database_LLM_agent" ai_db_langchain_interface 5013
+start_flask_agent "flask-db-langchain-prompt-5014" "$ROOT_DIR/api/database_LLM_agent" ai_db_langchain_prompt_interface 5014
+start_flask_agent "flask-db-langchain-embed-5004" "$ROOT_DIR/api/database_LLM_agent" ai_db_langchain_embedding_prompt_interface 5004
+start_flask_agent "flask-db-langchain-embed-narr-5009" "$ROOT_DIR/api/database_LLM_agent" ai_db_langchain_embedding_prompt_narrated_interface 5009
 
-log_and_pid "flask-rest-rado-5005" "$ROOT_DIR/api/restful_LLM_agent" env FLASK_APP=rado.py FLASK_RUN_PORT=5005 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
-log_and_pid "flask-rest-embed-5006" "$ROOT_DIR/api/restful_LLM_agent" env FLASK_APP=ai_restful_embedding_prompt_interface.py FLASK_RUN_PORT=5006 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
+start_flask_agent "flask-rest-rado-5005" "$ROOT_DIR/api/restful_LLM_agent" rado 5005
+start_flask_agent "flask-rest-embed-5006" "$ROOT_DIR/api/restful_LLM_agent" ai_restful_embedding_prompt_interface 5006
 
-log_and_pid "flask-generic-rag-5010" "$ROOT_DIR/api/database_generic_rag_LLM_agent" env FLASK_APP=ai_generic_database_rag_agent.py FLASK_RUN_PORT=5010 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
+start_flask_agent "flask-generic-rag-5010" "$ROOT_DIR/api/database_generic_rag_LLM_agent" ai_generic_database_rag_agent 5010
 
-log_and_pid "flask-table-ops-5015" "$ROOT_DIR/api/table_ops_service" env FLASK_APP=smart_cache.py FLASK_RUN_PORT=5015 FLASK_RUN_HOST=0.0.0.0 FLASK_RUN_NO_RELOAD=1 flask run --no-reload
+start_flask_agent "flask-table-ops-5015" "$ROOT_DIR/api/table_ops_service" smart_cache 5015
 
 echo "🖥️ Starting Node.js backend..."
 log_and_pid "node-server-3000" "$ROOT_DIR/server" node server.js
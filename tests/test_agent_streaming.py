@@ -0,0 +1,100 @@
+import importlib
+import json
+import threading
+import time
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetch_calls = 0
+        self.arraysize = 100
+        self.prefetchrows = 2
+
+    def fetchmany(self, n):
+        self.fetch_calls += 1
+        out, self.rows = self.rows[:n], self.rows[n:]
+        return out
+
+
+def test_batches_are_buffered_and_flushed_by_size():
+    st = importlib.import_module('api.agent_common.streaming')
+    cur = st.tune_cursor(FakeCursor([(i, f"name {i}") for i in range(1000)]), arraysize=50, prefetchrows=50)
+    assert cur.arraysize == 50 and cur.prefetchrows == 50
+
+    enc = lambda r: json.dumps({"ID": r[0], "NAME": r[1]})
+    clock = iter(range(0, 10**6)).__next__  # never crosses the time threshold
+    chunks = list(st.ndjson_chunks(st.fetch_batches(cur, 50), enc, flush_bytes=4096, flush_seconds=10**9, clock=clock))
+
+    assert cur.fetch_calls == 21  # 20 full batches + the empty one that ends the stream
+    # First batch flushes immediately, the rest only once 4 KiB have accumulated
+    assert chunks[0].count('\n') == 50
+    assert all(len(c) >= 4096 for c in chunks[1:-1])
+    lines = ''.join(chunks).splitlines()
+    assert [json.loads(l)["ID"] for l in lines] == list(range(1000))
+    assert all(c.endswith('\n') for c in chunks)
+
+
+def test_time_based_flush():
+    st = importlib.import_module('api.agent_common.streaming')
+    ticks = iter([0, 0, 1, 1, 2, 2, 3, 3, 4, 4]).__next__
+    batches = [[1], [2], [3], [4]]
+    chunks = list(st.ndjson_chunks(batches, str, flush_bytes=10**9, flush_seconds=1, clock=ticks))
+    assert chunks == ['1\n', '2\n', '3\n', '4\n']
+    assert list(st.stream_cursor(FakeCursor([]), str)) == []
+
+
+def test_tag_chunk_wraps_rows_and_tags_metadata():
+    st = importlib.import_module('api.agent_common.streaming')
+    tagged, rows = st.tag_chunk('{"_base_sql": "select 1"}\n{"ID": 7}\n{}\n', 'w1')
+    lines = [json.loads(line) for line in tagged.splitlines()]
+    assert rows == 2 and tagged.endswith('\n')
+    assert lines == [{"id": "w1", "_base_sql": "select 1"}, {"id": "w1", "row": {"ID": 7}}, {"id": "w1", "row": {}}]
+
+    tagged, rows = st.tag_chunk('{"_ROWID": 1, "X": 2}\n{"_narration": "ok"}\n', 'w2')
+    lines = [json.loads(line) for line in tagged.splitlines()]
+    assert rows == 1 and lines == [{"id": "w2", "row": {"_ROWID": 1, "X": 2}}, {"id": "w2", "_narration": "ok"}]
+
+
+def test_multiplex_runs_streams_concurrently_and_tags_every_line():
+    st = importlib.import_module('api.agent_common.streaming')
+    barrier = threading.Barrier(3, timeout=5)
+
+    def query(n, fail=False):
+        def make_chunks():
+            barrier.wait()  # only passes if all three streams are running at once
+            if fail:
+                raise RuntimeError('ORA-00942')
+            for i in range(n):
+                yield json.dumps({"N": i}) + '\n'
+        return make_chunks
+
+    out = [json.loads(line) for chunk in st.multiplex([('a', query(3)), (2, query(1)), ('c', query(0, True))],
+                                                      max_workers=3) for line in chunk.splitlines()]
+    by_id = {}
+    for line in out:
+        by_id.setdefault(line['id'], []).append(line)
+    assert [r['row']['N'] for r in by_id['a'][:-1]] == [0, 1, 2]
+    assert by_id['a'][-1]['done'] and by_id['a'][-1]['rows'] == 3 and by_id[2][-1]['rows'] == 1
+    assert by_id['c'] == [{"id": "c", "error": "ORA-00942"}]
+
+
+def test_multiplex_stops_streams_when_the_client_goes_away():
+    st = importlib.import_module('api.agent_common.streaming')
+    closed = []
+
+    def endless():
+        try:
+            while True:
+                yield '{"X": 1}\n'
+        finally:
+            closed.append(True)
+
+    gen = st.multiplex([('x', endless)], max_pending=2)
+    assert json.loads(next(gen)) == {"id": "x", "row": {"X": 1}}
+    gen.close()
+    for _ in range(50):
+        if closed:
+            break
+        time.sleep(0.02)
+    assert closed == [True]
@@ -0,0 +1,94 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([[len(t), t.count('a'), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_only_new_text_is_encoded_and_order_is_kept(tmp_path):
+    ec = importlib.import_module('api.agent_common.embedding_cache')
+    model = CountingModel()
+    enc = ec.CachedEncoder(model, ec.EmbeddingCache(str(tmp_path), 'fp'))
+
+    first = enc.encode(['total sales', 'top  customers ', 'total sales'])
+    assert model.calls == [['total sales', 'top  customers ']]  # duplicates encoded once
+    assert first.shape == (3, 3) and np.array_equal(first[0], first[2])
+
+    second = enc.encode(['top customers', 'region count', 'total sales'])
+    assert model.calls[1] == ['region count']  # whitespace-normalized hit
+    assert np.array_equal(second[0], first[1]) and np.array_equal(second[2], first[0])
+    stats = enc.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 3, 3)
+
+
+def test_cache_persists_and_is_shared_across_instances(tmp_path):
+    ec = importlib.import_module('api.agent_common.embedding_cache')
+    a = ec.EmbeddingCache(str(tmp_path), 'fp')
+    b = ec.EmbeddingCache(str(tmp_path), 'fp')  # e.g. another process, opened before a writes
+    a.get_or_compute(['x', 'y'], CountingModel().encode)
+
+    model = CountingModel()
+    out = b.get_or_compute(['y', 'z'], model.encode)
+    assert model.calls == [['z']] and out[0][0] == 1.0
+
+    reopened = ec.EmbeddingCache(str(tmp_path), 'fp')
+    assert len(reopened) == 3 and isinstance(reopened._matrix(), np.memmap)
+
+
+def test_torn_append_is_ignored_and_truncated(tmp_path):
+    ec = importlib.import_module('api.agent_common.embedding_cache')
+    cache = ec.EmbeddingCache(str(tmp_path), 'fp')
+    cache.get_or_compute(['x'], CountingModel().encode)
+    with open(os.path.join(cache.dir, 'vectors.f32'), 'ab') as f:
+        f.write(b'\0' * 7)  # crash after part of a vector row, before its key
+
+    again = ec.EmbeddingCache(str(tmp_path), 'fp')
+    assert len(again) == 1
+    again.get_or_compute(['yy'], CountingModel().encode)
+    assert os.path.getsize(os.path.join(cache.dir, 'vectors.f32')) == 2 * 3 * 4
+    assert ec.EmbeddingCache(str(tmp_path), 'fp').get_or_compute(['yy'], None)[0][0] == 2.0
+
+
+def test_fingerprint_tracks_model_files_and_variant(tmp_path):
+    ec = importlib.import_module('api.agent_common.embedding_cache')
+    model_dir = tmp_path / 'model'
+    model_dir.mkdir()
+    (model_dir / 'config.json').write_text('{"dim": 3}')
+    base = ec.model_fingerprint(model_dir, 'torch')
+    assert base == ec.model_fingerprint(str(model_dir), 'torch')
+    assert base != ec.model_fingerprint(model_dir, 'onnx-int8')
+    (model_dir / 'onnx').mkdir()
+    (model_dir / 'onnx' / 'model.onnx').write_bytes(b'derived export')
+    assert ec.model_fingerprint(model_dir, 'torch') == base
+    (model_dir / 'config.json').write_text('{"dim": 4}')
+    assert ec.model_fingerprint(model_dir, 'torch') != base
+    assert ec.model_fingerprint('text-embedding-3-large', 'openai') != ec.model_fingerprint('text-embedding-3-small',
+                                                                                              'openai')
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    ec = importlib.import_module('api.agent_common.embedding_cache')
+    cache = ec.EmbeddingCache(str(tmp_path), 'fp')
+    cache.get_or_compute(['x'], CountingModel().encode)
+    with pytest.raises(ValueError, match='dim 3'):
+        cache.get_or_compute(['new'], lambda texts: np.zeros((len(texts), 5), dtype=np.float32))
+
+
+def test_open_cache_fingerprints_a_model_once(tmp_path, monkeypatch):
+    ec = importlib.import_module('api.agent_common.embedding_cache')
+    calls = []
+    real = ec.model_fingerprint
+    monkeypatch.setattr(ec, 'model_fingerprint', lambda *a: calls.append(a) or real(*a))
+    first = ec.open_cache('some-model', 'torch', root=str(tmp_path))
+    assert ec.open_cache('some-model', 'torch', root=str(tmp_path)) is first
+    assert len(calls) == 1
+    assert ec.open_cache('some-model', 'onnx', root=str(tmp_path)) is not first
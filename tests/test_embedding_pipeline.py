@@ -0,0 +1,94 @@
+import importlib
+import threading
+import time
+
+import numpy as np
+import pytest
+
+
+class ChunkCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.arraysize = None
+        self.closed = False
+
+    def execute(self, sql, binds=None):
+        self.sql, self.binds = sql, binds
+
+    def fetchmany(self, n):
+        out, self.rows = self.rows[:n], self.rows[n:]
+        return out
+
+    def close(self):
+        self.closed = True
+
+
+class ChunkConn:
+    def __init__(self, rows):
+        self.cur = ChunkCursor(rows)
+
+    def cursor(self):
+        return self.cur
+
+
+class SlowModel:
+    def __init__(self, delay):
+        self.delay = delay
+        self.threads = set()
+
+    def encode(self, texts, convert_to_numpy=True, batch_size=None, show_progress_bar=False):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_chunks_are_read_lazily():
+    ep = importlib.import_module('api.Training.utils.embedding_pipeline')
+    conn = ChunkConn([(i, f"q{i}") for i in range(5)])
+    chunks = list(ep.fetch_text_chunks(conn, ep.QUESTIONS_SQL, chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 2, 1] and chunks[2] == [(4, 'q4')]
+    assert conn.cur.closed
+
+
+def test_encode_overlaps_insert_and_keeps_row_order():
+    ep = importlib.import_module('api.Training.utils.embedding_pipeline')
+    inserted = []
+    insert_threads = set()
+
+    def insert_rows(conn, ids, texts, vectors):
+        insert_threads.add(threading.get_ident())
+        time.sleep(0.05)
+        inserted.extend(zip(ids, texts, vectors[:, 0].tolist()))
+        return len(ids)
+
+    chunks = [[(i, 'x' * i) for i in range(s, s + 10)] for s in range(0, 40, 10)]
+    model = SlowModel(delay=0.05)
+    lines = []
+    t0 = time.perf_counter()
+    totals = ep.encode_and_insert(None, model, iter(chunks), insert_rows=insert_rows, log=lines.append)
+    wall = time.perf_counter() - t0
+
+    assert [row[0] for row in inserted] == list(range(40)) and inserted[7] == (7, 'x' * 7, 7.0)
+    assert totals['rows'] == 40 and totals['chunks'] == 4
+    assert model.threads.isdisjoint(insert_threads)
+    assert wall < 0.35  # 4 x (50 ms encode + 50 ms insert) = 400 ms if run one after the other
+    assert len([line for line in lines if ' chunk ' in line]) == 4 and 'rows/s' in lines[-1]
+
+
+def test_insert_failure_stops_the_encoder():
+    ep = importlib.import_module('api.Training.utils.embedding_pipeline')
+    encoded = []
+
+    class Model:
+        def encode(self, texts, **kwargs):
+            encoded.append(texts)
+            time.sleep(0.02)
+            return np.zeros((len(texts), 2), dtype=np.float32)
+
+    def insert_rows(conn, ids, texts, vectors):
+        raise RuntimeError('ORA-01653: unable to extend table')
+
+    chunks = ([(i, 'q')] for i in range(100))
+    with pytest.raises(RuntimeError, match='ORA-01653'):
+        ep.encode_and_insert(None, Model(), chunks, insert_rows=insert_rows, queue_depth=1, log=lambda s: None)
+    assert len(encoded) < 10
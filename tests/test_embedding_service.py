@@ -0,0 +1,114 @@
+import importlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+
+class FakeModel:
+    """Deterministic 'embedding': [len(text), ord(first char), 1]."""
+
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, show_progress_bar=False):
+        self.calls.append(list(texts))
+        time.sleep(self.delay)
+        if any(t == 'boom' for t in texts):
+            raise RuntimeError('model failed')
+        return np.array([[len(t), ord(t[0]) if t else 0, 1] for t in texts], dtype=np.float32)
+
+
+def test_encode_matches_sentence_transformer_shapes():
+    es = importlib.import_module('api.agent_common.embedding_service')
+    enc = es.BatchingEncoder(FakeModel(), max_batch=4, window_seconds=0)
+    assert enc.encode('abc').tolist() == [3, 97, 1]
+    out = enc.encode(['ab', 'b'], normalize_embeddings=True)
+    assert out.shape == (2, 3) and np.allclose(np.linalg.norm(out, axis=1), 1.0)
+    assert enc.encode([]).shape[0] == 0
+    # Bulk calls skip the batcher
+    enc.encode(['a'] * 10)
+    assert enc.model.calls[-1] == ['a'] * 10
+    assert enc.embed_query('xy') == [2.0, 120.0, 1.0] and len(enc.embed_documents(['x', 'y'])) == 2
+
+
+def test_concurrent_requests_share_model_calls():
+    es = importlib.import_module('api.agent_common.embedding_service')
+    model = FakeModel(delay=0.02)
+    enc = es.BatchingEncoder(model, max_batch=64, window_seconds=0.005)
+    results = {}
+
+    def worker(i):
+        results[i] = enc.encode(['q' + 'x' * i])[0]
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(results[i][0] == 1 + i for i in range(16))  # every caller got its own row back
+    assert len(model.calls) < 16 and enc.stats()['largest_batch'] > 1
+    assert sum(len(c) for c in model.calls) == 16
+
+
+def test_model_errors_reach_every_caller_in_the_batch():
+    es = importlib.import_module('api.agent_common.embedding_service')
+    enc = es.BatchingEncoder(FakeModel(), max_batch=8, window_seconds=0)
+    with pytest.raises(RuntimeError, match='model failed'):
+        enc.encode(['boom'])
+    assert enc.encode(['ok']).shape == (1, 3)  # worker survives
+
+
+def test_remote_encoder_round_trip():
+    es = importlib.import_module('api.agent_common.embedding_service')
+    local = es.BatchingEncoder(FakeModel(), window_seconds=0)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            payload = json.dumps(es.encode_vectors(local.encode(body['texts']))).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        remote = es.get_encoder('fake', service_url=f'http://127.0.0.1:{server.server_port}')
+        assert remote is es.get_encoder('fake', service_url=f'http://127.0.0.1:{server.server_port}')
+        assert np.array_equal(remote.encode(['abc', 'z']), local.encode(['abc', 'z']))
+        assert remote.encode('abc', normalize_embeddings=True).shape == (3,)
+    finally:
+        server.shutdown()
+
+
+def test_remote_encoder_raises_the_service_error_message():
+    es = importlib.import_module('api.agent_common.embedding_service')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(400)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'error': "'texts' must be a list of strings"}).encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        remote = es.RemoteEncoder(f'http://127.0.0.1:{server.server_port}')
+        with pytest.raises(RuntimeError, match="HTTP 400: 'texts' must be a list of strings"):
+            remote.encode(['abc'])
+    finally:
+        server.shutdown()
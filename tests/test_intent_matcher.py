@@ -0,0 +1,25 @@
+import importlib
+
+
+def test_longest_match_wins_over_dict_order():
+    mod = importlib.import_module('api.database_NoLLM_agent.intent_matcher')
+    m = mod.IntentMatcher({
+        'sales': 'SELECT 1',
+        'list all sales': 'SELECT 2',
+        'sales by region': 'SELECT 3',
+    })
+    assert len(m) == 3
+    assert m.find('Please LIST ALL SALES now') == ('list all sales', 'SELECT 2')
+    # Two overlapping candidates: the longer phrase wins
+    assert m.find('list all sales by region')[0] == 'sales by region'
+    assert m.find('total sales') == ('sales', 'SELECT 1')
+    assert m.find('nothing here') is None
+    assert m.find('') is None
+
+
+def test_overlapping_suffixes_are_found():
+    mod = importlib.import_module('api.database_NoLLM_agent.intent_matcher')
+    m = mod.IntentMatcher({'he': 1, 'she': 2, 'his': 3, 'hers': 4})
+    assert m.find('ushers') == ('hers', 4)
+    assert m.find('ahishe') == ('his', 3)  # equal length: earliest wins
+    assert mod.IntentMatcher({}).find('anything') is None
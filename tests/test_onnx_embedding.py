@@ -0,0 +1,51 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api', 'local_all-MiniLM-L6-v2')
+
+
+def test_reads_sentence_transformers_pipeline():
+    oe = importlib.import_module('api.agent_common.onnx_embedding')
+    cfg = oe.read_model_config(MODEL_DIR)
+    assert cfg == {'pooling': 'mean', 'normalize': True, 'max_seq_length': 256}
+
+
+def test_mean_pooling_ignores_padding():
+    oe = importlib.import_module('api.agent_common.onnx_embedding')
+    hidden = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]],
+                       [[5.0, 6.0], [7.0, 8.0], [9.0, 10.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0], [1, 1, 1]])
+    assert oe.pool(hidden, mask).tolist() == [[2.0, 3.0], [7.0, 8.0]]
+    assert oe.pool(hidden, mask, 'cls').tolist() == [[1.0, 2.0], [5.0, 6.0]]
+    assert oe.pool(hidden, mask, 'max').tolist() == [[3.0, 4.0], [9.0, 10.0]]
+
+
+def test_int8_onnx_cosine_parity_with_torch():
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('tokenizers')
+    st = pytest.importorskip('sentence_transformers')
+    if not any(os.path.exists(os.path.join(MODEL_DIR, f)) for f in ('model.safetensors', 'pytorch_model.bin')):
+        pytest.skip('model weights not present in api/local_all-MiniLM-L6-v2')
+    oe = importlib.import_module('api.agent_common.onnx_embedding')
+    bench = importlib.import_module('api.agent_common.benchmark_embeddings')
+
+    texts = bench.questions()
+    torch_vecs = st.SentenceTransformer(MODEL_DIR, device='cpu').encode(texts, normalize_embeddings=True)
+    onnx_vecs = oe.OnnxEncoder(MODEL_DIR, quantized=True, threads=1).encode(texts)
+    report = bench.parity(np.asarray(torch_vecs), onnx_vecs)
+    assert report['max_abs_cos_diff'] < 0.05
+    assert report['top1_agreement'] >= 0.95
+    assert report['self_cos_min'] > 0.97
+
+
+def test_parity_report_on_identical_and_perturbed_vectors():
+    bench = importlib.import_module('api.agent_common.benchmark_embeddings')
+    vecs = np.eye(4, dtype=np.float32) + 0.1
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    assert bench.parity(vecs, vecs) == {'max_abs_cos_diff': 0.0, 'top1_agreement': 1.0, 'self_cos_min': 1.0}
+    noisy = vecs + np.random.default_rng(0).normal(0, 0.01, vecs.shape).astype(np.float32)
+    noisy /= np.linalg.norm(noisy, axis=1, keepdims=True)
+    assert 0 < bench.parity(vecs, noisy)['max_abs_cos_diff'] < 0.05
@@ -0,0 +1,94 @@
+import importlib
+
+
+class FakeCursor:
+    arraysize = 500
+
+    def var(self, typ, size=None, arraysize=None):
+        return (typ, size, arraysize)
+
+
+class FakeConn:
+    outputtypehandler = None
+
+
+def _patch_types(monkeypatch, ot):
+    for name in ('DB_TYPE_CLOB', 'DB_TYPE_NCLOB', 'DB_TYPE_BLOB', 'DB_TYPE_LONG',
+                 'DB_TYPE_LONG_NVARCHAR', 'DB_TYPE_LONG_RAW', 'DB_TYPE_NUMBER'):
+        monkeypatch.setattr(ot.oracledb, name, name, raising=False)
+
+
+def test_handler_inlines_lobs_and_chains_previous(monkeypatch):
+    ot = importlib.import_module('api.agent_common.oracle_tuning')
+    _patch_types(monkeypatch, ot)
+    ot.reset_lob_stats()
+
+    seen = []
+    conn = FakeConn()
+    conn.outputtypehandler = lambda cur, name, t, *a: seen.append(t) or 'prev'
+    ot.install_lob_handler(conn, max_bytes=1024)
+    handler = conn.outputtypehandler
+    ot.install_lob_handler(conn, max_bytes=1024)
+    assert conn.outputtypehandler is handler  # idempotent on pooled connections
+
+    cur = FakeCursor()
+    assert handler(cur, 'C', 'DB_TYPE_CLOB', 0, 0, 0) == ('DB_TYPE_LONG', 1024, 500)
+    assert handler(cur, 'N', 'DB_TYPE_NCLOB', 0, 0, 0)[0] == 'DB_TYPE_LONG_NVARCHAR'
+    assert handler(cur, 'B', 'DB_TYPE_BLOB', 0, 0, 0)[0] == 'DB_TYPE_LONG_RAW'
+    assert handler(cur, 'X', 'DB_TYPE_NUMBER', 0, 0, 0) == 'prev'
+    assert seen == ['DB_TYPE_NUMBER']
+    assert ot.lob_stats()['inline_lob_columns'] == 3
+
+    disabled = FakeConn()
+    ot.install_lob_handler(disabled, max_bytes=0)
+    assert disabled.outputtypehandler is None
+    monkeypatch.setattr(ot, 'LOB_INLINE', False)
+    ot.install_lob_handler(disabled)  # locators unless LOB_INLINE=1
+    assert disabled.outputtypehandler is None
+
+
+def test_oversized_lob_buffers_keep_locators(monkeypatch):
+    ot = importlib.import_module('api.agent_common.oracle_tuning')
+    _patch_types(monkeypatch, ot)
+    ot.reset_lob_stats()
+    handler = ot.make_lob_handler(128 * 1024, buffer_bytes=32 * 1024 * 1024)
+    cur = FakeCursor()
+    cur.arraysize = 1000
+    assert handler(cur, 'C', 'DB_TYPE_CLOB', 0, 0, 0) is None  # 125 MiB buffer: locator
+    cur.arraysize = 256
+    assert handler(cur, 'C', 'DB_TYPE_CLOB', 0, 0, 0) == ('DB_TYPE_LONG', 128 * 1024, 256)
+    assert ot.lob_stats()['locator_lob_columns'] == 1 and ot.lob_stats()['inline_lob_columns'] == 1
+
+
+def test_inline_lobs_caps_the_cursor_arraysize_and_chains(monkeypatch):
+    ot = importlib.import_module('api.agent_common.oracle_tuning')
+    _patch_types(monkeypatch, ot)
+    monkeypatch.setattr(ot, 'LOB_INLINE_BUFFER_BYTES', 32 * 1024 * 1024)
+    cur = FakeCursor()
+    cur.arraysize = 1000
+    cur.connection = FakeConn()
+    cur.connection.outputtypehandler = lambda *a: 'prev'
+    assert ot.inline_lobs(cur, max_bytes=128 * 1024) is cur
+    assert cur.arraysize == 256
+    assert cur.outputtypehandler(cur, 'B', 'DB_TYPE_BLOB', 0, 0, 0) == ('DB_TYPE_LONG_RAW', 128 * 1024, 256)
+    assert cur.outputtypehandler(cur, 'X', 'DB_TYPE_NUMBER', 0, 0, 0) == 'prev'
+
+
+def test_read_lob_counts_round_trips(monkeypatch):
+    ot = importlib.import_module('api.agent_common.oracle_tuning')
+
+    class LOB:
+        def __init__(self, data):
+            self.data = data
+
+        def read(self):
+            return self.data
+
+    monkeypatch.setattr(ot.oracledb, 'LOB', LOB, raising=False)
+    ot.reset_lob_stats()
+    assert ot.read_lob('inline text') == 'inline text'
+    assert ot.read_lob(LOB(b'abc')) == b'abc'
+    assert ot.read_lob(LOB('hello')) == 'hello'
+    stats = ot.lob_stats()
+    assert stats['lob_round_trips'] == 2
+    assert stats['lob_bytes_read'] == 8
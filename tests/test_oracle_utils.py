@@ -89,7 +89,7 @@ def test_build_and_search_kdtree(monkeypatch):
 
     # Build index
     ou.refresh_embedding_index(conn)
-    assert ou.KD_TREE_INDEX is not None
+    assert ou.EMBEDDING_INDEX is not None
 
     # Query near the first vector
     res = ou.search_embeddings_kdtree(conn, [0.1], top_k=1)
@@ -125,5 +125,215 @@ def test_ensure_tables_executes(monkeypatch):
     assert any('CREATE TABLE NL2SQL_EVALUATION' in s for s in executed)
     assert any('CREATE TABLE NL2SQL_METRICS' in s for s in executed)
     assert any('CREATE TABLE NL2SQL_FALLBACK' in s for s in executed)
+    assert any('CREATE TABLE NL2SQL_INDEX_VERSION' in s for s in executed)
     assert executed[-1] == 'COMMIT'
 
+
+def test_incremental_refresh_appends_and_drops(monkeypatch):
+    ou = importlib.import_module('api.Training.utils.oracle_utils')
+
+    class TableCursor:
+        def __init__(self, table):
+            self.table = table
+            self._rows = []
+        def execute(self, sql, params=None):
+            if sql.startswith('SELECT id FROM'):
+                self._rows = [(r[0],) for r in self.table]
+            elif 'WHERE id >' in sql:
+                self._rows = [r for r in self.table if r[0] > params[0]]
+            else:
+                self._rows = list(self.table)
+        def fetchall(self):
+            return self._rows
+        def close(self):
+            pass
+
+    class FakeKDTree:
+        def __init__(self, arr):
+            self.arr = arr
+
+    monkeypatch.setattr(ou, 'KDTree', FakeKDTree, raising=True)
+    table = [(1, 101, 'Q1', FakeBlob(_f32_bytes([0.0]))), (2, 102, 'Q2', FakeBlob(_f32_bytes([1.0])))]
+    conn = FakeConn(TableCursor(table))
+    ou.refresh_embedding_index(conn, full=True)
+    assert ou.EMBEDDING_INDEX.watermark == 2
+
+    # A new synonym arrives and Q1 is deleted; existing BLOBs must not be read again
+    table.append((3, 101, 'Q1 syn', FakeBlob(_f32_bytes([2.0]))))
+    del table[0]
+    table[0] = (2, 102, 'Q2', None)
+    ou.refresh_embedding_index(conn)
+    index = ou.EMBEDDING_INDEX
+    assert [d['id'] for d in index.data.values()] == [2, 3]
+    assert index.matrix.ravel().tolist() == [1.0, 2.0]
+    assert index.watermark == 3
+
+    # A failed delta and a failed rebuild leave the serving index in place
+    class BrokenCursor:
+        def execute(self, sql, params=None):
+            raise RuntimeError('ORA-03113: end-of-file on communication channel')
+        def close(self):
+            pass
+    monkeypatch.setattr(ou, 'oracledb', types.SimpleNamespace(Error=ConnectionError))
+    ou.refresh_embedding_index(FakeConn(BrokenCursor()))
+    assert ou.EMBEDDING_INDEX is index
+
+
+class BatchCursor:
+    """Records executemany batches; rows whose second value is 'bad' are rejected like batcherrors."""
+
+    def __init__(self):
+        self.batches = []
+        self.input_sizes = None
+        self._errors = []
+
+    def setinputsizes(self, *sizes):
+        self.input_sizes = sizes
+
+    def executemany(self, sql, rows, batcherrors=False):
+        assert batcherrors
+        self.batches.append(list(rows))
+        self._errors = [types.SimpleNamespace(offset=i, message='ORA-12899: value too large')
+                        for i, r in enumerate(rows) if r[1] == 'bad']
+
+    def getbatcherrors(self):
+        return self._errors
+
+    def close(self):
+        pass
+
+
+class CountingConn(FakeConn):
+    commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_executemany_batches_reports_rejected_rows():
+    ou = importlib.import_module('api.Training.utils.oracle_utils')
+    cur = BatchCursor()
+    conn = CountingConn(cur)
+    rows = [(i, 'bad' if i in (3, 7) else 'ok') for i in range(10)]
+    inserted, errors = ou.executemany_batches(conn, 'INSERT ...', iter(rows), batch_size=4)
+    assert [len(b) for b in cur.batches] == [4, 4, 2]
+    assert inserted == 8 and [row for row, _ in errors] == [3, 7]
+    assert conn.commits == 1
+
+
+def test_insert_embeddings_binds_vectors_in_batches(monkeypatch):
+    np = importlib.import_module('numpy')
+    ou = importlib.import_module('api.Training.utils.oracle_utils')
+    monkeypatch.setattr(ou, 'oracledb', types.SimpleNamespace(DB_TYPE_LONG_RAW='LONG_RAW', Error=Exception))
+
+    cur = BatchCursor()
+    # Columns only need .tolist(), like pandas Series
+    q_df = {'TRAINING_ID': np.array([5, 6, 7]), 'QUESTION_SYN': np.array(['a', 'b', 'c'], dtype=object)}
+    emb = np.arange(6, dtype=np.float64).reshape(3, 2)
+    assert ou.insert_embeddings(CountingConn(cur), q_df, emb, 'Syn', batch_size=2) == 3
+    assert cur.input_sizes == (None, None, 'LONG_RAW')
+    rows = cur.batches[0] + cur.batches[1]
+    assert [(r[0], r[1]) for r in rows] == [(5, 'a'), (6, 'b'), (7, 'c')]
+    assert np.frombuffer(rows[2][2], dtype=np.float32).tolist() == [4.0, 5.0]
+
+
+def test_insert_evaluation_metrics_single_commit():
+    ou = importlib.import_module('api.Training.utils.oracle_utils')
+    cur = BatchCursor()
+    conn = CountingConn(cur)
+    assert ou.insert_evaluation_metrics(conn, 42, [(1, True), (2, False), (3, True)]) == 3
+    assert cur.batches == [[(42, 1, 1), (42, 2, 0), (42, 3, 1)]] and conn.commits == 1
+    assert ou.insert_evaluation_metric(conn, 42, 9, False) is True
+
+
+def test_diff_questions_by_stable_hash():
+    ou = importlib.import_module('api.Training.utils.oracle_utils')
+    h = ou.question_hash
+    existing = [(1, h('S', 'T', 'total sales', 'SELECT 1')), (2, h('S', 'T', 'old question', 'SELECT 2')),
+                (3, h('S', 'T', 'total sales', 'SELECT 1'))]
+    generated = [('S', 'T', 'total  sales ', 'SELECT 1'), ('S', 'T', 'new question', 'SELECT 3'),
+                 ('S', 'T', 'new question', 'SELECT 3')]
+    new_rows, retired, kept = ou.diff_questions(existing, generated)
+    assert new_rows == [('S', 'T', 'new question', 'SELECT 3')]
+    assert retired == [2, 3] and kept == 1  # removed question and the stored duplicate
+    assert h('S', 'T', 'q', 'SELECT 1') != h('S', 'T', 'q', 'SELECT 2')
+
+
+class SyncCursor(BatchCursor):
+    """NL2SQL_TRAINING as a list of (id, schema, table, question, sql); records deletes and inserts."""
+
+    def __init__(self, table):
+        super().__init__()
+        self.table = table
+        self.deletes = []
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        if sql.startswith('SELECT NVL(MAX(id)'):
+            self._rows = [(max([r[0] for r in self.table], default=0),)]
+        else:
+            self._rows = [(i, s, t, FakeBlob(q), FakeBlob(sql_)) for i, s, t, q, sql_ in self.table]
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def executemany(self, sql, rows, batcherrors=False):
+        if sql.startswith('DELETE'):
+            self.deletes.append((sql.split()[2], [r[0] for r in rows]))
+        else:
+            super().executemany(sql, rows, batcherrors)
+
+
+def test_sync_questions_inserts_new_and_retires_removed_without_commit():
+    ou = importlib.import_module('api.Training.utils.oracle_utils')
+    cur = SyncCursor([(4, 'S', 'T', 'keep me', 'SELECT 1'), (9, 'S', 'T', 'drop me', 'SELECT 2')])
+    conn = CountingConn(cur)
+    diff = ou.sync_questions(conn, [('S', 'T', 'keep me', 'SELECT 1'), ('S', 'T', 'add me', 'SELECT 3')])
+    assert diff == {'since_id': 9, 'added': 1, 'retired': 1, 'kept': 1}
+    assert cur.deletes == [('NL2SQL_EMBEDDINGS', [9]), ('NL2SQL_SYNONYMS', [9]), ('NL2SQL_TRAINING', [9])]
+    assert cur.batches == [[['S', 'T', 'add me', 'SELECT 3']]]
+    assert conn.commits == 0  # published later, in one commit
+
+
+def test_publish_index_version_commits_once(monkeypatch):
+    ou = importlib.import_module('api.Training.utils.oracle_utils')
+    monkeypatch.setattr(ou, 'oracledb', types.SimpleNamespace(DB_TYPE_NUMBER='NUMBER'))
+    executed = []
+
+    class Var:
+        def getvalue(self):
+            return [7]
+
+    class Cur:
+        def var(self, typ):
+            return Var()
+        def execute(self, sql, params):
+            executed.append((sql, params[:3]))
+        def close(self):
+            pass
+
+    conn = CountingConn(Cur())
+    assert ou.publish_index_version(conn, {'since_id': 9, 'added': 2, 'retired': 1, 'kept': 5}) == 7
+    assert 'NL2SQL_INDEX_VERSION' in executed[0][0] and executed[0][1] == [2, 1, 7]
+    assert conn.commits == 1
+
+
+def test_bulk_evaluation_stores_one_metric_per_prompt(monkeypatch):
+    ou = importlib.import_module('api.Training.utils.oracle_utils')
+    stored = []
+    monkeypatch.setattr(ou, 'insert_evaluation_metrics', lambda conn, run_id, rows: stored.append((run_id, rows)))
+
+    class Model:
+        def encode(self, texts, convert_to_numpy=True):
+            return [[float(len(texts[0]))]]
+
+    def search(conn, q_emb, top_k=5):
+        return [{'sql_template': "SELECT 'a'"}, {'sql_template': 'SELECT 2'}]
+
+    prompts = [(1, 'first', 'select "a"'), (2, FakeBlob('second'), 'SELECT 3'), (3, 'third', ' select 2 ')]
+    hits, total = ou.run_bulk_evaluation(None, Model(), prompts, run_id=42, search=search)
+    assert (hits, total) == (2, 3)
+    assert stored == [(42, [(1, True), (2, False), (3, True)])]
@@ -0,0 +1,64 @@
+import gc
+import importlib
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+
+
+def _in_child(fn):
+    """Run fn() in a forked child; return its exit status (0 = fn returned truthy)."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            code = 0 if fn() else 1
+        except BaseException:
+            code = 2
+        os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+
+def test_process_local_is_rebuilt_after_fork():
+    pf = importlib.import_module('api.agent_common.prefork')
+    built = []
+    local = pf.ProcessLocal(lambda: built.append(os.getpid()) or object())
+    parent_value = local.get()
+    assert local.get() is parent_value and built == [os.getpid()]
+    assert _in_child(lambda: local.get() is not parent_value and built[-1] == os.getpid()) == 0
+    assert local.get() is parent_value  # the parent keeps its own
+
+
+def test_prepare_fork_closes_master_resources_and_freezes_gc():
+    pf = importlib.import_module('api.agent_common.prefork')
+    closed = []
+    local = pf.ProcessLocal(lambda: 'pool', close=closed.append)
+    local.get()
+    try:
+        pf.prepare_fork()
+        assert closed == ['pool'] and gc.get_freeze_count() > 0
+        assert local.get() == 'pool' and closed == ['pool']  # reopened lazily, closed only once
+    finally:
+        gc.unfreeze()
+
+
+def test_worker_hooks_run_now_or_after_fork(monkeypatch):
+    pf = importlib.import_module('api.agent_common.prefork')
+    calls = []
+    monkeypatch.delenv('AGENT_PREFORK', raising=False)
+    pf.on_worker_start(lambda: calls.append('now'))
+    assert calls == ['now']
+
+    monkeypatch.setenv('AGENT_PREFORK', '1')
+    monkeypatch.setattr(pf, '_IMPORT_PID', os.getpid())
+    monkeypatch.setattr(pf, '_worker_hooks', [])
+    assert pf.preforking()
+    pf.on_worker_start(lambda: calls.append('worker'))
+    assert calls == ['now']
+
+    def child():
+        pf.after_fork()
+        return calls == ['now', 'worker'] and not pf.preforking()
+    assert _in_child(child) == 0
+    assert calls == ['now']
@@ -0,0 +1,33 @@
+import importlib
+
+
+def test_normalize_prompt_folds_case_punctuation_and_params():
+    pc = importlib.import_module('api.database_NoLLM_agent.prompt_cache')
+    assert pc.normalize_prompt("List  ALL employees {dept=10}!") == "list all employees"
+    assert pc.normalize_prompt("  list all employees?\n") == "list all employees"
+    assert pc.normalize_prompt("sales for {region = EMEA} in {year=2024}") == "sales for in"
+    assert pc.normalize_prompt("what's the {total}") == "what s the"
+    assert pc.normalize_prompt("Employees in {Dept}") == pc.normalize_prompt("employees in {dept = 10}")
+    assert pc.normalize_prompt(None) == ""
+
+
+def test_exact_map_skips_deleted_rows_and_keeps_first():
+    pc = importlib.import_module('api.database_NoLLM_agent.prompt_cache')
+    templates = [{'intent_text': 'Show sales'}, {'intent_text': 'show  sales!'},
+                 {'intent_text': 'top customers'}, {'intent_text': ''}]
+    assert pc.build_exact_map(templates) == {'show sales': 0, 'top customers': 2}
+    assert pc.build_exact_map(templates, deleted=[True, False, False, False]) == {'show sales': 1, 'top customers': 2}
+
+
+def test_embedding_lru_evicts_least_recent():
+    pc = importlib.import_module('api.database_NoLLM_agent.prompt_cache')
+    lru = pc.EmbeddingLRU(2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1  # a is now most recent
+    lru.put('c', 3)
+    assert lru.get('b') is None and lru.get('a') == 1 and lru.get('c') == 3
+    assert (lru.hits, lru.misses, len(lru)) == (3, 1, 2)
+    off = pc.EmbeddingLRU(0)
+    off.put('a', 1)
+    assert off.get('a') is None
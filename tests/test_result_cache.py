@@ -0,0 +1,54 @@
+import importlib
+import json
+
+
+class FakeCache:
+    def __init__(self):
+        self.store = {}
+
+    def set(self, key, value, expire=None):
+        self.store[key] = (value, expire)
+
+    def get(self, key):
+        ent = self.store.get(key)
+        return ent[0] if ent else None
+
+
+def _lines():
+    yield json.dumps({"_base_sql": "SELECT * FROM sales"}) + "\n"
+    yield json.dumps({"_column_types": {"ID": "number"}, "_search_columns": ["ID"]}) + "\n"
+    for i in range(500):
+        yield json.dumps({"ID": i, "NAME": f"row {i} é"}) + "\n"
+
+
+def test_tee_stores_and_replays_identical_stream():
+    rc = importlib.import_module('api.database_NoLLM_agent.result_cache')
+    cache = FakeCache()
+    key = rc.result_cache_key("SELECT * FROM sales", {}, max_clob_preview=None)
+    assert key == rc.result_cache_key("SELECT * FROM sales", None, max_clob_preview=None)
+    assert key != rc.result_cache_key("SELECT * FROM sales", {"a": 1}, max_clob_preview=None)
+
+    writer = rc.TeeCacheWriter(cache, key, ttl=120, max_bytes=10_000_000)
+    streamed = ''.join(rc.tee(_lines(), writer))
+    blob, expire = cache.store[key]
+    assert expire == 120
+    assert len(blob) < len(streamed.encode('utf-8'))
+
+    replayed = ''.join(rc.replay(cache.get(key), chunk_bytes=97))
+    assert replayed == streamed
+    assert replayed.splitlines()[0] == '{"_base_sql": "SELECT * FROM sales"}'
+
+
+def test_tee_abandons_oversized_or_interrupted_streams():
+    rc = importlib.import_module('api.database_NoLLM_agent.result_cache')
+    cache = FakeCache()
+    writer = rc.TeeCacheWriter(cache, 'big', ttl=60, max_bytes=1000)
+    out = list(rc.tee(_lines(), writer))
+    assert len(out) == 502  # client still gets every row
+    assert writer.abandoned and 'big' not in cache.store
+
+    writer = rc.TeeCacheWriter(cache, 'cut', ttl=60, max_bytes=10_000_000)
+    gen = rc.tee(_lines(), writer)
+    next(gen)
+    gen.close()  # client disconnected mid-stream
+    assert 'cut' not in cache.store
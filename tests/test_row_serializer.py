@@ -0,0 +1,54 @@
+import importlib
+import datetime
+import decimal
+import json
+
+
+class DbType:
+    def __init__(self, name):
+        self.name = name
+
+
+def _description(*cols):
+    return [(name, DbType(t), None, None, None, None, True) for name, t in cols]
+
+
+def test_compiled_serializer_per_column_types():
+    rs = importlib.import_module('api.agent_common.row_serializer')
+    desc = _description(('D', 'DB_TYPE_DATE'), ('N', 'DB_TYPE_NUMBER'), ('S', 'DB_TYPE_VARCHAR'),
+                        ('C', 'DB_TYPE_CLOB'), ('B', 'DB_TYPE_BLOB'), ('X', 'DB_TYPE_OBJECT'))
+    ser = rs.build_row_serializer(desc, max_clob_preview=4, max_blob_preview=2)
+    dt = datetime.datetime(2024, 1, 2, 3, 4, 5)
+
+    out = ser.to_dict((dt, decimal.Decimal('1.5'), 'abc', 'x' * 10, b'\x00\x01\x02', decimal.Decimal('2')))
+    assert out['D'] == dt.isoformat()
+    assert out['N'] == 1.5
+    assert out['S'] == 'abc'
+    assert out['C'] == {"_type": "CLOB", "length": 10, "preview": "xxxx", "truncated": True}
+    assert out['B']['_type'] == 'BLOB' and out['B']['length'] == 3 and out['B']['truncated'] is True
+    assert out['X'] == 2.0  # unknown type falls back to value dispatch
+
+    nulls = ser.to_dict((None,) * 6)
+    assert all(v is None for v in nulls.values())
+    assert json.loads(ser.dumps((dt, 1, 'a', 'b', b'', None)))['D'] == dt.isoformat()
+
+
+def test_summary_blob_format_and_ndjson_batch():
+    rs = importlib.import_module('api.agent_common.row_serializer')
+    desc = _description(('ID', 'DB_TYPE_NUMBER'), ('DOC', 'DB_TYPE_CLOB'), ('IMG', 'DB_TYPE_BLOB'))
+    ser = rs.build_row_serializer(desc, max_clob_preview=None, blob_format='summary')
+
+    text = ser.ndjson([(1, 'y' * 20000, b'abcd'), (2**70, None, None)])
+    lines = [json.loads(l) for l in text.splitlines()]
+    assert lines[0] == {'ID': 1, 'DOC': 'y' * 20000, 'IMG': '(BLOB 4 bytes)'}
+    assert lines[1]['ID'] == 2**70
+    assert text.endswith('\n')
+    assert ser.ndjson([]) == ''
+
+
+def test_missing_description_uses_generic_dispatch():
+    rs = importlib.import_module('api.agent_common.row_serializer')
+    ser = rs.build_row_serializer(None, columns=['a', 'b'])
+    out = ser.to_dict((datetime.date(2024, 5, 6), b'\x01'))
+    assert out['a'] == '2024-05-06'
+    assert out['b']['_type'] == 'BLOB'
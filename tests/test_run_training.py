@@ -1,5 +1,7 @@
 import importlib
 
+import pytest
+
 
 def test_parse_args_minimal():
     rt = importlib.import_module('api.Training.run_training')
@@ -18,3 +20,11 @@ def test_parse_args_minimal():
     assert args.skip_schema and args.skip_questions and args.skip_synonyms and args.skip_embeddings and args.skip_eval
     assert args.workers == 2 and args.max_variants == 10 and args.model_path == '../m'
 
+
+def test_incremental_refuses_skipped_synonyms_or_embeddings():
+    rt = importlib.import_module('api.Training.run_training')
+    base = ['--host', 'h', '--service', 's', '--user', 'u', '--password', 'p', '--schema-owner', 'O']
+    assert rt.parse_args(base + ['--incremental']).incremental
+    for skipped in ('--skip-synonyms', '--skip-embeddings'):
+        with pytest.raises(SystemExit):
+            rt.parse_args(base + ['--incremental', skipped])
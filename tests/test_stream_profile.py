@@ -0,0 +1,83 @@
+import importlib
+import datetime
+import decimal
+
+import numpy as np
+
+
+class DbType:
+    def __init__(self, name):
+        self.name = name
+
+
+def _description(*cols):
+    return [(name, DbType(t), None, None, None, None, True) for name, t in cols]
+
+
+def _batches(rows, size=1000):
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def test_heavy_hitters_keep_frequent_values_in_bounded_memory():
+    sp = importlib.import_module('api.agent_common.stream_profile')
+    hh = sp.HeavyHitters(capacity=8)
+    values = ['hot'] * 3000 + ['warm'] * 1000 + [f'id{i}' for i in range(20000)]
+    np.random.default_rng(0).shuffle(values)
+    for batch in _batches(values):
+        hh.update(batch)
+    assert len(hh.counts) <= 8
+    (top, top_count), (second, second_count) = hh.top(2)
+    assert (top, second) == ('hot', 'warm')
+    assert 3000 - hh.error <= top_count <= 3000 and hh.error <= hh.n / 9
+
+
+def test_quantiles_and_distinct_are_close():
+    sp = importlib.import_module('api.agent_common.stream_profile')
+    data = np.random.default_rng(1).standard_normal(100000)
+    kll = sp.KLLQuantiles(seed=0)
+    hll = sp.HyperLogLog()
+    for batch in _batches(list(data)):
+        kll.update(batch)
+        hll.update(batch)
+    assert sum(len(level) for level in kll.levels) < 1000
+    for q, est in zip((0.1, 0.5, 0.9), kll.quantiles([0.1, 0.5, 0.9])):
+        assert abs(np.mean(data <= est) - q) < 0.02
+    assert abs(hll.count() - 100000) / 100000 < 0.05
+
+    small = sp.HyperLogLog()
+    small.update(['a', 'b', 'c', 'a'])
+    assert small.count() == 3
+
+
+def test_moments_merge_batches_exactly():
+    sp = importlib.import_module('api.agent_common.stream_profile')
+    data = np.random.default_rng(2).uniform(-5, 50, 2500)
+    m = sp.RunningMoments()
+    for batch in _batches(list(data), 333):
+        m.update(batch)
+    assert m.count == 2500 and m.min == data.min() and m.max == data.max()
+    assert np.isclose(m.mean, data.mean()) and np.isclose(m.variance, data.var(ddof=1))
+
+
+def test_result_profile_dispatches_on_column_type():
+    sp = importlib.import_module('api.agent_common.stream_profile')
+    desc = _description(('AMOUNT', 'DB_TYPE_NUMBER'), ('REGION', 'DB_TYPE_VARCHAR'),
+                        ('TRADED', 'DB_TYPE_DATE'), ('DOC', 'DB_TYPE_CLOB'))
+    profile = sp.build_result_profile(desc)
+    day = datetime.date(2024, 1, 1)
+    rows = [(decimal.Decimal(i % 10), 'EMEA' if i % 3 else 'APAC', day + datetime.timedelta(days=i % 7), 'x' * 5)
+            for i in range(3000)] + [(None, None, None, None)]
+    assert list(profile.tap(_batches(rows, 500))) == _batches(rows, 500)
+
+    summary = profile.summary()
+    assert summary['rows'] == 3001
+    (amount,) = summary['numeric']
+    assert amount['column'] == 'AMOUNT' and amount['count'] == 3000
+    assert (amount['min'], amount['max'], amount['avg']) == (0.0, 9.0, 4.5)
+    (traded,) = summary['temporal']
+    assert traded['min'] == day and traded['max'] == day + datetime.timedelta(days=6)
+    cats = {c['column']: c for c in summary['categorical']}
+    assert 'DOC' not in cats
+    assert cats['REGION']['top_values'][0] == {'value': 'EMEA', 'count': 2000}
+    assert cats['REGION']['distinct_estimate'] == 2 and cats['AMOUNT']['distinct_estimate'] == 10
+    assert profile.columns[3].count == 3000 and profile.columns[3].nulls == 1
@@ -0,0 +1,38 @@
+import importlib
+
+
+def test_trace_stages_and_server_timing():
+    m = importlib.import_module('api.table_ops_service.metrics')
+    trace = m.start_trace('/table/query')
+    assert m.current_trace() is trace
+    with trace.stage('materialize'):
+        pass
+    with m.current_trace().stage('sort'):
+        pass
+    trace.add('rows_returned', 50)
+    trace.add('upstream_bytes', 2048)
+    assert m.end_trace() is trace
+
+    header = trace.server_timing()
+    assert header.startswith('materialize;dur=')
+    assert 'sort;dur=' in header and 'total;dur=' in header
+    assert trace.breakdown()['counters'] == {'rows_returned': 50, 'upstream_bytes': 2048}
+
+    # Outside a request, instrumentation is a no-op rather than an error
+    with m.current_trace().stage('oracle_count'):
+        m.current_trace().add('rows_returned', 1)
+
+
+def test_registry_renders_prometheus_histograms():
+    m = importlib.import_module('api.table_ops_service.metrics')
+    reg = m.MetricsRegistry()
+    reg.histogram('demo_seconds', 'Demo latency.', buckets=(0.1, 1.0))
+    reg.observe('demo_seconds', 0.05, endpoint='/x')
+    reg.observe('demo_seconds', 0.5, endpoint='/x')
+    reg.observe('demo_seconds', 5.0, endpoint='/x')
+    text = reg.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{endpoint="/x",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{endpoint="/x",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{endpoint="/x",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{endpoint="/x"} 3' in text
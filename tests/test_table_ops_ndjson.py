@@ -0,0 +1,45 @@
+import importlib
+import json
+
+
+def _ndjson(objs):
+    return b''.join(json.dumps(o).encode('utf-8') + b'\n' for o in objs)
+
+
+def test_decode_splits_meta_and_drops_blank_rows():
+    mod = importlib.import_module('api.table_ops_service.ndjson')
+    body = _ndjson([
+        {'_base_sql': 'SELECT * FROM t'},
+        {'_column_types': {'A': 'number'}, '_search_columns': ['A', 'B']},
+        {'A': 1, 'B': 'x'},
+        {'A': None, 'B': '  '},
+        {'_private': 5},
+        [{'A': 2, 'B': 'y'}, {'A': None, 'B': ''}],
+        {'_narration': 'summary'},
+    ]) + b'not json\n' + b'{"A": 3, "B": "z"}'  # last line has no trailing newline
+
+    # Feed in awkward chunk sizes so lines straddle chunk boundaries
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    rows, meta = mod.decode_ndjson(chunks)
+
+    assert rows == [
+        {'A': 1, 'B': 'x'},
+        {'_private': 5},
+        {'A': 2, 'B': 'y'},
+        {'A': 3, 'B': 'z'},
+    ]
+    assert meta['_base_sql'] == 'SELECT * FROM t'
+    assert meta['_column_types'] == {'A': 'number'}
+    assert meta['_search_columns'] == ['A', 'B']
+    assert '_narration' not in meta
+
+
+def test_decoder_counts_bytes_and_bad_lines():
+    mod = importlib.import_module('api.table_ops_service.ndjson')
+    dec = mod.NDJSONDecoder()
+    payload = b'{"A": 1}\n\n{bad\n'
+    dec.feed(payload)
+    rows, _ = dec.close()
+    assert rows == [{'A': 1}]
+    assert dec.bytes == len(payload)
+    assert dec.bad_lines == 1
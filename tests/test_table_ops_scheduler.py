@@ -0,0 +1,72 @@
+import importlib
+import threading
+import time
+
+import pytest
+
+
+def test_run_now_records_status():
+    mod = importlib.import_module('api.table_ops_service.scheduler')
+    sched = mod.JobScheduler()
+    calls = []
+
+    def job():
+        calls.append(1)
+        return {'evicted': 3}
+
+    def broken():
+        raise RuntimeError('boom')
+
+    sched.register('sweep', job, interval=60)
+    sched.register('broken', broken, interval=60)
+
+    snap = sched.run_now('sweep')
+    assert calls == [1]
+    assert snap['lastStatus'] == 'ok'
+    assert snap['lastResult'] == {'evicted': 3}
+    assert snap['runs'] == 1 and snap['lastDurationMs'] is not None
+
+    snap = sched.run_now('broken')
+    assert snap['lastStatus'] == 'error'
+    assert snap['failures'] == 1 and 'boom' in snap['lastError']
+
+
+def test_background_thread_runs_due_jobs():
+    mod = importlib.import_module('api.table_ops_service.scheduler')
+    sched = mod.JobScheduler(tick_seconds=0.01)
+    calls = []
+    sched.register('tick', lambda: calls.append(1), interval=0.01, run_at_start=True)
+    sched.start()
+    try:
+        deadline = time.time() + 2
+        while len(calls) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        sched.stop()
+    assert len(calls) >= 2
+    assert not sched.is_running()
+    names = [j['name'] for j in sched.status()['jobs']]
+    assert names == ['tick']
+
+
+def test_run_now_refuses_a_job_that_is_already_running():
+    mod = importlib.import_module('api.table_ops_service.scheduler')
+    sched = mod.JobScheduler()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(2)
+
+    sched.register('slow', slow, interval=60)
+    worker = threading.Thread(target=sched.run_now, args=('slow',))
+    worker.start()
+    try:
+        assert started.wait(2)
+        with pytest.raises(mod.JobAlreadyRunning):
+            sched.run_now('slow')
+        assert sched._due_jobs(time.time() + 120) == []
+    finally:
+        release.set()
+        worker.join(2)
+    assert sched.status()['jobs'][0]['runs'] == 1 and not sched.status()['jobs'][0]['running']
@@ -0,0 +1,95 @@
+import importlib
+
+import numpy as np
+import pytest
+
+
+def test_exact_index_returns_cosine_top_k():
+    ti = importlib.import_module('api.database_NoLLM_agent.template_index')
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((500, 32)).astype(np.float64) * 3  # unnormalized, not float32
+    index = ti.build_index(vecs, 'exact')
+    assert index.matrix.dtype == np.float32 and index.matrix.flags['C_CONTIGUOUS']
+
+    q = rng.standard_normal(32)
+    rows, scores = index.search(q, 10)
+    unit = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+    cos = unit @ (q / np.linalg.norm(q))
+    assert rows.tolist() == np.argsort(-cos)[:10].tolist()
+    assert np.allclose(scores, cos[rows], atol=1e-5)
+
+    rows, _ = index.search(q, 1000)  # k larger than the index
+    assert len(rows) == 500
+
+
+def test_ivf_full_probe_matches_exact():
+    ti = importlib.import_module('api.database_NoLLM_agent.template_index')
+    rng = np.random.default_rng(1)
+    vecs = rng.standard_normal((400, 16))
+    exact = ti.build_index(vecs, 'exact')
+    ivf = ti.build_index(vecs, 'ivf', nlist=8, nprobe=8)
+    assert sum(len(l) for l in ivf.lists) == 400
+    for q in rng.standard_normal((5, 16)):
+        assert ivf.search(q, 5)[0].tolist() == exact.search(q, 5)[0].tolist()
+
+
+def test_ivf_falls_back_to_exact_scan_when_probes_are_empty():
+    ti = importlib.import_module('api.database_NoLLM_agent.template_index')
+    rng = np.random.default_rng(3)
+    vecs = rng.standard_normal((40, 8))
+    ivf = ti.build_index(vecs, 'ivf', nlist=4, nprobe=1)
+    q = rng.standard_normal(8)
+    probed = ti.top_k(ivf.centroids @ (q / np.linalg.norm(q)), 1)[0]
+    ivf.lists[probed] = ivf.lists[probed][:0]
+    rows, _ = ivf.search(q, 3)
+    assert rows.tolist() == ti.build_index(vecs, 'exact').search(q, 3)[0].tolist()
+
+
+def test_unknown_kind_and_empty_index():
+    ti = importlib.import_module('api.database_NoLLM_agent.template_index')
+    with pytest.raises(ValueError):
+        ti.build_index(np.eye(3), 'kdtree')
+    rows, scores = ti.ExactIndex(np.zeros((0, 4))).search(np.ones(4), 3)
+    assert len(rows) == 0 and len(scores) == 0
+
+
+def test_exact_delta_is_copy_on_write():
+    ti = importlib.import_module('api.database_NoLLM_agent.template_index')
+    rng = np.random.default_rng(2)
+    base = rng.standard_normal((50, 8))
+    old = ti.build_index(base, 'exact')
+    items = list(range(50))
+
+    extra = rng.standard_normal((5, 8))
+    new, new_items = ti.apply_delta(old, items, extra, ['a', 'b', 'c', 'd', 'e'], drop_rows=[0, 1])
+    assert len(old) == 50 and old.deleted is None  # untouched
+    assert len(new) == 53 and new_items[50:] == ['a', 'b', 'c', 'd', 'e']
+
+    rows, scores = new.search(extra[2], 3)
+    assert rows[0] == 52 and np.isclose(scores[0], 1.0, atol=1e-5)
+    rows, _ = new.search(base[0], 60)
+    assert 0 not in rows.tolist() and 1 not in rows.tolist() and len(rows) == 53
+    assert old.search(base[0], 1)[0].tolist() == [0]
+
+    # Second append on the newest index reuses the spare capacity
+    f_vec = rng.standard_normal((1, 8))
+    newer, _ = ti.apply_delta(new, new_items, f_vec, ['f'])
+    assert newer._buffer is new._buffer and len(newer) == 54
+    # Appending to an older instance never overwrites rows a newer one owns
+    branch, _ = ti.apply_delta(new, new_items, rng.standard_normal((1, 8)), ['g'])
+    assert branch._buffer is not new._buffer
+    assert np.allclose(newer.matrix[-1], ti.normalize_rows(f_vec)[0])
+
+
+def test_delta_compacts_when_many_rows_are_deleted():
+    ti = importlib.import_module('api.database_NoLLM_agent.template_index')
+    vecs = np.random.default_rng(3).standard_normal((8, 4))
+    index = ti.build_index(vecs, 'exact')
+    compacted, items = ti.apply_delta(index, list('abcdefgh'), drop_rows=[0, 1, 2, 3])
+    assert compacted.deleted is None and len(compacted) == 4
+    assert items == list('efgh')
+    assert compacted.search(vecs[5], 1)[0].tolist() == [1]
+
+    ivf = ti.build_index(vecs, 'ivf', nlist=2, nprobe=2)
+    rebuilt, items = ti.apply_delta(ivf, list('abcdefgh'), vecs[:1] * 2, ['z'], drop_rows=[7])
+    assert rebuilt.kind == 'ivf' and len(rebuilt) == 8 and items[-1] == 'z' and 'h' not in items
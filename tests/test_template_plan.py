@@ -0,0 +1,39 @@
+import importlib
+
+import pytest
+
+
+def test_plan_rewrites_placeholders_and_finds_binds():
+    tp = importlib.import_module('api.database_NoLLM_agent.template_plan')
+    plan = tp.compile_template(
+        "SELECT * FROM emp WHERE dept = {Dept} AND name LIKE {pattern} "
+        "AND mgr = :mgr AND note <> ':ignored' -- :also_ignored\n AND dept <> {dept}")
+    assert plan.placeholders == ('Dept', 'pattern', 'dept')
+    assert plan.sql.startswith("SELECT * FROM emp WHERE dept = :dept AND name LIKE :pattern")
+    assert plan.bind_names == {'dept', 'pattern', 'mgr'}
+    assert plan.param_types == {'dept': 'auto', 'pattern': 'text'}
+
+
+def test_bind_coerces_and_reports_missing():
+    tp = importlib.import_module('api.database_NoLLM_agent.template_plan')
+    plan = tp.compile_template("SELECT * FROM t WHERE id = {ID} AND code LIKE {code} AND x = :extra")
+    params = tp.parse_named_parameters("rows for {id = 10} and {code=007%} {unused=1}")
+    assert params == {'id': '10', 'code': '007%', 'unused': '1'}
+
+    bind_params, missing = plan.bind(params)
+    assert bind_params == {'id': 10, 'code': '007%'}
+    assert missing == {'extra'}
+
+    mixed = tp.compile_template("SELECT * FROM t WHERE id = :CustId AND note LIKE :Note || '%'")
+    assert mixed.bind({':custid': '7', 'NOTE': 'ab'}) == ({'custid': 7, 'note': 'ab'}, frozenset())
+
+    with pytest.raises(ValueError, match="Missing value for parameter: ID"):
+        plan.bind({'code': 'a'})
+
+
+def test_attach_plans_shares_plans_between_synonyms():
+    tp = importlib.import_module('api.database_NoLLM_agent.template_plan')
+    templates = [{'sql': 'SELECT {a} FROM dual'}, {'sql': 'SELECT {a} FROM dual'}, {'sql': None}]
+    tp.attach_plans(templates)
+    assert templates[0]['plan'] is templates[1]['plan']
+    assert templates[2]['plan'].placeholders == () and templates[2]['plan'].bind({}) == ({}, frozenset())
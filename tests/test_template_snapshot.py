@@ -0,0 +1,39 @@
+import importlib
+import os
+
+import numpy as np
+
+
+def _templates(n):
+    return [{'id': i + 1, 'name': i % 3, 'intent_text': f'question {i}', 'sql': f'SELECT {i % 3} FROM dual'}
+            for i in range(n)]
+
+
+def test_snapshot_round_trip_is_memory_mapped(tmp_path):
+    ts = importlib.import_module('api.database_NoLLM_agent.template_snapshot')
+    vecs = np.random.default_rng(0).standard_normal((6, 8)).astype(np.float32)
+    manifest = ts.save_snapshot(str(tmp_path), vecs, _templates(6), watermark=6, model='mini')
+    assert manifest['version'] == 1 and manifest['count'] == 6 and manifest['dim'] == 8
+
+    vectors, templates, loaded = ts.load_snapshot(str(tmp_path), model='mini')
+    assert isinstance(vectors, np.memmap)
+    assert np.array_equal(np.asarray(vectors), vecs)
+    assert templates == _templates(6)
+    assert loaded['watermark'] == 6
+    # Synonyms share one SQL entry
+    with open(os.path.join(str(tmp_path), 'v1', 'templates.json'), encoding='utf-8') as f:
+        assert f.read().count('SELECT') == 3
+
+    assert ts.load_snapshot(str(tmp_path), model='other-model') is None
+
+
+def test_new_versions_replace_current_and_prune_old(tmp_path):
+    ts = importlib.import_module('api.database_NoLLM_agent.template_snapshot')
+    base = str(tmp_path)
+    assert ts.load_snapshot(base) is None
+    for n in (2, 3, 4):
+        ts.save_snapshot(base, np.ones((n, 4), dtype=np.float32), _templates(n), watermark=n)
+    assert ts.current_version(base) == 3
+    vectors, templates, manifest = ts.load_snapshot(base)
+    assert len(templates) == 4 and manifest['watermark'] == 4
+    assert sorted(d for d in os.listdir(base) if d.startswith('v')) == ['v2', 'v3']
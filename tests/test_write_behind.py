@@ -0,0 +1,102 @@
+import importlib
+import threading
+
+
+def test_records_are_written_in_batches_and_flushed():
+    wb = importlib.import_module('api.agent_common.write_behind')
+    batches = []
+    q = wb.WriteBehindQueue(batches.append, max_batch=10, flush_seconds=0.05)
+    for i in range(25):
+        assert q.submit(i)
+    assert q.flush(timeout=5)
+    assert [r for b in batches for r in b] == list(range(25))
+    assert all(len(b) <= 10 for b in batches) and len(batches) < 25
+    assert q.stats()['written'] == 25 and q.stats()['pending'] == 0
+    q.close()
+
+
+def test_full_queue_drops_and_close_drains():
+    wb = importlib.import_module('api.agent_common.write_behind')
+    gate = threading.Event()
+    written = []
+
+    def slow_sink(records):
+        gate.wait(5)
+        written.extend(records)
+
+    q = wb.WriteBehindQueue(slow_sink, max_batch=1, flush_seconds=0.01, max_pending=3)
+    accepted = sum(q.submit(i) for i in range(20))
+    assert q.dropped == 20 - accepted and accepted <= 4  # 3 queued + at most 1 in the sink
+    gate.set()
+    q.close()
+    assert len(written) == accepted
+    assert not q.submit('late') and q.stats()['dropped'] == 21 - accepted
+
+
+def test_sink_failures_are_counted_and_worker_keeps_going():
+    wb = importlib.import_module('api.agent_common.write_behind')
+    calls = []
+
+    def flaky(records):
+        calls.append(list(records))
+        if len(calls) == 1:
+            raise RuntimeError('db down')
+
+    q = wb.WriteBehindQueue(flaky, max_batch=2, flush_seconds=0.01)
+    q.submit('a')
+    q.flush(timeout=5)
+    q.submit('b')
+    q.flush(timeout=5)
+    assert q.failed == 1 and q.written == 1 and calls == [['a'], ['b']]
+    q.close()
+
+
+def test_executemany_and_file_sinks(tmp_path):
+    wb = importlib.import_module('api.agent_common.write_behind')
+
+    class Cursor:
+        def __init__(self, log):
+            self.log = log
+
+        def executemany(self, sql, rows):
+            self.log.append((sql, rows))
+
+        def close(self):
+            self.log.append('cursor closed')
+
+    class Conn:
+        def __init__(self):
+            self.log = []
+
+        def cursor(self):
+            return Cursor(self.log)
+
+        def commit(self):
+            self.log.append('commit')
+
+        def close(self):
+            self.log.append('closed')
+
+    conn = Conn()
+    sink = wb.executemany_sink(lambda: conn, "insert into t(p) values(:p)")
+    sink([{'p': 1}, {'p': 2}])
+    assert conn.log == [("insert into t(p) values(:p)", [{'p': 1}, {'p': 2}]), 'cursor closed', 'commit', 'closed']
+
+    path = tmp_path / 'log.txt'
+    wb.text_file_sink(str(path))(['a\n', 'b\n'])
+    wb.text_file_sink(str(path))(['c\n'])
+    assert path.read_text(encoding='utf-8') == 'a\nb\nc\n'
+
+
+def test_zero_flush_interval_is_clamped_and_counters_are_exact():
+    wb = importlib.import_module('api.agent_common.write_behind')
+    q = wb.WriteBehindQueue(lambda records: None, flush_seconds=0)
+    assert q.flush_seconds == wb.MIN_FLUSH_SECONDS
+    threads = [threading.Thread(target=lambda: [q.submit(i) for i in range(500)]) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert q.flush(timeout=5)
+    assert q.stats()['submitted'] + q.stats()['dropped'] == 4000
+    q.close()